@@ -6,12 +6,21 @@ import re
 import os
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(__file__))
+from package_binaries import package_build
+
 def parse_arguments(json_str):
     try:
         # Clean up the input string
         if json_str.startswith("'") and json_str.endswith("'"):
             json_str = json_str[1:-1]
         json_str = json_str.strip()
+
+        # Valid JSON is used as is, the fixes below would break quoted Windows paths
+        try:
+            return json.loads(json_str)
+        except ValueError:
+            pass
         
         # Fix the JSON string by adding quotes around keys and values
         fixed_args = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', json_str)
@@ -23,23 +32,23 @@ def parse_arguments(json_str):
     except Exception as e:
         raise ValueError(f"Failed to parse JSON: {e}")
 
-def main():
-    # Get and fix the JSON string
-    if len(sys.argv) < 2:
-        raise ValueError("No arguments provided")
-        
-    arguments = sys.argv[1]
-    data = parse_arguments(arguments)
-    
-    # Get values with defaults
-    commit_msg = data.get("commitMsg", "")
-    commit_id = data.get("commitId", "")
-    commit_author = data.get("commitAuthor", "")
-    commit_date = data.get("commitDate", "")
-    commit_type = data.get("commitType", "")
-    
-    # Initialize Anchorpoint
-    database = ap.get_api()
+def read_batch(batch_path):
+    # A JSON list of builds, or one build per line (NDJSON). "-" reads from stdin.
+    if batch_path == "-":
+        content = sys.stdin.read()
+    else:
+        with open(batch_path, 'r', encoding="utf-8") as file:
+            content = file.read()
+    try:
+        builds = json.loads(content)
+        return builds if isinstance(builds, list) else [builds]
+    except ValueError:
+        return [parse_arguments(line) for line in content.splitlines() if line.strip()]
+
+def log(text):
+    sys.__stdout__.write(text + "\n")
+
+def get_task_list(database):
     task_list_name = "Binaries"
     
     # Get project and task list
@@ -49,6 +58,40 @@ def main():
     # Check if the task_list is empty and create a new one if necessary
     if not task_list:
         task_list = database.tasks.create_task_list(project.path, task_list_name)
+    return task_list
+
+def get_registered_commits(database, task_list):
+    # Index of the commits that already have a task, read once instead of per build
+    registered_commits = set()
+    for task in database.tasks.get_tasks(task_list):
+        commit_id = database.attributes.get_attribute_value(task, "Commit ID")
+        if commit_id:
+            registered_commits.add(str(commit_id).strip().lower())
+    return registered_commits
+
+def package_binaries(data):
+    # Package the build output into the binary source first, so that a failed build is never registered
+    commit_id = data.get("commitId", "")
+    binary_source = data.get("binarySource", "")
+    if not binary_source or not commit_id:
+        raise ValueError("buildPath needs binarySource and commitId")
+    package_build(
+        data["buildPath"],
+        binary_source,
+        commit_id,
+        data.get("previousCommitId") or None,
+        int(data.get("workers", 0)),
+        int(data.get("compressionLevel", 6)),
+        log
+    )
+
+def add_binary(database, task_list, data):
+    # Get values with defaults
+    commit_msg = data.get("commitMsg", "")
+    commit_id = data.get("commitId", "")
+    commit_author = data.get("commitAuthor", "")
+    commit_date = data.get("commitDate", "")
+    commit_type = data.get("commitType", "")
 
     # Create task and set properties
     task = database.tasks.create_task(task_list, commit_msg)
@@ -56,12 +99,56 @@ def main():
 
     # Set task attributes
     database.attributes.set_attribute_value(task,"Author", commit_author)
-    database.attributes.set_attribute_value(task, "Date", datetime.strptime(commit_date, "%Y-%m-%d"))
+    if commit_date:
+        database.attributes.set_attribute_value(task, "Date", datetime.strptime(commit_date.strip()[:10], "%Y-%m-%d"))
     database.attributes.set_attribute_value(task,"Commit ID", commit_id)
     #database.attributes.set_attribute_value(task,"Commit Type", commit_type)
-    sys.__stdout__.write("Binary added to list\n")
 
-if __name__ == "__main__":
-    main()
+def main():
+    # Get and fix the JSON string
+    if len(sys.argv) < 2:
+        raise ValueError("No arguments provided")
+
+    # add_binary.py --batch builds.json registers many builds, e.g. to backfill historical builds
+    if sys.argv[1] == "--batch":
+        if len(sys.argv) < 3:
+            raise ValueError("--batch needs a JSON or NDJSON file, or - for stdin")
+        builds = read_batch(sys.argv[2])
+    else:
+        builds = [parse_arguments(sys.argv[1])]
 
+    # Initialize Anchorpoint
+    database = ap.get_api()
+    task_list = get_task_list(database)
+    registered_commits = get_registered_commits(database, task_list)
+
+    # Re-running a CI job or a backfill must neither package nor register a commit a second time
+    added = 0
+    skipped = 0
+    failed = 0
+    for data in builds:
+        commit_id = str(data.get("commitId", "")).strip().lower()
+        if commit_id and commit_id in registered_commits:
+            skipped += 1
+            continue
+        if data.get("buildPath"):
+            # A build that can't be packaged is not registered, the other builds of the batch still are
+            try:
+                package_binaries(data)
+            except Exception as e:
+                log(f"Failed to package {commit_id or data['buildPath']}: {e}")
+                failed += 1
+                continue
+        add_binary(database, task_list, data)
+        registered_commits.add(commit_id)
+        added += 1
 
+    if len(builds) == 1:
+        if not failed:
+            log("Binary already in list" if skipped else "Binary added to list")
+    else:
+        log(f"Added {added} binaries to list, skipped {skipped} that were already registered" + (f", {failed} failed" if failed else ""))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+import argparse
+import collections
+import glob
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Packages a build output folder as "<commit>.zip" for the binary sync. The files are compressed in parallel and
+# written by a single writer, which adds the zip64 records that archives and PDBs over 4 GB need. Next to the
+# archive, "<commit>.files.json" lists the SHA-256 of every file and where its compressed data is stored, so that
+# the next build copies the data of unchanged files from this archive instead of compressing them again.
+MANIFEST_SUFFIX = ".files.json"
+BUFFER_SIZE = 4 * 1024 * 1024
+# Compressed files up to this size are kept in memory until the writer gets to them
+SPOOL_SIZE = 64 * 1024 * 1024
+PROGRESS_INTERVAL = 2.0
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+UTF8_FLAG = 0x800
+STORED = 0
+DEFLATED = 8
+LOCAL_HEADER = struct.Struct("<4sHHHHHLLLHH")
+CENTRAL_HEADER = struct.Struct("<4sHHHHHHLLLHHHHHLL")
+END_RECORD = struct.Struct("<4sHHHHLLH")
+ZIP64_END_RECORD = struct.Struct("<4sQHHLLQQQQ")
+ZIP64_END_LOCATOR = struct.Struct("<4sLQL")
+
+def get_worker_count(workers):
+    # 0 means that the worker count is picked based on the available cores
+    if workers and workers > 0:
+        return workers
+    return os.cpu_count() or 1
+
+def list_build_files(build_path):
+    # Paths relative to the build folder with forward slashes, like they are stored in the zip
+    file_names = []
+    for root, dirs, files in os.walk(build_path):
+        dirs.sort()
+        for file_name in sorted(files):
+            file_names.append(os.path.relpath(os.path.join(root, file_name), build_path).replace("\\", "/"))
+    return file_names
+
+def hash_file(file_path):
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        while True:
+            data = file.read(BUFFER_SIZE)
+            if not data:
+                break
+            file_hash.update(data)
+    return file_hash.hexdigest()
+
+def get_dos_time(mtime):
+    # Zip stores local time with a two second resolution and can't go before 1980
+    local_time = time.localtime(max(mtime, 315532800))
+    dos_date = (local_time.tm_year - 1980) << 9 | local_time.tm_mon << 5 | local_time.tm_mday
+    dos_time = local_time.tm_hour << 11 | local_time.tm_min << 5 | local_time.tm_sec // 2
+    return dos_time, dos_date
+
+def copy_bytes(source, target, size):
+    while size > 0:
+        data = source.read(min(BUFFER_SIZE, size))
+        if not data:
+            raise IOError("Unexpected end of archive")
+        target.write(data)
+        size -= len(data)
+
+def compress_file(file_path, level):
+    # Returns the spooled compressed data with its CRC32, size and method. Files that don't get smaller are stored.
+    spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc = 0
+    size = 0
+    with open(file_path, 'rb') as file:
+        while True:
+            data = file.read(BUFFER_SIZE)
+            if not data:
+                break
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            spool.write(compressor.compress(data))
+    spool.write(compressor.flush())
+
+    if spool.tell() >= size:
+        spool.close()
+        spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        with open(file_path, 'rb') as file:
+            shutil.copyfileobj(file, spool, BUFFER_SIZE)
+        method = STORED
+    else:
+        method = DEFLATED
+    compressed_size = spool.tell()
+    spool.seek(0)
+    return spool, crc, compressed_size, method
+
+def read_data_offset(archive_file, header_offset):
+    # The compressed data starts after the local header, whose name and extra field lengths can differ per writer
+    archive_file.seek(header_offset)
+    header = LOCAL_HEADER.unpack(archive_file.read(LOCAL_HEADER.size))
+    if header[0] != b"PK\x03\x04":
+        raise IOError(f"No local file header at offset {header_offset}")
+    return header_offset + LOCAL_HEADER.size + header[9] + header[10]
+
+def find_previous_build(binary_source, commit_id, previous_commit_id=None):
+    # The manifest of the given build, or the newest one in the binary source. It is only used when its
+    # archive is still the one that the manifest was written for. The archive of the packaged commit itself
+    # is replaced while the entries are copied from the previous one, so it never counts as the previous build.
+    if previous_commit_id:
+        manifest_paths = [os.path.join(binary_source, previous_commit_id + MANIFEST_SUFFIX)]
+    else:
+        manifest_paths = sorted(glob.glob(os.path.join(binary_source, "*" + MANIFEST_SUFFIX)), key=os.path.getmtime, reverse=True)
+    for manifest_path in manifest_paths:
+        if os.path.basename(manifest_path) == commit_id + MANIFEST_SUFFIX:
+            continue
+        try:
+            with open(manifest_path, 'r', encoding="utf-8") as file:
+                manifest = json.load(file)
+            archive_path = os.path.join(os.path.dirname(manifest_path), manifest["archive"])
+            if os.path.basename(archive_path) == f"{commit_id}.zip":
+                continue
+            if os.path.getsize(archive_path) == manifest["archive_size"]:
+                return manifest, archive_path
+        except (OSError, ValueError, KeyError):
+            continue
+    return None, None
+
+def get_zip64_extra(values):
+    if not values:
+        return b""
+    return struct.pack(f"<HH{len(values)}Q", 1, 8 * len(values), *values)
+
+def write_local_header(archive_file, entry):
+    name = entry["name"].encode("utf-8")
+    zip64 = entry["size"] >= ZIP64_LIMIT or entry["compressed_size"] >= ZIP64_LIMIT
+    extra = get_zip64_extra([entry["size"], entry["compressed_size"]] if zip64 else [])
+    archive_file.write(LOCAL_HEADER.pack(
+        b"PK\x03\x04", 45 if zip64 else 20, entry["flags"], entry["method"], entry["dos_time"], entry["dos_date"], entry["crc"],
+        ZIP64_LIMIT if zip64 else entry["compressed_size"], ZIP64_LIMIT if zip64 else entry["size"], len(name), len(extra)
+    ))
+    archive_file.write(name)
+    archive_file.write(extra)
+
+def write_central_directory(archive_file, entries):
+    start = archive_file.tell()
+    for entry in entries:
+        name = entry["name"].encode("utf-8")
+        # Only the values that don't fit are moved into the zip64 extra field, in this order
+        zip64_values = [value for value in (entry["size"], entry["compressed_size"], entry["offset"]) if value >= ZIP64_LIMIT]
+        extra = get_zip64_extra(zip64_values)
+        version = 45 if zip64_values else 20
+        archive_file.write(CENTRAL_HEADER.pack(
+            b"PK\x01\x02", version, version, entry["flags"], entry["method"], entry["dos_time"], entry["dos_date"], entry["crc"],
+            min(entry["compressed_size"], ZIP64_LIMIT), min(entry["size"], ZIP64_LIMIT), len(name), len(extra), 0, 0, 0,
+            0x20, min(entry["offset"], ZIP64_LIMIT)
+        ))
+        archive_file.write(name)
+        archive_file.write(extra)
+    end = archive_file.tell()
+
+    directory_size = end - start
+    if len(entries) >= ZIP64_COUNT_LIMIT or directory_size >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+        archive_file.write(ZIP64_END_RECORD.pack(b"PK\x06\x06", ZIP64_END_RECORD.size - 12, 45, 45, 0, 0, len(entries), len(entries), directory_size, start))
+        archive_file.write(ZIP64_END_LOCATOR.pack(b"PK\x06\x07", 0, end, 1))
+    count = min(len(entries), ZIP64_COUNT_LIMIT)
+    archive_file.write(END_RECORD.pack(b"PK\x05\x06", 0, 0, count, count, min(directory_size, ZIP64_LIMIT), min(start, ZIP64_LIMIT), 0))
+
+def prepare_in_order(executor, prepare_entry, file_names, window):
+    # Like executor.map, but only a few files ahead of the writer, so that the spooled data stays bounded
+    pending = collections.deque()
+    for file_name in file_names:
+        pending.append(executor.submit(prepare_entry, file_name))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def package_build(build_path, binary_source, commit_id, previous_commit_id=None, workers=0, level=6, log=print):
+    # Writes <commit>.zip and <commit>.files.json into the binary source and returns the path of the archive.
+    # Both are written to temporary files first, so that a sync never picks up a half written archive.
+    file_names = list_build_files(build_path)
+    if not file_names:
+        raise ValueError(f"No files found in {build_path}")
+    os.makedirs(binary_source, exist_ok=True)
+    archive_path = os.path.join(binary_source, f"{commit_id}.zip")
+    manifest_path = os.path.join(binary_source, commit_id + MANIFEST_SUFFIX)
+
+    previous_manifest, previous_archive_path = find_previous_build(binary_source, commit_id, previous_commit_id)
+    previous_entries = {}
+    if previous_manifest:
+        # Reused by content, so that moved files are not compressed again either
+        previous_entries = {entry["sha256"]: entry for entry in previous_manifest["files"].values()}
+        log(f"Reusing unchanged files from {os.path.basename(previous_archive_path)}")
+
+    def prepare_entry(file_name):
+        # Runs on the workers, the expensive part is hashing and compressing
+        file_path = os.path.join(build_path, file_name)
+        file_stat = os.stat(file_path)
+        file_hash = hash_file(file_path)
+        entry = {"name": file_name, "size": file_stat.st_size, "sha256": file_hash, "spool": None, "reused": None}
+        entry["dos_time"], entry["dos_date"] = get_dos_time(file_stat.st_mtime)
+        entry["flags"] = 0 if file_name.isascii() else UTF8_FLAG
+        previous_entry = previous_entries.get(file_hash)
+        if previous_entry and previous_entry["size"] == file_stat.st_size:
+            entry["reused"] = previous_entry
+            entry["crc"], entry["compressed_size"], entry["method"] = previous_entry["crc"], previous_entry["compressed_size"], previous_entry["method"]
+        else:
+            entry["spool"], entry["crc"], entry["compressed_size"], entry["method"] = compress_file(file_path, level)
+        return entry
+
+    started = time.monotonic()
+    last_log = started
+    temp_path = f"{archive_path}.{os.getpid()}.tmp"
+    entries = []
+    previous_archive = open(previous_archive_path, 'rb') if previous_manifest else None
+    try:
+        worker_count = get_worker_count(workers)
+        with open(temp_path, 'wb') as archive_file, ThreadPoolExecutor(max_workers=worker_count) as executor:
+            # The archive is written in the order of the file list, so that it is the same for the same build
+            for entry in prepare_in_order(executor, prepare_entry, file_names, worker_count * 2):
+                entry["offset"] = archive_file.tell()
+                write_local_header(archive_file, entry)
+                if entry["reused"]:
+                    previous_archive.seek(read_data_offset(previous_archive, entry["reused"]["offset"]))
+                    copy_bytes(previous_archive, archive_file, entry["compressed_size"])
+                else:
+                    shutil.copyfileobj(entry["spool"], archive_file, BUFFER_SIZE)
+                    entry["spool"].close()
+                    entry["spool"] = None
+                entries.append(entry)
+
+                if time.monotonic() - last_log >= PROGRESS_INTERVAL:
+                    last_log = time.monotonic()
+                    log(f"Packaged {len(entries)} of {len(file_names)} files")
+
+            write_central_directory(archive_file, entries)
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+        archive_size = os.path.getsize(temp_path)
+        os.replace(temp_path, archive_path)
+    finally:
+        if previous_archive:
+            previous_archive.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    manifest = {
+        "version": 1,
+        "commit": commit_id,
+        "archive": os.path.basename(archive_path),
+        "archive_size": archive_size,
+        "files": {
+            entry["name"]: {key: entry[key] for key in ("sha256", "size", "crc", "compressed_size", "method", "offset")}
+            for entry in entries
+        }
+    }
+    temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(temp_path, manifest_path)
+
+    reused = sum(1 for entry in entries if entry["reused"])
+    log(f"Packaged {len(entries)} files ({reused} reused) into {os.path.basename(archive_path)}, {archive_size / 1024**2:.0f} MB in {time.monotonic() - started:.1f}s")
+    return archive_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Package a build output folder for the Unreal binary sync")
+    parser.add_argument("build_path", help="Folder with the binaries, laid out like the project")
+    parser.add_argument("binary_source", help="Folder that the binary sync reads the archives from")
+    parser.add_argument("commit_id", help="Commit that the binaries were built from")
+    parser.add_argument("--previous", default=None, help="Commit of the build whose unchanged files are reused, the newest build by default")
+    parser.add_argument("--workers", type=int, default=0, help="Number of compression threads, 0 picks one per core")
+    parser.add_argument("--level", type=int, default=6, help="Deflate compression level")
+    arguments = parser.parse_args()
+    package_build(arguments.build_path, arguments.binary_source, arguments.commit_id, arguments.previous, arguments.workers, arguments.level)
+
+if __name__ == "__main__":
+    sys.exit(main())
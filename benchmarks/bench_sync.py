@@ -0,0 +1,325 @@
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+import zlib
+
+# Reproducible benchmark for the binary sync. It stubs the Anchorpoint APIs, generates a synthetic Unreal
+# like project with zipped binaries and a git history with tags, and times the phases of the sync.
+#
+#   python benchmarks/bench_sync.py --files 5000 --commits 5000 --output results.json
+#   python benchmarks/bench_sync.py --compare results.json
+#
+# Results are written as JSON, so that runs before and after a change can be compared.
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "stubs"))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), "binary_sync_action"))
+
+# Size ranges in bytes with their weight, picked per file
+SIZE_PROFILES = {
+    "editor": [(512, 64 * 1024, 70), (64 * 1024, 4 * 1024**2, 25), (4 * 1024**2, 48 * 1024**2, 5)],
+    "small": [(128, 16 * 1024, 100)],
+    "large": [(64 * 1024, 8 * 1024**2, 60), (8 * 1024**2, 128 * 1024**2, 40)]
+}
+COMPRESSION = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+    "lzma": zipfile.ZIP_LZMA
+}
+# Archive formats that can be compared with --formats, zstd needs the optional zstandard package
+ARCHIVE_FORMATS = [".zip", ".tar", ".tar.gz", ".tar.zst"]
+EXTENSIONS = [(".dll", 55), (".pdb", 25), (".exe", 3), (".modules", 7), (".target", 5), (".ini", 5)]
+
+def weighted_choice(generator, choices):
+    total = sum(weight for _, weight in choices)
+    value = generator.uniform(0, total)
+    for choice, weight in choices:
+        value -= weight
+        if value <= 0:
+            return choice
+    return choices[-1][0]
+
+def generate_file_list(file_count, size_profile, seed):
+    # Unreal like layout: engine binaries, plugin binaries and a few game projects
+    generator = random.Random(seed)
+    files = {}
+    for index in range(file_count):
+        location = generator.random()
+        if location < 0.5:
+            folder = "Engine/Binaries/Win64"
+        elif location < 0.85:
+            folder = f"Engine/Plugins/Plugin{generator.randint(0, file_count // 40)}/Binaries/Win64"
+        else:
+            folder = f"Game{generator.randint(0, 3)}/Binaries/Win64"
+        extension = weighted_choice(generator, EXTENSIONS)
+        low, high, _ = weighted_choice(generator, [((low, high, weight), weight) for low, high, weight in size_profile])
+        files[f"{folder}/UnrealEditor-Module{index}{extension}"] = generator.randint(low, high)
+    return files
+
+def file_content(name, size, variant, random_block):
+    # Half random, half repetitive data compresses roughly like real binaries
+    offset = zlib.crc32(f"{name}:{variant}".encode()) % (len(random_block) // 2)
+    chunk = random_block[offset:offset + max(1, min(size // 2, len(random_block) // 2))]
+    content = bytearray()
+    while len(content) < size:
+        content += chunk
+        content += b"\0" * min(len(chunk), size - len(content))
+    return bytes(content[:size])
+
+def write_zip(zip_path, files, variants, compression, random_block):
+    with zipfile.ZipFile(zip_path, 'w', compression) as zip_ref:
+        for name, size in files.items():
+            zip_ref.writestr(name, file_content(name, size, variants.get(name, 0), random_block))
+
+def write_tar(tar_path, files, variants, random_block):
+    def add_files(tar):
+        for name, size in files.items():
+            member = tarfile.TarInfo(name)
+            member.size = size
+            # Tars have no checksums, changed files are detected by their modification time
+            member.mtime = 1600000000 + variants.get(name, 0)
+            tar.addfile(member, io.BytesIO(file_content(name, size, variants.get(name, 0), random_block)))
+
+    if tar_path.endswith(".tar.zst"):
+        import zstandard
+        with open(tar_path, 'wb') as file, zstandard.ZstdCompressor(level=3).stream_writer(file) as compressed, tarfile.open(fileobj=compressed, mode="w|") as tar:
+            add_files(tar)
+    else:
+        with tarfile.open(tar_path, "w:gz" if tar_path.endswith(".gz") else "w") as tar:
+            add_files(tar)
+
+def write_archive(archive_path, files, variants, compression, random_block):
+    if archive_path.endswith(".zip"):
+        write_zip(archive_path, files, variants, compression, random_block)
+    else:
+        write_tar(archive_path, files, variants, random_block)
+
+def git(arguments, cwd, input_text=None):
+    return subprocess.run(['git'] + arguments, cwd=cwd, input=input_text, text=True, check=True, capture_output=True).stdout.strip()
+
+def build_git_repo(project_path, commit_count, tag_every, ahead):
+    # fast-import creates thousands of commits in a fraction of a second
+    git(['init', '-q'], project_path)
+    git(['config', 'user.email', 'benchmark@example.com'], project_path)
+    git(['config', 'user.name', 'Benchmark'], project_path)
+    commands = []
+    for index in range(1, commit_count + 1):
+        message = f"Commit {index}"
+        content = str(index)
+        commands.append(f"commit refs/heads/main\nmark :{index}\ncommitter Benchmark <benchmark@example.com> {1600000000 + index * 60} +0000\n")
+        commands.append(f"data {len(message)}\n{message}\n")
+        if index > 1:
+            commands.append(f"from :{index - 1}\n")
+        commands.append(f"M 644 inline Source/file{index % 50}.txt\ndata {len(content)}\n{content}\n")
+    git(['fast-import', '--quiet'], project_path, "".join(commands))
+    git(['checkout', '-q', '-f', 'main'], project_path)
+
+    # Tag every n-th commit, the newest tag is a few commits behind HEAD
+    tagged = []
+    for tag_number, distance in enumerate(range(ahead + (commit_count - ahead - 1) % tag_every, commit_count, tag_every)):
+        tag_name = f"Editor-{tag_number}"
+        git(['tag', tag_name, f"HEAD~{distance}"], project_path)
+        tagged.append(git(['rev-parse', f"{tag_name}^{{commit}}"], project_path))
+    git(['pack-refs', '--all'], project_path)
+    return tagged
+
+def build_project_tree(project_path, content_folders):
+    # .uproject files and heavy folders that the project discovery has to skip
+    for game in range(4):
+        game_path = os.path.join(project_path, f"Game{game}")
+        os.makedirs(game_path, exist_ok=True)
+        with open(os.path.join(game_path, f"Game{game}.uproject"), 'w') as file:
+            file.write("{}")
+        for folder in range(content_folders):
+            os.makedirs(os.path.join(game_path, "Content", f"Folder{folder // 10}", f"Sub{folder}"), exist_ok=True)
+    with open(os.path.join(project_path, ".uedependencies"), 'w') as file:
+        file.write("")
+
+def measure(function, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return {"runs": timings, "min": min(timings), "median": statistics.median(timings)}
+
+def run_benchmarks(arguments):
+    work_dir = tempfile.mkdtemp(prefix="binary_sync_benchmark_")
+    os.environ["LOCALAPPDATA"] = os.path.join(work_dir, "local_data")
+    os.environ["XDG_CACHE_HOME"] = os.path.join(work_dir, "local_data")
+
+    import anchorpoint as ap
+    import apsync as aps
+    import sync_binaries
+    import sync_engine
+    import sync_trace
+
+    project_path = os.path.join(work_dir, "project")
+    source_path = os.path.join(work_dir, "source")
+    os.makedirs(project_path)
+    os.makedirs(source_path)
+
+    print("Generating git history...")
+    tagged = build_git_repo(project_path, arguments.commits, arguments.tag_every, arguments.ahead)
+    build_project_tree(project_path, arguments.content_folders)
+
+    print("Generating archives...")
+    random_block = random.Random(arguments.seed).randbytes(2 * 1024**2)
+    files = generate_file_list(arguments.files, SIZE_PROFILES[arguments.size_profile], arguments.seed)
+    generator = random.Random(arguments.seed + 1)
+    changed = {name: 1 for name in files if generator.random() < arguments.changed}
+    old_zip = os.path.join(source_path, f"{tagged[-2]}{arguments.format}")
+    new_zip = os.path.join(source_path, f"{tagged[-1]}{arguments.format}")
+    write_archive(old_zip, files, {}, COMPRESSION[arguments.compression], random_block)
+    write_archive(new_zip, files, changed, COMPRESSION[arguments.compression], random_block)
+
+    ap.get_context().project_path = project_path
+    sync_engine.host = sync_binaries.AnchorpointHost()
+    sync_engine.dry_run = False
+    settings = aps.Settings()
+    settings.set(project_path + "_binary_source", source_path)
+    settings.set(project_path + "_extraction_workers", str(arguments.workers) if arguments.workers else "Auto")
+    settings.set(project_path + "_launch_project_display_name", "No Project")
+    settings.set(project_path + "_record_timings", True)
+    aps.SharedSettings().set("_tag_pattern", "Editor")
+    catalogue = sync_engine.BinaryCatalogue(source_path).refresh()
+
+    def clear_local_data(*sub_dirs):
+        shutil.rmtree(os.path.join(work_dir, "local_data", "Anchorpoint", "unreal_binary_sync", *sub_dirs), ignore_errors=True)
+
+    def clear_binaries():
+        for name in ("Engine", "Game0/Binaries", "Game1/Binaries", "Game2/Binaries", "Game3/Binaries"):
+            shutil.rmtree(os.path.join(project_path, name), ignore_errors=True)
+        for name in ("extracted_binaries.json", "extracted_binaries.txt"):
+            if os.path.exists(os.path.join(project_path, name)):
+                os.remove(os.path.join(project_path, name))
+
+    def extract(zip_path, incremental):
+        progress = ap.Progress("Benchmark")
+        if not sync_engine.unzip_and_manage_files(zip_path, project_path, progress, incremental, arguments.workers):
+            raise RuntimeError("Extraction failed")
+
+    results = {}
+    repeat = arguments.repeat
+
+    print("Timing tag resolution...")
+    results["tag_resolution_cold"] = measure(lambda: sync_engine.get_matching_commit_id(project_path, "Editor", catalogue), repeat, lambda: clear_local_data("tags"))
+    results["tag_resolution_warm"] = measure(lambda: sync_engine.get_matching_commit_id(project_path, "Editor", catalogue), repeat)
+
+    print("Timing project discovery...")
+    results["find_uproject_files"] = measure(lambda: sync_binaries.find_uproject_files(project_path), repeat)
+
+    print("Timing extraction...")
+    results["extraction_full"] = measure(lambda: extract(old_zip, False), repeat, clear_binaries)
+    results["extraction_incremental"] = measure(lambda: extract(new_zip, True), repeat, lambda: (clear_binaries(), extract(old_zip, False)))
+    results["verify_up_to_date"] = measure(lambda: extract(new_zip, True), repeat)
+
+    # Full extraction of the same files from every format, the zip uses the --compression method
+    formats_path = os.path.join(work_dir, "formats")
+    extract_path = os.path.join(work_dir, "extracted")
+    os.makedirs(formats_path)
+    for archive_format in arguments.formats.split(","):
+        print(f"Timing {archive_format} extraction...")
+        archive_path = os.path.join(formats_path, f"build{archive_format}")
+        write_archive(archive_path, files, {}, COMPRESSION[arguments.compression], random_block)
+        archive = sync_engine.open_archive(archive_path)
+        entries = archive.entries()
+        results[f"extract_all[{archive_format}]"] = measure(
+            lambda: archive.extract(entries, extract_path, arguments.workers, lambda: False, lambda value: None),
+            repeat,
+            lambda: shutil.rmtree(extract_path, ignore_errors=True)
+        )
+        shutil.rmtree(extract_path, ignore_errors=True)
+
+    print("Timing deletion...")
+    manifest_files = list(sync_engine.read_manifest(project_path)["files"])
+    results["delete_files"] = measure(lambda: sync_engine.delete_synced_files(manifest_files, project_path), repeat, lambda: (clear_binaries(), extract(new_zip, False)))
+
+    print("Timing full sync...")
+    def full_sync():
+        ap.UI.messages.clear()
+        sync_binaries.initialize()
+        errors = [message for message in ap.UI.messages if message[0] == "error"]
+        if errors:
+            raise RuntimeError(errors)
+    results["run_sync_processes"] = measure(full_sync, repeat, lambda: (clear_binaries(), clear_local_data("tags"), clear_local_data("catalogue")))
+
+    # Phase breakdown of the last full sync, as recorded by the sync itself
+    with open(os.path.join(project_path, sync_trace.TRACE_NAME), 'r') as file:
+        sync_phases = json.loads(file.readlines()[-1])["phases"]
+
+    archive_size = os.path.getsize(new_zip)
+    uncompressed_size = sum(files.values())
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "parameters": vars(arguments) | {"archive_bytes": archive_size, "uncompressed_bytes": uncompressed_size},
+        "results": results,
+        "sync_phases": sync_phases
+    }
+
+def compare(previous, current):
+    print(f"{'benchmark':<28}{'previous':>12}{'current':>12}{'change':>10}")
+    for name, result in current["results"].items():
+        if name not in previous["results"]:
+            continue
+        before = previous["results"][name]["median"]
+        after = result["median"]
+        change = (after - before) / before * 100 if before else 0
+        print(f"{name:<28}{before:>11.3f}s{after:>11.3f}s{change:>+9.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Unreal binary sync")
+    parser.add_argument("--files", type=int, default=2000, help="Number of files in the archives")
+    parser.add_argument("--size-profile", choices=sorted(SIZE_PROFILES), default="small", help="Distribution of the file sizes")
+    parser.add_argument("--compression", choices=sorted(COMPRESSION), default="deflated")
+    parser.add_argument("--format", choices=ARCHIVE_FORMATS, default=".zip", help="Archive format of the synced builds")
+    parser.add_argument("--formats", default=".zip,.tar,.tar.zst" if importlib.util.find_spec("zstandard") else ".zip,.tar", help="Comma separated archive formats whose extraction is compared, e.g. .zip,.tar,.tar.zst")
+    parser.add_argument("--changed", type=float, default=0.05, help="Share of files that differ between the two builds")
+    parser.add_argument("--commits", type=int, default=2000, help="Number of commits in the git history")
+    parser.add_argument("--tag-every", type=int, default=100, help="Tag every n-th commit")
+    parser.add_argument("--ahead", type=int, default=25, help="Commits between HEAD and the newest tag")
+    parser.add_argument("--content-folders", type=int, default=200, help="Content folders per game project")
+    parser.add_argument("--workers", type=int, default=0, help="Extraction workers, 0 for auto")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Results of a previous run to compare against")
+    arguments = parser.parse_args()
+
+    previous = None
+    if arguments.compare:
+        with open(arguments.compare, 'r') as file:
+            previous = json.load(file)
+
+    results = run_benchmarks(arguments)
+    with open(arguments.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    for name, result in results["results"].items():
+        print(f"{name:<28}{result['median']:>10.3f}s")
+    if previous:
+        print()
+        compare(previous, results)
+
+if __name__ == "__main__":
+    main()
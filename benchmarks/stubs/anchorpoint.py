@@ -0,0 +1,57 @@
+# Minimal stand-in for the Anchorpoint module, so that the sync can run outside of the Anchorpoint client.
+# Only the parts used by the binary sync are implemented.
+
+class Context:
+    def __init__(self):
+        self.project_path = ""
+        self.project_id = "benchmark"
+        self.workspace_id = "benchmark"
+
+    def run_async(self, function, *args):
+        return function(*args)
+
+_context = Context()
+
+def get_context():
+    return _context
+
+class Progress:
+    def __init__(self, title, text="", infinite=False, **kwargs):
+        self.title = title
+        self.text = text
+        self.canceled = False
+        self.reports = 0
+
+    def set_cancelable(self, cancelable):
+        pass
+
+    def set_text(self, text):
+        self.text = text
+
+    def report_progress(self, value):
+        self.reports += 1
+
+    def finish(self):
+        pass
+
+class UI:
+    messages = []
+
+    def show_info(self, title, description=""):
+        UI.messages.append(("info", title, description))
+
+    def show_success(self, title, description=""):
+        UI.messages.append(("success", title, description))
+
+    def show_error(self, title, description=""):
+        UI.messages.append(("error", title, description))
+
+    def show_console(self):
+        pass
+
+class AnchorpointSettings:
+    pass
+
+class BrowseType:
+    Folder = "folder"
+    File = "file"
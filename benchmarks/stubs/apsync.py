@@ -0,0 +1,26 @@
+# Minimal stand-in for the apsync module. Settings are kept in memory and can be filled by the benchmark.
+
+_values = {}
+
+class Settings:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get(self, key, default=None):
+        return _values.get(key, default)
+
+    def set(self, key, value):
+        _values[key] = value
+
+    def store(self):
+        pass
+
+class SharedSettings(Settings):
+    pass
+
+class AccessLevel:
+    Member = "member"
+    Admin = "admin"
+
+def get_workspace_access(workspace_id):
+    return AccessLevel.Admin
@@ -0,0 +1,324 @@
+import bisect
+import io
+import os
+import re
+import tarfile
+import zipfile
+
+from local_storage import get_data_dir, get_path_key, read_json, write_json
+from zip_extraction import BUFFER_SIZE, create_directories, extract_files, get_target_path, open_target
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Archive extensions with their format and compression, in the order they are preferred when a commit has
+# archives in more than one format. zstd compressed tars decompress several times faster than deflate.
+ARCHIVE_FORMATS = [
+    (".tar.zst", "tar", "zst"),
+    (".tzst", "tar", "zst"),
+    (".zip", "zip", None),
+    (".tar", "tar", None),
+    (".tar.gz", "tar", "gz"),
+    (".tgz", "tar", "gz"),
+    (".tar.xz", "tar", "xz")
+]
+# Archives that were split into parts with e.g. 7-Zip or split: "<name>.zip.001", "<name>.zip.002", ...
+PART_SUFFIX = re.compile(r"\.(\d{3})$")
+
+def split_archive_name(file_name):
+    # Returns the name without extension and the format entry, or None if the file is not an archive or
+    # a part other than the first one of a split archive
+    part_match = PART_SUFFIX.search(file_name)
+    if part_match:
+        if part_match.group(1) != "001":
+            return None
+        file_name = file_name[:part_match.start()]
+    lower_name = file_name.lower()
+    for archive_format in ARCHIVE_FORMATS:
+        if lower_name.endswith(archive_format[0]):
+            return file_name[:-len(archive_format[0])], archive_format
+    return None
+
+def get_format_priority(archive_format):
+    # Formats that need a library that is not installed are only used when there is nothing else
+    priority = ARCHIVE_FORMATS.index(archive_format)
+    if archive_format[2] == "zst" and zstandard is None:
+        priority += len(ARCHIVE_FORMATS)
+    return priority
+
+def get_archive_parts(archive_path):
+    # All parts of a split archive, or just the archive itself
+    part_match = PART_SUFFIX.search(archive_path)
+    if not part_match:
+        return [archive_path]
+    base_path = archive_path[:part_match.start()]
+    parts = []
+    while os.path.exists(f"{base_path}.{len(parts) + 1:03d}"):
+        parts.append(f"{base_path}.{len(parts) + 1:03d}")
+    return parts or [archive_path]
+
+class MultiPartFile(io.RawIOBase):
+    # Presents the parts of a split archive as one seekable file
+    def __init__(self, part_paths):
+        self.part_paths = part_paths
+        self.offsets = [0]
+        for part_path in part_paths:
+            self.offsets.append(self.offsets[-1] + os.path.getsize(part_path))
+        self.position = 0
+        self.part_index = None
+        self.part_file = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.offsets[-1]
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.offsets[-1]:
+            return 0
+        part_index = bisect.bisect_right(self.offsets, self.position) - 1
+        if part_index != self.part_index:
+            if self.part_file:
+                self.part_file.close()
+            self.part_file = open(self.part_paths[part_index], 'rb')
+            self.part_index = part_index
+        self.part_file.seek(self.position - self.offsets[part_index])
+        size = min(len(buffer), self.offsets[part_index + 1] - self.position)
+        read_size = self.part_file.readinto(memoryview(buffer)[:size])
+        self.position += read_size
+        return read_size
+
+    def close(self):
+        if self.part_file:
+            self.part_file.close()
+            self.part_file = None
+        super().close()
+
+# Archives that are still being downloaded, mapped to a function that opens them. Reads from these files
+# wait until the requested bytes have arrived.
+streaming_files = {}
+
+def open_archive_file(part_paths):
+    if part_paths[0] in streaming_files:
+        return streaming_files[part_paths[0]]()
+    if len(part_paths) == 1:
+        return open(part_paths[0], 'rb')
+    return io.BufferedReader(MultiPartFile(part_paths), BUFFER_SIZE)
+
+class ArchiveEntry:
+    # Format independent entry. Zip entries have a CRC, tar entries the modification time of the file instead.
+    __slots__ = ("filename", "file_size", "CRC", "modified", "offset")
+
+    def __init__(self, filename, file_size, crc=None, modified=None, offset=None):
+        self.filename = filename
+        self.file_size = file_size
+        self.CRC = crc
+        self.modified = modified
+        self.offset = offset
+
+    def is_dir(self):
+        return self.filename.endswith("/")
+
+class ZipReader:
+    def __init__(self, part_paths):
+        self.file = open_archive_file(part_paths)
+        self.zip_file = zipfile.ZipFile(self.file, 'r')
+
+    def open(self, file_name):
+        return self.zip_file.open(file_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.zip_file.close()
+        self.file.close()
+
+class TarMemberReader:
+    # Reads one file of an uncompressed tar directly from its offset
+    def __init__(self, file, offset, size):
+        self.file = file
+        self.position = offset
+        self.remaining = size
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        if size == 0:
+            return b""
+        self.file.seek(self.position)
+        data = self.file.read(size)
+        self.position += len(data)
+        self.remaining -= len(data)
+        return data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+class TarReader:
+    def __init__(self, part_paths, members):
+        self.file = open_archive_file(part_paths)
+        self.members = members
+
+    def open(self, file_name):
+        offset, size = self.members[file_name]
+        return TarMemberReader(self.file, offset, size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+
+class ZipBackend:
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.part_paths = get_archive_parts(archive_path)
+
+    def entries(self):
+        with ZipReader(self.part_paths) as reader:
+            return [ArchiveEntry(file_info.filename, file_info.file_size, file_info.CRC) for file_info in reader.zip_file.infolist()]
+
+    def read(self, file_name):
+        # Returns the content of a small file in the archive, or None if it does not exist
+        with ZipReader(self.part_paths) as reader:
+            try:
+                return reader.zip_file.read(file_name)
+            except KeyError:
+                return None
+
+    def extract(self, entries, target_path, extraction_workers, is_canceled, report_progress):
+        return extract_files(lambda: ZipReader(self.part_paths), entries, target_path, extraction_workers, is_canceled, report_progress)
+
+class TarBackend:
+    def __init__(self, archive_path, compression):
+        if compression == "zst" and zstandard is None:
+            raise RuntimeError(f"{os.path.basename(archive_path)} is zstd compressed. Install the zstandard Python package to extract it.")
+        self.archive_path = archive_path
+        self.compression = compression
+        self.part_paths = get_archive_parts(archive_path)
+
+    def open_stream(self, file):
+        if self.compression == "zst":
+            return zstandard.ZstdDecompressor().stream_reader(file, read_size=BUFFER_SIZE, read_across_frames=True)
+        return file
+
+    def open_tar(self, file):
+        if self.compression in ("gz", "xz"):
+            return tarfile.open(fileobj=file, mode=f"r|{self.compression}")
+        # Uncompressed tars are opened seekable, so that the data of the members is skipped instead of read
+        return tarfile.open(fileobj=self.open_stream(file), mode="r:" if self.compression is None else "r|")
+
+    def get_index_path(self):
+        return os.path.join(get_data_dir("archive_index"), f"{get_path_key(self.archive_path)}.json")
+
+    def get_archive_stat(self):
+        return [[os.path.getsize(part_path), os.stat(part_path).st_mtime_ns] for part_path in self.part_paths]
+
+    def entries(self):
+        # Listing a compressed tar means decompressing all of it, so the listing is kept locally per archive
+        archive_stat = self.get_archive_stat()
+        index = read_json(self.get_index_path())
+        if index and index.get("stat") == archive_stat:
+            return [ArchiveEntry(name, size, None, modified, offset) for name, size, modified, offset in index["entries"]]
+
+        entries = []
+        with open_archive_file(self.part_paths) as file, self.open_tar(file) as tar:
+            for member in tar:
+                name = get_member_name(member)
+                if not name:
+                    continue
+                if member.isdir():
+                    entries.append(ArchiveEntry(name + "/", 0, None, int(member.mtime)))
+                elif member.isfile():
+                    offset = member.offset_data if self.compression is None else None
+                    entries.append(ArchiveEntry(name, member.size, None, int(member.mtime), offset))
+        write_json(self.get_index_path(), {
+            "archive": self.archive_path,
+            "stat": archive_stat,
+            "entries": [[entry.filename, entry.file_size, entry.modified, entry.offset] for entry in entries]
+        }, indent=None)
+        return entries
+
+    def read(self, file_name):
+        # Returns the content of a small file in the archive, or None if it does not exist. Compressed tars are
+        # read up to the file, so files that are read this way should be stored at the start of the archive.
+        with open_archive_file(self.part_paths) as file, self.open_tar(file) as tar:
+            for member in tar:
+                if get_member_name(member) == file_name and member.isfile():
+                    with tar.extractfile(member) as source:
+                        return source.read()
+        return None
+
+    def extract(self, entries, target_path, extraction_workers, is_canceled, report_progress):
+        # Uncompressed tars are extracted in parallel like zips, compressed ones in a single pass
+        if self.compression is None and all(entry.offset is not None for entry in entries if not entry.is_dir()):
+            members = {entry.filename: (entry.offset, entry.file_size) for entry in entries if not entry.is_dir()}
+            return extract_files(lambda: TarReader(self.part_paths, members), entries, target_path, extraction_workers, is_canceled, report_progress)
+        return self.extract_stream(entries, target_path, is_canceled, report_progress)
+
+    def extract_stream(self, entries, target_path, is_canceled, report_progress):
+        create_directories(entries, target_path)
+        pending = {entry.filename for entry in entries if not entry.is_dir()}
+        if not pending:
+            return True
+        total_bytes = sum(entry.file_size for entry in entries if not entry.is_dir())
+        written_bytes = 0
+
+        with open_archive_file(self.part_paths) as file, self.open_tar(file) as tar:
+            for member in tar:
+                name = get_member_name(member)
+                if name not in pending or not member.isfile():
+                    continue
+                with tar.extractfile(member) as source, open_target(get_target_path(target_path, name)) as target:
+                    while True:
+                        if is_canceled():
+                            return False
+                        chunk = source.read(BUFFER_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        written_bytes += len(chunk)
+                        report_progress(written_bytes / total_bytes if total_bytes else 0.0)
+                pending.discard(name)
+                # The rest of the archive does not have to be decompressed
+                if not pending:
+                    break
+
+        if pending:
+            raise IOError(f"{len(pending)} files are missing in {os.path.basename(self.archive_path)}")
+        report_progress(1.0)
+        return True
+
+def get_member_name(member):
+    name = member.name.replace("\\", "/")
+    while name.startswith("./"):
+        name = name[2:]
+    return name.strip("/")
+
+def open_archive(archive_path):
+    # Picks the backend from the extension of the archive that was found in the binary source
+    archive_name = split_archive_name(os.path.basename(archive_path))
+    if archive_name is None:
+        raise ValueError(f"{os.path.basename(archive_path)} is not a supported archive")
+    _, archive_type, compression = archive_name[1]
+    if archive_type == "zip":
+        return ZipBackend(archive_path)
+    return TarBackend(archive_path, compression)
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import time
+
+from local_storage import get_path_key, read_json, write_json
+from archive_backends import get_archive_parts
+
+# Archives are copied with large sequential reads, which is what network shares handle best
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+# Partial copies that were not written to for this long were left behind by a crash
+STALE_PARTIAL_SECONDS = 3600
+
+class ArchiveCache:
+    # Local copy of the archives from the binary source, capped in bytes and evicted least recently used first
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "archive_cache.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def load_index(self):
+        index = read_json(self.index_path, {})
+        # Forget archives that were removed from the cache folder by hand
+        return {name: entry for name, entry in index.items() if os.path.exists(os.path.join(self.cache_dir, name))}
+
+    def get(self, source_file, is_canceled=lambda: False, report_progress=lambda value: None):
+        # Returns the path of the local copy of source_file, or None if the copy was canceled
+        source_stat = os.stat(source_file)
+        name = f"{get_path_key(os.path.dirname(source_file))}/{os.path.basename(source_file)}"
+        local_file = os.path.join(self.cache_dir, name)
+
+        index = self.load_index()
+        entry = index.get(name)
+        if entry and entry["size"] == source_stat.st_size and entry["mtime"] == source_stat.st_mtime:
+            entry["last_used"] = time.time()
+            write_json(self.index_path, index)
+            return local_file
+
+        # Archives that don't fit at all are read from the source directly
+        if source_stat.st_size > self.max_bytes:
+            return source_file
+
+        index.pop(name, None)
+        self.evict(index, source_stat.st_size)
+
+        if not self.copy(source_file, local_file, source_stat.st_size, is_canceled, report_progress):
+            return None
+
+        # Only keep the copy if the archive did not change while it was copied
+        if os.path.getsize(local_file) != source_stat.st_size or os.stat(source_file).st_mtime != source_stat.st_mtime:
+            os.remove(local_file)
+            raise IOError(f"{os.path.basename(source_file)} changed while it was copied to the local cache")
+
+        index[name] = {
+            "source": source_file,
+            "size": source_stat.st_size,
+            "mtime": source_stat.st_mtime,
+            "last_used": time.time()
+        }
+        write_json(self.index_path, index)
+        return local_file
+
+    def get_archive(self, source_file, is_canceled=lambda: False, report_progress=lambda value: None):
+        # Like get, but split archives are cached part by part. The parts keep their names, so that the local
+        # copies are found next to each other. Returns the path of the first local part.
+        part_paths = get_archive_parts(source_file)
+        if len(part_paths) == 1:
+            return self.get(source_file, is_canceled, report_progress)
+
+        part_sizes = [os.path.getsize(part_path) for part_path in part_paths]
+        total_size = sum(part_sizes)
+        if total_size > self.max_bytes:
+            return source_file
+
+        local_files = []
+        copied_size = 0
+        for part_path, part_size in zip(part_paths, part_sizes):
+            local_file = self.get(part_path, is_canceled, lambda value: report_progress((copied_size + value * part_size) / total_size if total_size else 1.0))
+            if local_file is None:
+                return None
+            local_files.append(local_file)
+            copied_size += part_size
+
+        # Parts that were read from the source or evicted again mean that the archive has to come from the source
+        if any(local_file in part_paths or not os.path.exists(local_file) for local_file in local_files):
+            return source_file
+        return local_files[0]
+
+    def copy(self, source_file, local_file, size, is_canceled, report_progress):
+        os.makedirs(os.path.dirname(local_file), exist_ok=True)
+        self.remove_stale_partials(local_file)
+        # Every copy writes its own partial file, the sync and the prefetch may copy the same archive
+        file_descriptor, partial_file = tempfile.mkstemp(dir=os.path.dirname(local_file), prefix=os.path.basename(local_file) + ".", suffix=".partial")
+        copied = 0
+        try:
+            with open(source_file, 'rb') as source, os.fdopen(file_descriptor, 'wb') as target:
+                while True:
+                    if is_canceled():
+                        break
+                    chunk = source.read(COPY_BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    copied += len(chunk)
+                    report_progress(copied / size if size else 1.0)
+            if is_canceled():
+                os.remove(partial_file)
+                return False
+            os.replace(partial_file, local_file)
+        except BaseException:
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+            raise
+        return True
+
+    def remove_stale_partials(self, local_file):
+        prefix = os.path.basename(local_file) + "."
+        folder = os.path.dirname(local_file)
+        for file_name in os.listdir(folder):
+            if file_name.startswith(prefix) and file_name.endswith(".partial"):
+                partial_file = os.path.join(folder, file_name)
+                try:
+                    if time.time() - os.path.getmtime(partial_file) > STALE_PARTIAL_SECONDS:
+                        os.remove(partial_file)
+                except OSError:
+                    pass
+
+    def evict(self, index, required_bytes):
+        # Remove the least recently used archives until the new one fits
+        used_bytes = sum(entry["size"] for entry in index.values())
+        for name, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+            if used_bytes + required_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            used_bytes -= entry["size"]
+            del index[name]
+        write_json(self.index_path, index)
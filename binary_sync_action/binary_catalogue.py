@@ -0,0 +1,118 @@
+import os
+import re
+
+from local_storage import get_data_dir, get_path_key, read_json, write_json
+from archive_backends import split_archive_name, get_format_priority
+from delta_sync import get_delta_commit_ids
+
+COMMIT_ID = re.compile(r"^[0-9a-f]{40}$")
+SHARD_REST = re.compile(r"^[0-9a-f]{38}$")
+
+def get_archive_commit_id(folder_name, file_name):
+    # Supports "<commit>.zip" in any folder and git object style shards like "ab/<38 more characters>.zip",
+    # also with the other archive formats and split archives ("<commit>.tar.zst", "<commit>.zip.001")
+    archive_name = split_archive_name(file_name)
+    if archive_name is None:
+        return None
+    stem = archive_name[0].lower()
+    if COMMIT_ID.match(stem):
+        return stem
+    if SHARD_REST.match(stem) and re.match(r"^[0-9a-f]{2}$", folder_name.lower()):
+        return folder_name.lower() + stem
+    return None
+
+def get_archive_priority(file_name):
+    return get_format_priority(split_archive_name(file_name)[1])
+
+def add_archive_file(folder, folder_name, file_name):
+    # Sorts a file of a listed folder into its archives or delta archives, ignoring everything else
+    archive_name = split_archive_name(file_name)
+    delta_commit_ids = get_delta_commit_ids(archive_name[0]) if archive_name else None
+    if delta_commit_ids:
+        parents = folder["deltas"].setdefault(delta_commit_ids[0], {})
+        existing_name = parents.get(delta_commit_ids[1])
+        if existing_name is None or get_archive_priority(file_name) < get_archive_priority(existing_name):
+            parents[delta_commit_ids[1]] = file_name
+        return
+    commit_id = get_archive_commit_id(folder_name, file_name)
+    # Pick the fastest format if a commit has archives in more than one
+    existing_name = folder["archives"].get(commit_id)
+    if commit_id and (existing_name is None or get_archive_priority(file_name) < get_archive_priority(existing_name)):
+        folder["archives"][commit_id] = file_name
+
+class BinaryCatalogue:
+    # Maps commit IDs to the archives in the binary source, and to the delta archives against their parents.
+    # The folder tree is scanned once with os.scandir and stored locally. On the next refresh only folders
+    # whose mtime changed are listed again.
+    def __init__(self, source_path, max_depth=3):
+        self.source_path = source_path
+        self.max_depth = max_depth
+        self.cache_path = os.path.join(get_data_dir("catalogue"), f"{get_path_key(source_path)}.json")
+        self.folders = read_json(self.cache_path, {}).get("folders", {})
+        self.archives = {}
+        self.deltas = {}
+        self.scanned_folders = 0
+
+    def refresh(self):
+        folders = {}
+        self.scanned_folders = 0
+        self.refresh_folder("", 0, folders)
+        if folders != self.folders:
+            self.folders = folders
+            write_json(self.cache_path, {"source_path": self.source_path, "folders": folders})
+
+        # Flatten the folders, archives closer to the root win if a commit shows up more than once
+        self.archives = {}
+        self.deltas = {}
+        for folder in sorted(folders, key=lambda folder: (folder.count("/"), folder), reverse=True):
+            for commit_id, file_name in folders[folder]["archives"].items():
+                self.archives[commit_id] = f"{folder}/{file_name}" if folder else file_name
+            for commit_id, parents in folders[folder]["deltas"].items():
+                for parent_id, file_name in parents.items():
+                    self.deltas.setdefault(commit_id, {})[parent_id] = f"{folder}/{file_name}" if folder else file_name
+        return self
+
+    def refresh_folder(self, relative_folder, depth, folders):
+        folder_path = os.path.join(self.source_path, *relative_folder.split("/")) if relative_folder else self.source_path
+        mtime = os.stat(folder_path).st_mtime_ns
+
+        cached_folder = self.folders.get(relative_folder)
+        if cached_folder and cached_folder["mtime"] == mtime and "deltas" in cached_folder:
+            folder = cached_folder
+        else:
+            folder = {"mtime": mtime, "archives": {}, "deltas": {}, "subfolders": []}
+            self.scanned_folders += 1
+            folder_name = os.path.basename(folder_path)
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir():
+                        folder["subfolders"].append(entry.name)
+                    elif entry.is_file():
+                        add_archive_file(folder, folder_name, entry.name)
+            folder["subfolders"].sort()
+        folders[relative_folder] = folder
+
+        if depth < self.max_depth:
+            for subfolder in folder["subfolders"]:
+                try:
+                    self.refresh_folder(f"{relative_folder}/{subfolder}" if relative_folder else subfolder, depth + 1, folders)
+                except FileNotFoundError:
+                    pass
+
+    def commit_ids(self):
+        return set(self.archives)
+
+    def find_delta(self, commit_id, parent_id):
+        relative_path = self.deltas.get(commit_id, {}).get(parent_id)
+        if relative_path is None:
+            return None
+        return os.path.join(self.source_path, *relative_path.split("/"))
+
+    def find(self, commit_id):
+        # Returns the full path of the archive for a commit, or None
+        relative_path = self.archives.get(commit_id.lower())
+        if relative_path is None:
+            return None
+        return os.path.join(self.source_path, *relative_path.split("/"))
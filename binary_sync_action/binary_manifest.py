@@ -0,0 +1,208 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from local_storage import read_json, write_json
+from zip_extraction import get_worker_count
+
+MANIFEST_NAME = "extracted_binaries.json"
+LEGACY_LIST_NAME = "extracted_binaries.txt"
+CRC_BUFFER_SIZE = 4 * 1024 * 1024
+
+# The manifest records every file of the last sync with its size, mtime (ns) and CRC32:
+# {"version": 1, "source": "<archive name>", "commit": "<commit id>", "files": {"Engine/Binaries/...": {"size": 1, "mtime": 2, "crc": 3}}}
+# Tar archives have no checksums, their files are recorded with "crc": None and the "modified" time from the archive.
+# With an extraction profile, "profile" holds its rules and "skipped" the files of the archive that were not extracted.
+
+def get_manifest_path(project_path):
+    return os.path.join(project_path, MANIFEST_NAME)
+
+def read_legacy_list(project_path):
+    # extracted_binaries.txt from older versions, with or without size and CRC columns
+    legacy_list_path = os.path.join(project_path, LEGACY_LIST_NAME)
+    if not os.path.exists(legacy_list_path):
+        return None
+
+    files = {}
+    with open(legacy_list_path, 'r') as file:
+        header = file.readline().strip()
+        next(file, None)  # Skip separator line
+        for line in file:
+            parts = line.rstrip("\n").split("\t")
+            if not parts[0] or parts[0].endswith("/"):
+                continue
+            entry = {"size": None, "mtime": None, "crc": None}
+            if len(parts) == 3:
+                try:
+                    entry.update(size=int(parts[1]), crc=int(parts[2], 16))
+                except ValueError:
+                    pass
+            files[parts[0]] = entry
+
+    # Lists with file names only can't be verified, so they are treated like a sync from an unknown archive
+    source_name = header[len("Binary sync from "):]
+    if any(entry["size"] is None for entry in files.values()):
+        source_name = None
+    return {"version": 1, "source": source_name, "files": files}
+
+def read_manifest(project_path):
+    # Returns the manifest of the last sync, or an empty one if nothing was synced yet
+    manifest = read_json(get_manifest_path(project_path))
+    if manifest is None:
+        manifest = read_legacy_list(project_path)
+    return manifest or {"version": 1, "source": None, "files": {}}
+
+def get_manifest_entry(file_info, disk_stat):
+    entry = {
+        "size": file_info.file_size,
+        "mtime": disk_stat[1] if disk_stat else None,
+        "crc": file_info.CRC
+    }
+    if file_info.CRC is None:
+        entry["modified"] = file_info.modified
+    return entry
+
+def get_profile_fields(profile, skipped_files):
+    if profile is None:
+        return {}
+    return {"profile": profile, "skipped": sorted(skipped_files)}
+
+def write_manifest(project_path, source_name, file_infos, disk_stats, commit_id=None, profile=None, skipped_files=()):
+    files = {}
+    for file_info in file_infos:
+        if not file_info.is_dir():
+            files[file_info.filename] = get_manifest_entry(file_info, disk_stats.get(file_info.filename))
+    store_manifest(project_path, {"version": 1, "source": source_name, "commit": commit_id, "files": files, **get_profile_fields(profile, skipped_files)})
+
+def write_delta_manifest(project_path, manifest, source_name, commit_id, file_infos, deleted_files, disk_stats, profile=None, skipped_files=()):
+    # The files of the previous build, without the deleted ones and with the ones from the delta archives.
+    # Skipped files of the previous build stay skipped unless a delta archive removes or extracts them.
+    deleted_set = set(deleted_files)
+    files = {file_name: entry for file_name, entry in manifest["files"].items() if file_name not in deleted_set}
+    for file_info in file_infos:
+        if not file_info.is_dir():
+            files[file_info.filename] = get_manifest_entry(file_info, disk_stats.get(file_info.filename))
+    skipped = {file_name for file_name in manifest.get("skipped", []) if file_name not in deleted_set and file_name not in files}
+    skipped.update(skipped_files)
+    store_manifest(project_path, {"version": 1, "source": source_name, "commit": commit_id, "files": files, **get_profile_fields(profile, skipped)})
+
+def store_manifest(project_path, manifest):
+    write_json(get_manifest_path(project_path), manifest, indent=None)
+
+    # The manifest replaces the plain file list of older versions
+    legacy_list_path = os.path.join(project_path, LEGACY_LIST_NAME)
+    if os.path.exists(legacy_list_path):
+        os.remove(legacy_list_path)
+
+def update_manifest(project_path, manifest, disk_stats):
+    # Store the new mtimes of files that were repaired
+    for file_name, disk_stat in disk_stats.items():
+        if file_name in manifest["files"] and disk_stat:
+            manifest["files"][file_name]["mtime"] = disk_stat[1]
+    store_manifest(project_path, manifest)
+
+def add_pulled_files(project_path, manifest, file_infos, disk_stats):
+    # Files that were skipped by the extraction profile and extracted later on request
+    for file_info in file_infos:
+        manifest["files"][file_info.filename] = get_manifest_entry(file_info, disk_stats.get(file_info.filename))
+    pulled_files = {file_info.filename for file_info in file_infos}
+    manifest["skipped"] = [file_name for file_name in manifest.get("skipped", []) if file_name not in pulled_files]
+    store_manifest(project_path, manifest)
+
+def run_parallel(function, items, workers):
+    # Runs function on chunks of items on a thread pool and merges the returned dicts
+    items = list(items)
+    if not items:
+        return {}
+    worker_count = min(get_worker_count(workers), len(items))
+    chunks = [items[index::worker_count] for index in range(worker_count)]
+    results = {}
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        for result in executor.map(function, chunks):
+            results.update(result)
+    return results
+
+def stat_files(project_path, file_names, workers=0):
+    # Returns file name -> (size, mtime in ns), or None for files that are missing
+    def stat_chunk(chunk):
+        stats = {}
+        for file_name in chunk:
+            try:
+                file_stat = os.stat(os.path.join(project_path, file_name))
+                stats[file_name] = (file_stat.st_size, file_stat.st_mtime_ns)
+            except OSError:
+                stats[file_name] = None
+        return stats
+    return run_parallel(stat_chunk, file_names, workers)
+
+def crc_files(project_path, file_names, workers=0):
+    # Returns file name -> CRC32 of the file content, or None for files that can't be read
+    def crc_chunk(chunk):
+        crcs = {}
+        for file_name in chunk:
+            try:
+                crc = 0
+                with open(os.path.join(project_path, file_name), 'rb') as file:
+                    while True:
+                        data = file.read(CRC_BUFFER_SIZE)
+                        if not data:
+                            break
+                        crc = zlib.crc32(data, crc)
+                crcs[file_name] = crc
+            except OSError:
+                crcs[file_name] = None
+        return crcs
+    return run_parallel(crc_chunk, file_names, workers)
+
+def is_file_intact(entry, disk_stat):
+    if disk_stat is None or entry.get("size") is None:
+        return False
+    size, mtime = disk_stat
+    return size == entry["size"] and (entry.get("mtime") is None or mtime == entry["mtime"])
+
+def verify_files(project_path, manifest, workers=0, check_crc=False):
+    # Returns the files of the manifest that are missing or don't match the recorded size, mtime or CRC
+    files = manifest["files"]
+    disk_stats = stat_files(project_path, files, workers)
+    broken_files = [file_name for file_name, entry in files.items() if not is_file_intact(entry, disk_stats[file_name])]
+
+    if check_crc:
+        broken_set = set(broken_files)
+        intact_files = [file_name for file_name in files if file_name not in broken_set and files[file_name].get("crc") is not None]
+        crcs = crc_files(project_path, intact_files, workers)
+        broken_files.extend(file_name for file_name in intact_files if crcs[file_name] != files[file_name].get("crc"))
+    return sorted(broken_files)
+
+def is_same_entry(entry, file_info):
+    if entry.get("size") != file_info.file_size:
+        return False
+    if file_info.CRC is not None:
+        return entry.get("crc") == file_info.CRC
+    return file_info.modified is not None and entry.get("modified") == file_info.modified
+
+def get_changed_files(file_infos, manifest, disk_stats):
+    # Compare the central directory of the archive with the manifest of the previous sync. An entry is
+    # skipped when size and CRC32 (or the modified time for tars) match the manifest and the file on disk still
+    # has the recorded size and mtime.
+    files = manifest["files"]
+    changed_infos = []
+    for file_info in file_infos:
+        if file_info.is_dir():
+            # Directories are cheap to create, so they are always passed on
+            changed_infos.append(file_info)
+            continue
+        entry = files.get(file_info.filename)
+        if entry and is_same_entry(entry, file_info) and is_file_intact(entry, disk_stats.get(file_info.filename)):
+            continue
+        changed_infos.append(file_info)
+
+    archive_files = {file_info.filename for file_info in file_infos}
+    removed_files = [file_name for file_name in files if file_name not in archive_files]
+    return changed_infos, removed_files
+
+def get_sync_plan(file_infos, manifest, project_path, incremental=True, workers=0):
+    # Returns the entries to extract and the files to delete to get from the manifest to the archive
+    if incremental:
+        disk_stats = stat_files(project_path, manifest["files"], workers)
+        return get_changed_files(file_infos, manifest, disk_stats)
+    return file_infos, list(manifest["files"])
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from local_storage import read_json, write_json
+from zip_extraction import BUFFER_SIZE, get_target_path, get_worker_count
+
+# Extracted files of previous builds, stored once per SHA-256 in objects/<2 chars>/<hash>. Every build that was
+# synced has a manifest in builds/ that maps its files to objects, so that switching back to it links the
+# files into the project instead of extracting them again. Links are reflinks where the file system supports
+# them and hard links otherwise, files are only copied if neither works, e.g. across drives.
+STORE_DIR_NAME = ".binary_sync_store"
+# Linux ioctl that clones a file on Btrfs and XFS
+FICLONE = 0x40049409
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+def hash_file(file_path):
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        while True:
+            data = file.read(BUFFER_SIZE)
+            if not data:
+                break
+            file_hash.update(data)
+    return file_hash.hexdigest()
+
+class ContentStore:
+    def __init__(self, store_path, max_bytes):
+        self.store_path = store_path
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(store_path, "objects.json")
+        self.builds_path = os.path.join(store_path, "builds")
+        self.reflinks = fcntl is not None
+        self.lock = threading.Lock()
+        os.makedirs(self.builds_path, exist_ok=True)
+        # Size and mtime of every object. A hard linked project file that was changed in place changes the
+        # object as well, which is noticed by its mtime.
+        self.objects = read_json(self.index_path, {})
+
+    def get_object_path(self, file_hash):
+        return os.path.join(self.store_path, "objects", file_hash[:2], file_hash)
+
+    def get_build_path(self, source_name):
+        return os.path.join(self.builds_path, f"{source_name}.json")
+
+    def is_object_valid(self, file_hash):
+        try:
+            object_stat = os.stat(self.get_object_path(file_hash))
+        except OSError:
+            return False
+        return self.objects.get(file_hash) == [object_stat.st_size, object_stat.st_mtime_ns]
+
+    def link_file(self, source_path, target_path):
+        # Links source_path to the new path target_path
+        if self.reflinks:
+            try:
+                with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+                    fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+                return
+            except OSError:
+                # Not supported by this file system, don't try again for the next files
+                self.reflinks = False
+                os.remove(target_path)
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            shutil.copy2(source_path, target_path)
+
+    def replace_with_object(self, file_hash, target_path):
+        # The link is created next to the target and renamed, so the target is never missing
+        temp_path = f"{target_path}.{os.getpid()}.tmp"
+        self.link_file(self.get_object_path(file_hash), temp_path)
+        os.replace(temp_path, target_path)
+
+    def checkout(self, source_name, file_infos, project_path):
+        # Links the files that the store has for this build into the project. Returns the linked entries and
+        # the entries that still have to be extracted.
+        build = read_json(self.get_build_path(source_name))
+        if not build:
+            return [], file_infos
+        linked_infos = []
+        remaining_infos = []
+        for file_info in file_infos:
+            stored_file = build["files"].get(file_info.filename)
+            if file_info.is_dir() or not stored_file or stored_file[1] != file_info.file_size or not self.is_object_valid(stored_file[0]):
+                remaining_infos.append(file_info)
+                continue
+            target_path = get_target_path(project_path, file_info.filename)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            self.replace_with_object(stored_file[0], target_path)
+            linked_infos.append(file_info)
+        return linked_infos, remaining_infos
+
+    def add_file(self, file_path):
+        # Returns the hash of a file in the project after storing it. A file that is already stored is replaced by
+        # a link to the object, so that identical files of different builds share the disk space.
+        file_hash = hash_file(file_path)
+        object_path = self.get_object_path(file_hash)
+        # Hashing runs in parallel, but two identical files of a build must not create the object at the same time
+        with self.lock:
+            if self.is_object_valid(file_hash):
+                if not os.path.samefile(file_path, object_path):
+                    self.replace_with_object(file_hash, file_path)
+                return file_hash
+            if os.path.exists(object_path):
+                os.remove(object_path)
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            self.link_file(file_path, object_path)
+            object_stat = os.stat(object_path)
+            self.objects[file_hash] = [object_stat.st_size, object_stat.st_mtime_ns]
+        return file_hash
+
+    def add_build(self, source_name, file_infos, project_path, workers=0):
+        # Records the build that was just synced into the project. Hashes that are known from earlier builds
+        # of this project are taken over for files with the same size and CRC or tar modification time, only the
+        # other files are read.
+        build_path = self.get_build_path(source_name)
+        known_files = {}
+        for existing_path in self.get_build_paths():
+            existing_build = read_json(existing_path)
+            if existing_build and existing_build.get("project") == project_path:
+                known_files.update(existing_build["files"])
+
+        def store_file(file_info):
+            known_file = known_files.get(file_info.filename)
+            entry_key = [file_info.file_size, file_info.CRC, file_info.modified]
+            if known_file and known_file[1:] == entry_key and entry_key[1:] != [None, None] and self.is_object_valid(known_file[0]):
+                return known_file[0]
+            return self.add_file(get_target_path(project_path, file_info.filename))
+
+        stored_infos = [file_info for file_info in file_infos if not file_info.is_dir()]
+        with ThreadPoolExecutor(max_workers=get_worker_count(workers)) as executor:
+            file_hashes = list(executor.map(store_file, stored_infos))
+
+        write_json(build_path, {
+            "source": source_name,
+            "project": project_path,
+            "last_used": time.time(),
+            "files": {file_info.filename: [file_hash, file_info.file_size, file_info.CRC, file_info.modified] for file_info, file_hash in zip(stored_infos, file_hashes)}
+        }, indent=None)
+        self.collect_garbage(keep=build_path)
+
+    def get_build_paths(self):
+        return [os.path.join(self.builds_path, name) for name in os.listdir(self.builds_path) if name.endswith(".json")]
+
+    def collect_garbage(self, keep=None):
+        # Forgets the least recently used builds until the objects they reference fit into the size cap, then
+        # removes every object that no remaining build references. The build in the project is always kept.
+        builds = []
+        for build_path in self.get_build_paths():
+            build = read_json(build_path)
+            if build:
+                builds.append((build_path, build))
+        builds.sort(key=lambda item: (item[0] == keep, item[1].get("last_used", 0)))
+
+        def get_referenced(builds):
+            return {file[0] for _, build in builds for file in build["files"].values()}
+
+        referenced = get_referenced(builds)
+        while len(builds) > 1 and sum(self.objects.get(file_hash, [0])[0] for file_hash in referenced) > self.max_bytes:
+            build_path, _ = builds.pop(0)
+            os.remove(build_path)
+            referenced = get_referenced(builds)
+
+        # Objects are listed from disk, so that objects of a sync that crashed before the index was written go too
+        objects_path = os.path.join(self.store_path, "objects")
+        for root, _, files in os.walk(objects_path):
+            for file_hash in files:
+                if file_hash not in referenced:
+                    try:
+                        os.remove(os.path.join(root, file_hash))
+                    except OSError:
+                        pass
+        self.objects = {file_hash: value for file_hash, value in self.objects.items() if file_hash in referenced}
+        write_json(self.index_path, self.objects, indent=None)
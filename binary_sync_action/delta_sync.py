@@ -0,0 +1,96 @@
+import collections
+import json
+import os
+import re
+
+from archive_backends import open_archive
+
+# A delta archive "<commit>.delta-<parent commit>.zip" (or any other archive format) only contains the files
+# that were added or changed since the parent build. It lists the files that were removed in a JSON file at
+# the start of the archive: {"parent": "<parent commit>", "deleted": ["Engine/Binaries/Win64/Old.dll", ...]}
+DELTA_INFO_NAME = ".binary_sync_delta.json"
+DELTA_STEM = re.compile(r"^([0-9a-f]{40})\.delta-([0-9a-f]{40})$")
+# Longer chains read more small archives than one full archive is worth
+MAX_CHAIN_LENGTH = 8
+
+def get_delta_commit_ids(stem):
+    # Returns (commit, parent commit) for the name of a delta archive without extension, or None
+    match = DELTA_STEM.match(stem.lower())
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+def get_children(deltas):
+    # deltas maps commit -> {parent commit: archive}, the chains are searched from the parent side
+    children = collections.defaultdict(list)
+    for commit_id, parents in deltas.items():
+        for parent_id in parents:
+            children[parent_id].append(commit_id)
+    return children
+
+def get_reachable_commits(deltas, base_commit, max_length=MAX_CHAIN_LENGTH):
+    # Commits that can be synced from base_commit with delta archives only. The base itself is included, it
+    # is already on disk.
+    if not base_commit:
+        return set()
+    children = get_children(deltas)
+    reachable = {base_commit: 0}
+    queue = collections.deque([base_commit])
+    while queue:
+        commit_id = queue.popleft()
+        if reachable[commit_id] >= max_length:
+            continue
+        for child_id in children.get(commit_id, []):
+            if child_id not in reachable:
+                reachable[child_id] = reachable[commit_id] + 1
+                queue.append(child_id)
+    return set(reachable)
+
+def find_delta_chain(deltas, base_commit, target_commit, max_length=MAX_CHAIN_LENGTH):
+    # Shortest list of (parent, commit) steps from base_commit to target_commit, or None
+    if not base_commit or base_commit == target_commit:
+        return None
+    children = get_children(deltas)
+    previous = {base_commit: None}
+    queue = collections.deque([(base_commit, 0)])
+    while queue:
+        commit_id, length = queue.popleft()
+        if commit_id == target_commit:
+            chain = []
+            while previous[commit_id] is not None:
+                chain.append((previous[commit_id], commit_id))
+                commit_id = previous[commit_id]
+            return chain[::-1]
+        if length >= max_length:
+            continue
+        for child_id in sorted(children.get(commit_id, [])):
+            if child_id not in previous:
+                previous[child_id] = commit_id
+                queue.append((child_id, length + 1))
+    return None
+
+def read_delta_info(archive):
+    content = archive.read(DELTA_INFO_NAME)
+    if content is None:
+        raise IOError(f"{os.path.basename(archive.archive_path)} is not a delta archive, {DELTA_INFO_NAME} is missing")
+    return json.loads(content)
+
+def get_delta_plan(delta_paths):
+    # Combines the chain into one plan, so that every file is only extracted from the last delta that contains
+    # it. Returns the archives with their entries to extract, all entries of the result and the deleted files.
+    archives = [open_archive(delta_path) for delta_path in delta_paths]
+    latest = {}
+    deleted_files = set()
+    for archive_index, archive in enumerate(archives):
+        for file_name in read_delta_info(archive).get("deleted", []):
+            latest.pop(file_name, None)
+            deleted_files.add(file_name)
+        for file_info in archive.entries():
+            if file_info.filename == DELTA_INFO_NAME:
+                continue
+            latest[file_info.filename] = (archive_index, file_info)
+            deleted_files.discard(file_info.filename)
+
+    extraction = [(archive, [file_info for index, file_info in latest.values() if index == archive_index]) for archive_index, archive in enumerate(archives)]
+    file_infos = [file_info for _, file_info in latest.values()]
+    return extraction, file_infos, sorted(deleted_files)
@@ -0,0 +1,67 @@
+import fnmatch
+import os
+
+# Extraction profiles select the files of an archive that are extracted, e.g. so that artists skip the debug
+# symbols. They are defined in the shared settings as "<name>: <rules>", separated by semicolons:
+#   Artist: -*.pdb -*/Linux/*; Programmer: *
+# Rules are globs on the path in the archive. A file is extracted when it matches one of the rules without a
+# prefix (or there are none) and none of the rules starting with "-".
+DEFAULT_PROFILES = "Artist: -*.pdb; Programmer: *"
+ALL_FILES_PROFILE = "All Files"
+
+def parse_profile(definition):
+    # Returns {"name": ..., "include": [...], "exclude": [...]} or None if the definition has no name
+    name, _, rules = definition.partition(":")
+    name = name.strip()
+    if not name:
+        return None
+    include = []
+    exclude = []
+    for rule in rules.split():
+        if rule.startswith("-"):
+            exclude.append(rule[1:])
+        else:
+            include.append(rule[1:] if rule.startswith("+") else rule)
+    return {"name": name, "include": include, "exclude": exclude}
+
+def parse_profiles(text):
+    profiles = [parse_profile(definition) for definition in (text or "").split(";")]
+    return [profile for profile in profiles if profile]
+
+def get_profile(text, name):
+    # Returns the profile with this name, or None to extract every file
+    for profile in parse_profiles(text):
+        if profile["name"] == name:
+            return profile
+    return None
+
+def matches(file_name, patterns):
+    return any(fnmatch.fnmatchcase(file_name.lower(), pattern.lower()) for pattern in patterns)
+
+def is_included(file_name, profile):
+    if profile is None:
+        return True
+    if profile["include"] and not matches(file_name, profile["include"]):
+        return False
+    return not matches(file_name, profile["exclude"])
+
+def split_entries(file_infos, profile):
+    # Returns the entries to extract and the names of the files that the profile skips
+    if profile is None:
+        return file_infos, []
+    included_infos = []
+    skipped_files = []
+    for file_info in file_infos:
+        if file_info.is_dir() or is_included(file_info.filename, profile):
+            included_infos.append(file_info)
+        else:
+            skipped_files.append(file_info.filename)
+    return included_infos, skipped_files
+
+def get_module_name(file_name):
+    # UnrealEditor-Engine.pdb and UnrealEditor-Engine.dll belong to the module UnrealEditor-Engine
+    return os.path.basename(file_name).split(".", 1)[0]
+
+def find_module_files(file_names, module_pattern):
+    # Files of the modules that match the name or glob, e.g. UnrealEditor-Engine or UnrealEditor-Anim*
+    return [file_name for file_name in file_names if fnmatch.fnmatchcase(get_module_name(file_name).lower(), module_pattern.lower())]
@@ -0,0 +1,321 @@
+import heapq
+import mmap
+import os
+import struct
+import zlib
+
+# Reads refs and objects straight from the .git folder, so that the sync path does not have to spawn git.
+# Everything that is not covered here (reftable, sha256 repositories, very long delta chains) returns None
+# or raises PackWalkRequired, and the caller falls back to the git command line.
+
+OBJECT_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+OFS_DELTA = 6
+REF_DELTA = 7
+MAX_DELTA_DEPTH = 100
+
+class PackWalkRequired(Exception):
+    pass
+
+def is_supported(common_dir):
+    # Repositories with the reftable backend or sha256 object ids are left to git
+    if os.path.isdir(os.path.join(common_dir, "reftable")):
+        return False
+    config_path = os.path.join(common_dir, "config")
+    if os.path.exists(config_path):
+        with open(config_path, 'r', errors="ignore") as file:
+            config = file.read().lower()
+        if "objectformat" in config and "sha256" in config:
+            return False
+    return True
+
+def read_packed_refs(common_dir):
+    # Returns a dict of ref name to (object id, peeled commit id). The peeled id is None for refs that
+    # don't point to an annotated tag, or if packed-refs was written without peeling information.
+    packed_refs = {}
+    fully_peeled = False
+    packed_refs_path = os.path.join(common_dir, "packed-refs")
+    if not os.path.exists(packed_refs_path):
+        return packed_refs, True
+
+    last_ref = None
+    with open(packed_refs_path, 'r') as file:
+        for line in file:
+            line = line.rstrip("\n")
+            if line.startswith("#"):
+                fully_peeled = "fully-peeled" in line
+            elif line.startswith("^") and last_ref:
+                packed_refs[last_ref] = (packed_refs[last_ref][0], line[1:])
+            elif line:
+                object_id, ref_name = line.split(" ", 1)
+                packed_refs[ref_name] = (object_id, None)
+                last_ref = ref_name
+    return packed_refs, fully_peeled
+
+def read_loose_refs(common_dir, prefix):
+    loose_refs = {}
+    refs_root = os.path.join(common_dir, *prefix.split("/"))
+    for root, dirs, files in os.walk(refs_root):
+        for file_name in files:
+            if file_name.endswith(".lock"):
+                continue
+            ref_path = os.path.join(root, file_name)
+            with open(ref_path, 'r') as file:
+                object_id = file.read().strip()
+            ref_name = prefix + "/" + os.path.relpath(ref_path, refs_root).replace(os.sep, "/")
+            loose_refs[ref_name] = object_id
+    return loose_refs
+
+def resolve_ref(git_dir, common_dir, ref_name, packed_refs=None, depth=0):
+    # Follows symbolic refs like HEAD -> refs/heads/main and returns the object id, or None
+    if depth > 5:
+        return None
+    for base_dir in (git_dir, common_dir):
+        ref_path = os.path.join(base_dir, *ref_name.split("/"))
+        if os.path.isfile(ref_path):
+            with open(ref_path, 'r') as file:
+                content = file.read().strip()
+            if content.startswith("ref:"):
+                return resolve_ref(git_dir, common_dir, content[4:].strip(), packed_refs, depth + 1)
+            return content or None
+
+    if packed_refs is None:
+        packed_refs, fully_peeled = read_packed_refs(common_dir)
+    packed_ref = packed_refs.get(ref_name)
+    return packed_ref[0] if packed_ref else None
+
+def read_head(git_dir, common_dir):
+    if not is_supported(common_dir):
+        return None
+    return resolve_ref(git_dir, common_dir, "HEAD")
+
+class ObjectReader:
+    # Reads loose objects and objects from pack files
+    def __init__(self, common_dir):
+        self.objects_dir = os.path.join(common_dir, "objects")
+        self.packs = None
+
+    def close(self):
+        for pack in self.packs or []:
+            pack["index"].close()
+            pack["file"].close()
+        self.packs = None
+
+    def load_packs(self):
+        self.packs = []
+        pack_dir = os.path.join(self.objects_dir, "pack")
+        if not os.path.isdir(pack_dir):
+            return
+        for file_name in os.listdir(pack_dir):
+            if not file_name.endswith(".idx"):
+                continue
+            pack_path = os.path.join(pack_dir, file_name[:-4] + ".pack")
+            if not os.path.exists(pack_path):
+                continue
+            with open(os.path.join(pack_dir, file_name), 'rb') as index_file:
+                index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if index[:8] != b"\377tOc\x00\x00\x00\x02":
+                index.close()
+                continue
+            self.packs.append({"index": index, "file": open(pack_path, 'rb'), "count": struct.unpack(">I", index[8 + 255 * 4:8 + 256 * 4])[0]})
+
+    def find_pack_offset(self, pack, object_id):
+        # Binary search in the sorted object ids of a version 2 pack index
+        index = pack["index"]
+        count = pack["count"]
+        binary_id = bytes.fromhex(object_id)
+        first_byte = binary_id[0]
+        low = struct.unpack(">I", index[8 + (first_byte - 1) * 4:8 + first_byte * 4])[0] if first_byte else 0
+        high = struct.unpack(">I", index[8 + first_byte * 4:12 + first_byte * 4])[0]
+        ids_start = 8 + 256 * 4
+        while low < high:
+            middle = (low + high) // 2
+            middle_id = index[ids_start + middle * 20:ids_start + middle * 20 + 20]
+            if middle_id < binary_id:
+                low = middle + 1
+            elif middle_id > binary_id:
+                high = middle
+            else:
+                offsets_start = ids_start + count * 24
+                offset = struct.unpack(">I", index[offsets_start + middle * 4:offsets_start + middle * 4 + 4])[0]
+                if offset & 0x80000000:
+                    large_offsets_start = offsets_start + count * 4
+                    large_index = offset & 0x7fffffff
+                    offset = struct.unpack(">Q", index[large_offsets_start + large_index * 8:large_offsets_start + large_index * 8 + 8])[0]
+                return offset
+        return None
+
+    def read_packed_object(self, pack, offset, depth=0):
+        pack_file = pack["file"]
+        pack_file.seek(offset)
+        byte = pack_file.read(1)[0]
+        object_type = (byte >> 4) & 7
+        size = byte & 15
+        shift = 4
+        while byte & 0x80:
+            byte = pack_file.read(1)[0]
+            size |= (byte & 0x7f) << shift
+            shift += 7
+
+        if object_type in OBJECT_TYPES:
+            return OBJECT_TYPES[object_type], read_compressed(pack_file, size)
+        if depth >= MAX_DELTA_DEPTH:
+            raise PackWalkRequired()
+
+        # Deltified objects are stored as instructions on top of a base object, that is either at an offset
+        # before them in the same pack or referenced by its id
+        if object_type == OFS_DELTA:
+            byte = pack_file.read(1)[0]
+            base_distance = byte & 0x7f
+            while byte & 0x80:
+                byte = pack_file.read(1)[0]
+                base_distance = ((base_distance + 1) << 7) | (byte & 0x7f)
+            delta = read_compressed(pack_file, size)
+            base_type, base = self.read_packed_object(pack, offset - base_distance, depth + 1)
+        elif object_type == REF_DELTA:
+            base_id = pack_file.read(20).hex()
+            delta = read_compressed(pack_file, size)
+            base_type, base = self.read_object(base_id, depth + 1)
+        else:
+            raise PackWalkRequired()
+        return base_type, apply_delta(base, delta)
+
+    def read_object(self, object_id, depth=0):
+        # Returns (type, content) of an object, or raises PackWalkRequired
+        loose_path = os.path.join(self.objects_dir, object_id[:2], object_id[2:])
+        if os.path.exists(loose_path):
+            with open(loose_path, 'rb') as file:
+                raw = zlib.decompress(file.read())
+            header, content = raw.split(b"\x00", 1)
+            return header.split(b" ")[0].decode(), content
+
+        if self.packs is None:
+            self.load_packs()
+        for pack in self.packs:
+            offset = self.find_pack_offset(pack, object_id)
+            if offset is not None:
+                return self.read_packed_object(pack, offset, depth)
+
+        # Objects from alternates or promisor remotes
+        raise PackWalkRequired()
+
+    def peel(self, object_id):
+        # Follows annotated tags down to the commit they point to
+        for _ in range(10):
+            object_type, content = self.read_object(object_id)
+            if object_type != "tag":
+                return object_id
+            object_id = content.split(b"\n", 1)[0].split(b" ")[1].decode()
+        raise PackWalkRequired()
+
+    def read_commit(self, commit_id):
+        # Returns the parents and the committer time of a commit
+        object_type, content = self.read_object(commit_id)
+        if object_type != "commit":
+            raise PackWalkRequired()
+        parents = []
+        commit_time = 0
+        for line in content.split(b"\n"):
+            if not line:
+                break
+            if line.startswith(b"parent "):
+                parents.append(line[7:].decode())
+            elif line.startswith(b"committer "):
+                commit_time = int(line.rsplit(b" ", 2)[1])
+        return parents, commit_time
+
+def read_compressed(file, size):
+    decompressor = zlib.decompressobj()
+    data = b""
+    while len(data) < size and not decompressor.eof:
+        chunk = file.read(max(4096, size))
+        if not chunk:
+            break
+        data += decompressor.decompress(chunk)
+    return data[:size]
+
+def read_delta_size(delta, position):
+    size = 0
+    shift = 0
+    while True:
+        byte = delta[position]
+        position += 1
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, position
+
+def apply_delta(base, delta):
+    # A delta starts with the sizes of the base and the result, followed by instructions that either copy
+    # a range of the base or insert the bytes that follow them
+    base_size, position = read_delta_size(delta, 0)
+    result_size, position = read_delta_size(delta, position)
+    if base_size != len(base):
+        raise ValueError("Delta does not match its base object")
+    result = bytearray()
+    while position < len(delta):
+        instruction = delta[position]
+        position += 1
+        if instruction & 0x80:
+            copy_offset = 0
+            copy_size = 0
+            for bit in range(4):
+                if instruction & (1 << bit):
+                    copy_offset |= delta[position] << (bit * 8)
+                    position += 1
+            for bit in range(3):
+                if instruction & (1 << (bit + 4)):
+                    copy_size |= delta[position] << (bit * 8)
+                    position += 1
+            result += base[copy_offset:copy_offset + (copy_size or 0x10000)]
+        elif instruction:
+            result += delta[position:position + instruction]
+            position += instruction
+        else:
+            raise ValueError("Invalid delta instruction")
+    if len(result) != result_size:
+        raise ValueError("Delta result has the wrong size")
+    return bytes(result)
+
+def read_matching_tags(common_dir, tag_pattern, object_reader):
+    # Same result as git for-each-ref on refs/tags: commit id -> matching tag names
+    if not is_supported(common_dir):
+        raise PackWalkRequired()
+
+    packed_refs, fully_peeled = read_packed_refs(common_dir)
+    tag_refs = {}
+    for ref_name, (object_id, peeled_id) in packed_refs.items():
+        if ref_name.startswith("refs/tags/"):
+            # Without a peeled line in a fully peeled file the ref points to a commit directly
+            tag_refs[ref_name] = (object_id, peeled_id or (object_id if fully_peeled else None))
+    for ref_name, object_id in read_loose_refs(common_dir, "refs/tags").items():
+        tag_refs[ref_name] = (object_id, None)
+
+    tags = {}
+    for ref_name, (object_id, commit_id) in sorted(tag_refs.items()):
+        tag_name = ref_name[len("refs/tags/"):]
+        if tag_pattern not in tag_name:
+            continue
+        if commit_id is None:
+            commit_id = object_reader.peel(object_id)
+        tags.setdefault(commit_id, []).append(tag_name)
+    return tags
+
+def find_tagged_ancestor(object_reader, head_commit, tagged_commits, max_commits=5000):
+    # Walks the history newest first, like git rev-list does, until a tagged commit is found.
+    # Long walks are handed over to git, which has commit graphs and bitmaps for that.
+    parents, commit_time = object_reader.read_commit(head_commit)
+    queue = [(-commit_time, head_commit, parents)]
+    seen = {head_commit}
+    while queue:
+        if len(seen) > max_commits:
+            raise PackWalkRequired()
+        negative_time, commit_id, parents = heapq.heappop(queue)
+        if commit_id in tagged_commits:
+            return commit_id
+        for parent_id in parents:
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+            parent_parents, parent_time = object_reader.read_commit(parent_id)
+            heapq.heappush(queue, (-parent_time, parent_id, parent_parents))
+    return None
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import subprocess
+import zlib
+
+import git_refs
+from local_storage import get_data_dir, get_path_key, read_json, write_json
+
+def get_startupinfo():
+    startupinfo = None
+    if os.name == 'nt':  # Check if the OS is Windows
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+def get_git_dirs(project_path):
+    # Returns the git dir of the working copy and the common dir that holds the refs.
+    # They only differ for worktrees, where .git is a file pointing to the real git dir.
+    git_dir = os.path.join(project_path, ".git")
+    if os.path.isfile(git_dir):
+        with open(git_dir, 'r') as file:
+            content = file.read().strip()
+        if content.startswith("gitdir:"):
+            git_dir = os.path.normpath(os.path.join(project_path, content[len("gitdir:"):].strip()))
+
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        with open(commondir_file, 'r') as file:
+            common_dir = os.path.normpath(os.path.join(git_dir, file.read().strip()))
+    return git_dir, common_dir
+
+def get_refs_fingerprint(common_dir):
+    # Creating, moving or deleting a tag touches packed-refs or one of the folders below refs/tags
+    fingerprint = []
+    packed_refs = os.path.join(common_dir, "packed-refs")
+    if os.path.exists(packed_refs):
+        packed_stat = os.stat(packed_refs)
+        fingerprint.append(f"packed-refs:{packed_stat.st_size}:{packed_stat.st_mtime_ns}")
+    for root, dirs, files in os.walk(os.path.join(common_dir, "refs", "tags")):
+        fingerprint.append(f"{os.path.relpath(root, common_dir)}:{os.stat(root).st_mtime_ns}")
+    return "|".join(sorted(fingerprint))
+
+def read_matching_tags_from_git(project_path, tag_pattern):
+    # Maps each commit to the tags that contain the tag pattern. Annotated tags are peeled to their commit.
+    glob_pattern = "".join(f"[{char}]" if char in "*?[\\" else char for char in tag_pattern)
+    output = subprocess.check_output(
+        ['git', 'for-each-ref', '--format=%(objectname) %(*objectname) %(*objecttype) %(refname:strip=2)', f'refs/tags/*{glob_pattern}*', f'refs/tags/**/*{glob_pattern}*'],
+        cwd=project_path,
+        text=True,
+        startupinfo=get_startupinfo()
+    )
+    tag_refs = []
+    for line in output.splitlines():
+        parts = line.split(" ", 3)
+        if len(parts) == 4 and tag_pattern in parts[3]:
+            tag_refs.append(parts)
+
+    # Before git 2.42, for-each-ref peels tags of tags only once, rev-parse peels them down to the commit
+    nested_ids = sorted({peeled_id for object_id, peeled_id, peeled_type, tag_name in tag_refs if peeled_type == "tag"})
+    nested_commits = {}
+    if nested_ids:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', *[f"{object_id}^{{commit}}" for object_id in nested_ids]],
+            cwd=project_path,
+            text=True,
+            startupinfo=get_startupinfo()
+        )
+        nested_commits = dict(zip(nested_ids, output.split()))
+
+    tags = {}
+    for object_id, peeled_id, peeled_type, tag_name in tag_refs:
+        commit_id = nested_commits.get(peeled_id) or peeled_id or object_id
+        tags.setdefault(commit_id, [])
+        if tag_name not in tags[commit_id]:
+            tags[commit_id].append(tag_name)
+    return tags
+
+class TagIndex:
+    # Tags matching the pattern, mapped to their commits. The index is stored locally and rebuilt only when the refs change.
+    def __init__(self, project_path, tag_pattern):
+        self.project_path = project_path
+        self.tag_pattern = tag_pattern
+        self.cache_path = os.path.join(get_data_dir("tags"), f"{get_path_key(project_path)}.json")
+        self.was_cached = False
+
+        _, common_dir = get_git_dirs(project_path)
+        self.object_reader = git_refs.ObjectReader(common_dir)
+        self.used_git = False
+        fingerprint = get_refs_fingerprint(common_dir)
+        cache = read_json(self.cache_path, {})
+        if cache.get("fingerprint") == fingerprint and cache.get("tag_pattern") == tag_pattern:
+            self.tags = cache["tags"]
+            self.resolved = cache.get("resolved", {})
+            self.was_cached = True
+        else:
+            self.tags = self.read_matching_tags(common_dir)
+            self.resolved = {}
+        self.fingerprint = fingerprint
+
+    def read_matching_tags(self, common_dir):
+        try:
+            return git_refs.read_matching_tags(common_dir, self.tag_pattern, self.object_reader)
+        except (git_refs.PackWalkRequired, OSError, ValueError, IndexError, zlib.error):
+            self.used_git = True
+            return read_matching_tags_from_git(self.project_path, self.tag_pattern)
+        finally:
+            self.object_reader.close()
+
+    def store(self):
+        write_json(self.cache_path, {
+            "fingerprint": self.fingerprint,
+            "tag_pattern": self.tag_pattern,
+            "tags": self.tags,
+            "resolved": self.resolved
+        })
+
+    def find_tagged_ancestor(self, head_commit, available_commits=None):
+        # Returns the nearest commit reachable from head_commit that carries a matching tag, and the tag name.
+        # With available_commits only tagged commits from that set qualify, e.g. the ones that have an archive.
+        candidates = self.tags
+        resolved_key = head_commit
+        if available_commits is not None:
+            candidates = {commit_id: tags for commit_id, tags in self.tags.items() if commit_id in available_commits}
+            resolved_key = f"{head_commit}:{hashlib.sha1(' '.join(sorted(candidates)).encode()).hexdigest()[:12]}"
+
+        if resolved_key in self.resolved:
+            commit_id = self.resolved[resolved_key]
+            return (commit_id, self.tags[commit_id][0]) if commit_id else (None, None)
+
+        try:
+            if head_commit in candidates or not candidates:
+                commit_id = head_commit if candidates else None
+            else:
+                commit_id = git_refs.find_tagged_ancestor(self.object_reader, head_commit, candidates)
+        except (git_refs.PackWalkRequired, OSError, ValueError, IndexError, zlib.error):
+            commit_id = self.walk_history(head_commit, candidates)
+        finally:
+            self.object_reader.close()
+        self.resolved[resolved_key] = commit_id
+        self.store()
+        return (commit_id, self.tags[commit_id][0]) if commit_id else (None, None)
+
+    def walk_history(self, head_commit, candidates):
+        self.used_git = True
+        # Stream the ancestors of head and stop reading as soon as a tagged commit shows up
+        process = subprocess.Popen(
+            ['git', 'rev-list', head_commit],
+            stdout=subprocess.PIPE,
+            text=True,
+            cwd=self.project_path,
+            startupinfo=get_startupinfo()
+        )
+        try:
+            for line in process.stdout:
+                commit_id = line.strip()
+                if commit_id in candidates:
+                    return commit_id
+        finally:
+            process.kill()
+            process.stdout.close()
+            process.wait()
+        return None
+
+def get_head_commit(project_path):
+    # Read HEAD from the git dir and only ask git if the repository layout is not supported
+    try:
+        git_dir, common_dir = get_git_dirs(project_path)
+        head_commit = git_refs.read_head(git_dir, common_dir)
+        if head_commit and len(head_commit) == 40:
+            return head_commit
+    except (OSError, ValueError):
+        pass
+    return subprocess.check_output(
+        ['git', 'rev-parse', 'HEAD'],
+        cwd=project_path,
+        text=True,
+        startupinfo=get_startupinfo()
+    ).strip()
@@ -0,0 +1,414 @@
+import hashlib
+import html.parser
+import http.client
+import io
+import os
+import posixpath
+import threading
+import urllib.parse
+
+from archive_backends import BUFFER_SIZE, PART_SUFFIX, streaming_files
+from binary_catalogue import BinaryCatalogue, add_archive_file
+from local_storage import get_data_dir, read_json, write_json
+
+# Binary source on a static web server, e.g. https://builds.example.com/binaries/. Folders are listed from the
+# index pages that nginx, Apache or python -m http.server generate. Archives are downloaded into a local folder
+# with parallel range requests, the end of the archive first, because that is where a zip lists its files.
+# Readers of an archive that is still downloading wait for the parts they need, and those are fetched next.
+CHUNK_SIZE = 16 * 1024 * 1024
+DOWNLOAD_WORKERS = 4
+READ_SIZE = 1024 * 1024
+TIMEOUT = 30
+RETRIES = 3
+
+# Downloads that are still running, they are stopped when the sync is done
+active_downloads = []
+
+def is_http_source(source_path):
+    return source_path.lower().startswith(("http://", "https://"))
+
+def get_url_key(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+class Connection:
+    # One keep-alive connection to the server, opened again when the server closed it
+    def __init__(self, url):
+        url_parts = urllib.parse.urlsplit(url)
+        self.secure = url_parts.scheme.lower() == "https"
+        self.host = url_parts.netloc
+        self.connection = None
+
+    def request(self, method, url, headers=None):
+        url_parts = urllib.parse.urlsplit(url)
+        path = url_parts.path or "/"
+        if url_parts.query:
+            path += "?" + url_parts.query
+        for attempt in range(RETRIES):
+            if self.connection is None:
+                connection_class = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+                self.connection = connection_class(self.host, timeout=TIMEOUT)
+            try:
+                self.connection.request(method, path, headers=headers or {})
+                response = self.connection.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                self.close()
+                if attempt == RETRIES - 1:
+                    raise IOError(f"Request to {url} failed: {e}")
+                continue
+            if response.status >= 400:
+                response.read()
+                raise IOError(f"Request to {url} failed: HTTP {response.status} {response.reason}")
+            return response
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+class LinkParser(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self.links.extend(value for name, value in attrs if name == "href" and value)
+
+def list_folder(connection, folder_url):
+    # Names of the files and folders (ending with "/") that the index page of a folder links to
+    response = connection.request("GET", folder_url)
+    parser = LinkParser()
+    parser.feed(response.read().decode("utf-8", errors="replace"))
+    folder_path = urllib.parse.urlsplit(folder_url).path
+    names = []
+    for link in parser.links:
+        link_url = urllib.parse.urlsplit(urllib.parse.urljoin(folder_url, link))
+        if link_url.query or link_url.netloc != urllib.parse.urlsplit(folder_url).netloc:
+            continue
+        # Only direct children, not the parent folder or sorting links
+        name = link_url.path[len(folder_path):] if link_url.path.startswith(folder_path) else ""
+        if name and "/" not in name.rstrip("/"):
+            names.append(urllib.parse.unquote(name))
+    return names
+
+class HttpCatalogue(BinaryCatalogue):
+    # Same as BinaryCatalogue, but the folders are listed from the index pages of the web server on every
+    # refresh. Split archives are not supported over HTTP.
+    def __init__(self, source_url, max_depth=3):
+        super().__init__(source_url.rstrip("/") + "/", max_depth)
+        self.cache_path = os.path.join(os.path.dirname(self.cache_path), f"{get_url_key(self.source_path)}.json")
+        self.connection = Connection(self.source_path)
+
+    def refresh(self):
+        try:
+            return super().refresh()
+        finally:
+            self.connection.close()
+
+    def refresh_folder(self, relative_folder, depth, folders):
+        folder = {"mtime": None, "archives": {}, "deltas": {}, "subfolders": []}
+        self.scanned_folders += 1
+        folder_name = relative_folder.rsplit("/", 1)[-1]
+        for name in list_folder(self.connection, self.get_url(relative_folder + "/" if relative_folder else "")):
+            if name.startswith("."):
+                continue
+            if name.endswith("/"):
+                folder["subfolders"].append(name[:-1])
+            elif not PART_SUFFIX.search(name):
+                add_archive_file(folder, folder_name, name)
+        folder["subfolders"].sort()
+        folders[relative_folder] = folder
+
+        if depth < self.max_depth:
+            for subfolder in folder["subfolders"]:
+                self.refresh_folder(f"{relative_folder}/{subfolder}" if relative_folder else subfolder, depth + 1, folders)
+
+    def get_url(self, relative_path):
+        return self.source_path + urllib.parse.quote(relative_path)
+
+    def find_delta(self, commit_id, parent_id):
+        relative_path = self.deltas.get(commit_id, {}).get(parent_id)
+        return self.get_url(relative_path) if relative_path else None
+
+    def find(self, commit_id):
+        relative_path = self.archives.get(commit_id.lower())
+        return self.get_url(relative_path) if relative_path else None
+
+class DownloadReader(io.RawIOBase):
+    # Reads the local file of a download, waiting for the bytes that have not arrived yet
+    def __init__(self, download):
+        self.download = download
+        self.file = open(download.local_path, 'rb')
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.download.size
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.download.size - self.position)
+        if size <= 0:
+            return 0
+        self.download.wait_for(self.position, self.position + size)
+        self.file.seek(self.position)
+        read_size = self.file.readinto(memoryview(buffer)[:size])
+        self.position += read_size
+        return read_size
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+class Download:
+    # Downloads url to local_path. Finished chunks are recorded in "<local_path>.download.json", so that a
+    # download that was canceled or interrupted continues with the missing chunks and a finished one is reused.
+    # A download that is not eager only fetches the chunks that readers ask for, e.g. for an incremental sync
+    # that needs a few files. Readers stop waiting for missing parts once is_canceled returns True.
+    def __init__(self, url, local_path, eager=True, workers=DOWNLOAD_WORKERS, chunk_size=CHUNK_SIZE, is_canceled=lambda: False):
+        self.url = url
+        self.eager = eager
+        self.is_canceled = is_canceled
+        self.local_path = local_path
+        self.state_path = local_path + ".download.json"
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.chunk_count = 0
+        self.done_chunks = set()
+        self.active_chunks = set()
+        self.wanted_chunks = set()
+        self.next_chunks = []
+        self.downloaded_bytes = 0
+        self.condition = threading.Condition()
+        self.stop = threading.Event()
+        self.threads = []
+        self.error = None
+
+    def start(self):
+        connection = Connection(self.url)
+        try:
+            response = connection.request("HEAD", self.url)
+            response.read()
+        finally:
+            connection.close()
+        self.size = int(response.getheader("Content-Length", "0"))
+        supports_ranges = response.getheader("Accept-Ranges", "").lower() == "bytes"
+        validator = response.getheader("ETag") or response.getheader("Last-Modified")
+        self.chunk_count = chunk_count = max(1, (self.size + self.chunk_size - 1) // self.chunk_size)
+
+        # Continue a previous download of the same file
+        state = read_json(self.state_path)
+        if state and state.get("url") == self.url and state.get("size") == self.size and state.get("validator") == validator and os.path.exists(self.local_path):
+            self.done_chunks = set(state["chunks"])
+        else:
+            os.makedirs(os.path.dirname(self.local_path), exist_ok=True)
+            with open(self.local_path, 'wb') as file:
+                file.truncate(self.size)
+        self.state = {"url": self.url, "size": self.size, "validator": validator, "chunks": []}
+        if len(self.done_chunks) >= chunk_count:
+            self.complete()
+            return self
+
+        # The last chunk holds the central directory of a zip
+        self.next_chunks = [chunk_count - 1] + list(range(chunk_count - 1))
+        streaming_files[self.local_path] = self.open_reader
+        active_downloads.append(self)
+        if supports_ranges:
+            self.threads = [threading.Thread(target=self.run_worker, args=(self.download_chunks,), daemon=True) for _ in range(min(self.workers, chunk_count))]
+        else:
+            # Without range support the file can only be read from the start in one stream
+            self.done_chunks = set()
+            self.threads = [threading.Thread(target=self.run_worker, args=(self.download_stream,), daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def open_reader(self):
+        return io.BufferedReader(DownloadReader(self), BUFFER_SIZE)
+
+    def complete(self):
+        # The state file stays, it tells the next sync that the local file is complete
+        streaming_files.pop(self.local_path, None)
+        if self in active_downloads:
+            active_downloads.remove(self)
+
+    def get_chunk_range(self, chunk):
+        return chunk * self.chunk_size, min(self.size, (chunk + 1) * self.chunk_size)
+
+    def next_chunk(self):
+        # Chunks that a reader waits for come first, then the others in order
+        with self.condition:
+            for chunk in sorted(self.wanted_chunks) + (self.next_chunks if self.eager else []):
+                if chunk not in self.done_chunks and chunk not in self.active_chunks:
+                    self.active_chunks.add(chunk)
+                    return chunk
+            return None
+
+    def finish_chunk(self, chunk):
+        with self.condition:
+            self.active_chunks.discard(chunk)
+            self.wanted_chunks.discard(chunk)
+            self.done_chunks.add(chunk)
+            self.state["chunks"] = sorted(self.done_chunks)
+            write_json(self.state_path, self.state, indent=None)
+            self.condition.notify_all()
+
+    def run_worker(self, download):
+        connection = Connection(self.url)
+        try:
+            download(connection)
+        except Exception as e:
+            with self.condition:
+                self.error = e
+                self.stop.set()
+                self.condition.notify_all()
+        finally:
+            connection.close()
+
+    def download_chunks(self, connection):
+        with open(self.local_path, 'r+b') as file:
+            while not self.stop.is_set():
+                chunk = self.next_chunk()
+                if chunk is None:
+                    if self.eager:
+                        return
+                    with self.condition:
+                        self.condition.wait(0.5)
+                    continue
+                start, end = self.get_chunk_range(chunk)
+                response = connection.request("GET", self.url, {"Range": f"bytes={start}-{end - 1}"})
+                if response.status != 206:
+                    response.close()
+                    raise IOError(f"{self.url} does not support range requests")
+                file.seek(start)
+                while not self.stop.is_set():
+                    data = response.read(READ_SIZE)
+                    if not data:
+                        break
+                    file.write(data)
+                    self.downloaded_bytes += len(data)
+                if self.stop.is_set():
+                    response.close()
+                    return
+                if file.tell() != end:
+                    raise IOError(f"Download of {self.url} was cut off")
+                file.flush()
+                self.finish_chunk(chunk)
+
+    def download_stream(self, connection):
+        response = connection.request("GET", self.url)
+        with open(self.local_path, 'r+b') as file:
+            position = 0
+            while not self.stop.is_set():
+                data = response.read(READ_SIZE)
+                if not data:
+                    break
+                file.write(data)
+                position += len(data)
+                self.downloaded_bytes += len(data)
+                file.flush()
+                with self.condition:
+                    chunk_count = position // self.chunk_size if position < self.size else len(self.next_chunks)
+                    for chunk in range(chunk_count):
+                        if chunk not in self.done_chunks:
+                            self.finish_chunk(chunk)
+        response.close()
+        if not self.stop.is_set() and position < self.size:
+            raise IOError(f"Download of {self.url} was cut off after {position} of {self.size} bytes")
+
+    def wait_for(self, start, end):
+        # Blocks until the bytes from start to end are downloaded and moves their chunks to the front
+        chunks = range(start // self.chunk_size, (end - 1) // self.chunk_size + 1)
+        with self.condition:
+            while True:
+                missing_chunks = [chunk for chunk in chunks if chunk not in self.done_chunks]
+                if not missing_chunks:
+                    return
+                if self.error:
+                    raise IOError(f"Download of {os.path.basename(self.local_path)} failed: {self.error}")
+                if self.stop.is_set() or self.is_canceled():
+                    raise IOError(f"Download of {os.path.basename(self.local_path)} was canceled")
+                # The workers only end early when the server sent less than it announced
+                if not any(thread.is_alive() for thread in self.threads):
+                    raise IOError(f"Download of {os.path.basename(self.local_path)} ended before all parts arrived")
+                self.wanted_chunks.update(missing_chunks)
+                self.condition.notify_all()
+                self.condition.wait(0.5)
+
+    def wait(self, is_canceled=lambda: False, report_progress=lambda value: None):
+        # Waits until the whole file is downloaded. Returns False if canceled.
+        while any(thread.is_alive() for thread in self.threads):
+            if is_canceled():
+                self.cancel()
+                return False
+            report_progress(len(self.done_chunks) * self.chunk_size / self.size if self.size else 1.0)
+            # Woken up by every finished chunk, the timeout notices workers that ended and cancels
+            with self.condition:
+                self.condition.wait(0.1)
+        if self.error:
+            raise IOError(f"Download of {os.path.basename(self.local_path)} failed: {self.error}")
+        if len(self.done_chunks) < self.chunk_count:
+            raise IOError(f"Download of {os.path.basename(self.local_path)} ended before all parts arrived")
+        self.complete()
+        return True
+
+    def cancel(self):
+        # Stops the download, the finished chunks are kept for the next time
+        with self.condition:
+            self.stop.set()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        if len(self.done_chunks) * self.chunk_size >= self.size:
+            self.complete()
+        else:
+            streaming_files.pop(self.local_path, None)
+            if self in active_downloads:
+                active_downloads.remove(self)
+
+def cancel_downloads():
+    # The rest of an archive is only downloaded when a later sync needs it
+    for download in list(active_downloads):
+        download.cancel()
+
+def get_download_dir(archive_cache_path):
+    # Downloads are kept next to the cached archives
+    if archive_cache_path:
+        return os.path.join(archive_cache_path, "downloads")
+    return get_data_dir("downloads")
+
+def get_download_path(download_dir, url):
+    # Archives from different servers or folders are kept apart
+    return os.path.join(download_dir, get_url_key(posixpath.dirname(url)), urllib.parse.unquote(posixpath.basename(url)))
+
+def prune_downloads(download_dir, max_bytes, keep_paths):
+    # Removes the least recently downloaded archives until the folder fits into max_bytes
+    files = []
+    for root, _, file_names in os.walk(download_dir):
+        for file_name in file_names:
+            if not file_name.endswith(".download.json"):
+                file_path = os.path.join(root, file_name)
+                files.append((os.path.getmtime(file_path), os.path.getsize(file_path), file_path))
+    used_bytes = sum(size for _, size, _ in files)
+    for _, size, file_path in sorted(files):
+        if used_bytes <= max_bytes:
+            break
+        if file_path in keep_paths:
+            continue
+        for path in (file_path, file_path + ".download.json"):
+            if os.path.exists(path):
+                os.remove(path)
+        used_bytes -= size
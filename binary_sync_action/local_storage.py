@@ -0,0 +1,34 @@
+import hashlib
+import json
+import os
+import threading
+
+def get_data_dir(*sub_dirs):
+    # Per user folder for everything the binary sync keeps locally, e.g. %LOCALAPPDATA%/Anchorpoint/unreal_binary_sync
+    if os.name == 'nt':
+        base_dir = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    data_dir = os.path.join(base_dir, "Anchorpoint", "unreal_binary_sync", *sub_dirs)
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
+
+def get_path_key(path):
+    # Short, file name friendly key for a project or source folder
+    normalized_path = os.path.normcase(os.path.abspath(path))
+    return hashlib.sha1(normalized_path.encode("utf-8")).hexdigest()[:16]
+
+def read_json(file_path, default=None):
+    try:
+        with open(file_path, 'r', encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return default
+
+def write_json(file_path, data, indent=1):
+    # Write to a temporary file first, so that readers never see a half written file. Threads that write the
+    # same file, e.g. copies into the archive cache, each use their own temporary file.
+    temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding="utf-8") as file:
+        json.dump(data, file, indent=indent)
+    os.replace(temp_path, file_path)
@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from local_storage import get_data_dir, get_path_key, read_json, write_json
+from archive_cache import ArchiveCache
+from archive_backends import open_archive
+from binary_catalogue import BinaryCatalogue
+from http_source import is_http_source, HttpCatalogue, Download, get_download_dir, get_download_path, prune_downloads
+from binary_manifest import read_manifest, get_sync_plan
+from git_tags import TagIndex, get_head_commit
+from staged_sync import get_ready_plan, stage_files
+from extraction_profiles import split_entries
+
+# Downloads the binaries for the commit that was just checked out in the background, so that "Sync Editor"
+# finds the archive in the local cache (and optionally already extracted into the staging folder).
+# It runs without Anchorpoint from the git hooks:  python prefetch.py <project path>
+
+HOOK_MARKER = "# Anchorpoint binary prefetch"
+MAX_CONCURRENT_PREFETCHES = 2
+LOCK_POLL_INTERVAL = 0.5
+
+def get_config_path(project_path):
+    return os.path.join(get_data_dir("prefetch"), f"{get_path_key(project_path)}.json")
+
+def write_prefetch_config(project_path, config):
+    # The hooks run outside of Anchorpoint, so they read the settings from this file
+    write_json(get_config_path(project_path), config)
+
+def install_prefetch_hooks(project_path, python_path=None):
+    # Adds a line to the post-checkout and post-merge hooks that starts the prefetch in the background
+    git_hooks_path = os.path.join(project_path, ".git", "hooks")
+    if not os.path.isdir(git_hooks_path):
+        return False
+
+    if python_path is None:
+        python_path = sys.executable if os.path.basename(sys.executable).lower().startswith("python") else "python"
+    # Git runs the hooks in sh, also on Windows, so use forward slashes
+    python_path = python_path.replace("\\", "/")
+    script_path = os.path.abspath(__file__).replace("\\", "/")
+    hook_line = f'"{python_path}" "{script_path}" "$(pwd)" >/dev/null 2>&1 & {HOOK_MARKER}\n'
+
+    for hook_name in ("post-checkout", "post-merge"):
+        hook_path = os.path.join(git_hooks_path, hook_name)
+        lines = ["#!/bin/sh\n"]
+        if os.path.exists(hook_path):
+            with open(hook_path, 'r') as file:
+                lines = [line for line in file.readlines() if HOOK_MARKER not in line] or lines
+        if not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        lines.append(hook_line)
+        with open(hook_path, 'w', newline="\n") as file:
+            file.writelines(lines)
+    return True
+
+def lower_priority():
+    # Prefetching should not slow down the editor or the checkout, so run with low CPU and I/O priority
+    try:
+        import psutil
+    except ImportError:
+        return
+    process = psutil.Process()
+    try:
+        if os.name == 'nt':
+            process.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+            process.ionice(psutil.IOPRIO_VERYLOW)
+        else:
+            process.nice(10)
+            if hasattr(psutil, "IOPRIO_CLASS_IDLE"):
+                process.ionice(psutil.IOPRIO_CLASS_IDLE)
+    except (psutil.Error, OSError, ValueError):
+        pass
+
+def is_process_alive(pid):
+    try:
+        import psutil
+        return psutil.pid_exists(pid)
+    except ImportError:
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+
+def is_lock_active(lock_path):
+    # Locks of prefetches that crashed are removed
+    try:
+        with open(lock_path, 'r') as file:
+            pid = int(file.read().strip() or 0)
+    except (OSError, ValueError):
+        pid = 0
+    if pid and is_process_alive(pid):
+        return True
+    try:
+        os.remove(lock_path)
+    except OSError:
+        pass
+    return False
+
+def acquire_lock(lock_dir, lock_name, max_concurrent=None):
+    # Returns the lock file path, or None if the same commit is already prefetched or too many prefetches run
+    lock_path = os.path.join(lock_dir, lock_name)
+    for _ in range(2):
+        try:
+            file_descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(file_descriptor, str(os.getpid()).encode())
+            os.close(file_descriptor)
+            break
+        except FileExistsError:
+            if is_lock_active(lock_path):
+                return None
+    else:
+        return None
+
+    active_locks = 1
+    for file_name in os.listdir(lock_dir):
+        other_lock_path = os.path.join(lock_dir, file_name)
+        if file_name.endswith(".lock") and other_lock_path != lock_path and is_lock_active(other_lock_path):
+            active_locks += 1
+    if max_concurrent and active_locks > max_concurrent:
+        os.remove(lock_path)
+        return None
+    return lock_path
+
+def release_lock(lock_path):
+    try:
+        os.remove(lock_path)
+    except OSError:
+        pass
+
+def get_sync_lock_path(project_path):
+    return os.path.join(get_data_dir("prefetch", "locks"), f"{get_path_key(project_path)}.sync")
+
+def lock_project_for_sync(project_path, is_canceled=lambda: False, on_wait=lambda: None):
+    # The sync and the prefetch of a project copy the same archives and write the same staging folder. The sync
+    # takes this lock, so that no new prefetch starts, and waits for the prefetches that are running.
+    # Returns the lock path, or None if canceled.
+    lock_dir = get_data_dir("prefetch", "locks")
+    sync_lock_path = get_sync_lock_path(project_path)
+    prefetch_prefix = f"{get_path_key(project_path)}-"
+    lock_path = None
+    waiting = False
+    while True:
+        if lock_path is None:
+            lock_path = acquire_lock(lock_dir, os.path.basename(sync_lock_path))
+        if lock_path and not any(
+            file_name.startswith(prefetch_prefix) and file_name.endswith(".lock") and is_lock_active(os.path.join(lock_dir, file_name))
+            for file_name in os.listdir(lock_dir)
+        ):
+            return lock_path
+        if is_canceled():
+            if lock_path:
+                release_lock(lock_path)
+            return None
+        if not waiting:
+            waiting = True
+            on_wait()
+        time.sleep(LOCK_POLL_INTERVAL)
+
+def prefetch(project_path, log=print):
+    config = read_json(get_config_path(project_path))
+    if not config or not config.get("prefetch"):
+        return False
+
+    source_path = config["binary_source"]
+    head_commit = get_head_commit(project_path)
+    tag_index = TagIndex(project_path, config["tag_pattern"])
+    catalogue = (HttpCatalogue(source_path) if is_http_source(source_path) else BinaryCatalogue(source_path)).refresh()
+    commit_id, matching_tag = tag_index.find_tagged_ancestor(head_commit, catalogue.commit_ids())
+    if commit_id is None:
+        log("No tagged commit with binaries found")
+        return False
+
+    zip_file_path = catalogue.find(commit_id)
+    lock_dir = get_data_dir("prefetch", "locks")
+    lock_path = acquire_lock(lock_dir, f"{get_path_key(project_path)}-{commit_id}.lock", config.get("max_concurrent", MAX_CONCURRENT_PREFETCHES))
+    if lock_path is None:
+        log(f"Prefetch for {matching_tag} is already running or too many prefetches are active")
+        return False
+    # A sync that started first owns the archive cache and the staging folder of the project
+    if is_lock_active(get_sync_lock_path(project_path)):
+        release_lock(lock_path)
+        log(f"Skipping the prefetch for {matching_tag}, the project is being synced")
+        return False
+
+    try:
+        lower_priority()
+        started = time.time()
+        if is_http_source(source_path):
+            # Downloaded to the same place as by the sync, which continues or reuses the download
+            download_dir = get_download_dir(config.get("archive_cache_path"))
+            download = Download(zip_file_path, get_download_path(download_dir, zip_file_path)).start()
+            if not download.wait():
+                return False
+            local_zip_file_path = download.local_path
+            prune_downloads(download_dir, config["archive_cache_size"], [local_zip_file_path])
+            log(f"Downloaded {os.path.basename(local_zip_file_path)} for {matching_tag} in {time.time() - started:.1f}s")
+        else:
+            archive_cache = ArchiveCache(config.get("archive_cache_path") or get_data_dir("archives"), config["archive_cache_size"])
+            local_zip_file_path = archive_cache.get_archive(zip_file_path)
+            log(f"Cached {os.path.basename(zip_file_path)} for {matching_tag} in {time.time() - started:.1f}s")
+
+        if config.get("pre_extract"):
+            manifest = read_manifest(project_path)
+            source_name = os.path.basename(local_zip_file_path)
+            if manifest["source"] == source_name or get_ready_plan(project_path, source_name, manifest["source"]):
+                return True
+            file_infos, _ = split_entries(open_archive(local_zip_file_path).entries(), config.get("extraction_profile"))
+            workers = config.get("extraction_workers", 0)
+            changed_infos, removed_files = get_sync_plan(file_infos, manifest, project_path, config.get("incremental", True), workers)
+            stage_files(local_zip_file_path, project_path, manifest["source"], changed_infos, removed_files, workers, lambda: False, lambda value: None)
+            log(f"Staged {len(changed_infos)} files for {matching_tag} in {time.time() - started:.1f}s")
+        return True
+    finally:
+        release_lock(lock_path)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: prefetch.py <project path>")
+        sys.exit(1)
+    prefetch(os.path.abspath(sys.argv[1]))
@@ -0,0 +1,106 @@
+import collections
+import queue
+import re
+import subprocess
+import threading
+import time
+
+# Matches progress output like "Updating dependencies: 3% (3476/90939)"
+PROGRESS_PATTERN = re.compile(r"(\d+(?:\.\d+)?)%")
+POLL_INTERVAL = 0.1
+TERMINATE_TIMEOUT = 5
+MAX_OUTPUT_LINES = 50
+
+def read_lines(stream, stream_name, lines):
+    # Runs on a thread per stream, so that a full stderr pipe can never block the process
+    try:
+        for line in stream:
+            lines.put((stream_name, line.rstrip("\r\n")))
+    except (OSError, ValueError):
+        pass
+    finally:
+        lines.put((stream_name, None))
+
+def stop_process(process):
+    process.terminate()
+    try:
+        process.wait(TERMINATE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def run_process(command, cwd, is_canceled, on_progress=None, on_line=None, startupinfo=None, progress_pattern=PROGRESS_PATTERN):
+    # Runs command while stdout and stderr are drained on threads. Progress lines are passed to
+    # on_progress(fraction, line) as they arrive, cancellation is checked at least every POLL_INTERVAL.
+    # Returns the exit code, or None if canceled, and the last lines of the output.
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        text=True,
+        errors="replace",
+        cwd=cwd,
+        startupinfo=startupinfo
+    )
+
+    lines = queue.Queue()
+    readers = [
+        threading.Thread(target=read_lines, args=(process.stdout, "stdout", lines), daemon=True),
+        threading.Thread(target=read_lines, args=(process.stderr, "stderr", lines), daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+
+    output = collections.deque(maxlen=MAX_OUTPUT_LINES)
+
+    def handle_line(stream_name, line):
+        if not line.strip():
+            return
+        output.append(line)
+        if on_line:
+            on_line(stream_name, line)
+        if on_progress and progress_pattern:
+            match = progress_pattern.search(line)
+            if match:
+                on_progress(float(match.group(1)) / 100.0, line)
+
+    open_streams = len(readers)
+    try:
+        while open_streams:
+            if is_canceled():
+                stop_process(process)
+                return None, list(output)
+            try:
+                stream_name, line = lines.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                # Child processes can keep the pipes open after the process exited
+                if process.poll() is not None:
+                    break
+                continue
+            if line is None:
+                open_streams -= 1
+            else:
+                handle_line(stream_name, line)
+
+        # The process can still run after it closed its output
+        while process.poll() is None:
+            if is_canceled():
+                stop_process(process)
+                return None, list(output)
+            time.sleep(POLL_INTERVAL)
+    finally:
+        if process.poll() is None:
+            stop_process(process)
+        for reader in readers:
+            reader.join(POLL_INTERVAL)
+
+    # Lines that arrived after the loop ended
+    while True:
+        try:
+            stream_name, line = lines.get_nowait()
+        except queue.Empty:
+            break
+        if line is not None:
+            handle_line(stream_name, line)
+    return process.returncode, list(output)
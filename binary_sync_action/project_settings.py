@@ -1,6 +1,11 @@
 import anchorpoint as ap
 import apsync as aps
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from uproject_discovery import find_uproject_files
+from extraction_profiles import DEFAULT_PROFILES, ALL_FILES_PROFILE, parse_profiles
 
 class UnrealProjectSettings(ap.AnchorpointSettings):
     def __init__(self, ctx: ap.Context):
@@ -14,7 +19,7 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
         no_project_label = "No Project"
 
         # Check if it's an Unreal project based on located .uproject files
-        uproject_files = self.find_uproject_files(ctx.project_path)
+        uproject_files = find_uproject_files(ctx.project_path)
         uproject_display_names = [os.path.splitext(os.path.basename(uproject_file))[0] for uproject_file in uproject_files]
         uproject_display_names.append(no_project_label)
 
@@ -28,11 +33,30 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
         local_settings = aps.Settings()
         binary_source = local_settings.get(project_path+"_binary_source", "")
         sync_dependencies = local_settings.get(project_path+"_sync_dependencies", False)
+        force_setup = local_settings.get(project_path+"_force_setup", False)
+        incremental_sync = local_settings.get(project_path+"_incremental_sync", True)
+        extraction_workers = local_settings.get(project_path+"_extraction_workers", "Auto")
+        verify_checksums = local_settings.get(project_path+"_verify_checksums", False)
+        extraction_profile = local_settings.get(project_path+"_extraction_profile", ALL_FILES_PROFILE)
+        staged_sync = local_settings.get(project_path+"_staged_sync", False)
+        prefetch = local_settings.get(project_path+"_prefetch", False)
+        prefetch_extract = local_settings.get(project_path+"_prefetch_extract", False)
+        archive_cache = local_settings.get(project_path+"_archive_cache", False)
+        archive_cache_path = local_settings.get(project_path+"_archive_cache_path", "")
+        archive_cache_size = local_settings.get(project_path+"_archive_cache_size", "50")
+        content_store = local_settings.get(project_path+"_content_store", False)
+        content_store_path = local_settings.get(project_path+"_content_store_path", "")
+        content_store_size = local_settings.get(project_path+"_content_store_size", "50")
         launch_project_display_name = local_settings.get(project_path+"_launch_project_display_name", no_project_label) 
         dry_run = local_settings.get(project_path+"_dry_run", False)
+        record_timings = local_settings.get(project_path+"_record_timings", False)
         
         shared_settings = aps.SharedSettings(project_id,workspace_id,"unreal")
         tag_pattern = shared_settings.get("_tag_pattern", "")
+        extraction_profiles = shared_settings.get("_extraction_profiles", DEFAULT_PROFILES)
+        profile_names = [ALL_FILES_PROFILE] + [profile["name"] for profile in parse_profiles(extraction_profiles)]
+        if extraction_profile not in profile_names:
+            extraction_profile = ALL_FILES_PROFILE
 
         self.dialog = ap.Dialog()
 
@@ -47,7 +71,7 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
             width = 246,
             callback = self.store_local_settings
         )
-        self.dialog.add_info("The folder containing all the ZIP files named with commit IDs. Learn how to<br>properly <a href='https://docs.anchorpoint.app/docs/version-control/features/binary-sync/' >setup binary syncing</a>.")
+        self.dialog.add_info("The folder containing all the ZIP files named with commit IDs. Subfolders, e.g.<br>per branch or commit prefix, are supported. Can also be the http(s) URL of a web<br>server that lists the folder. Learn how to properly <a href='https://docs.anchorpoint.app/docs/version-control/features/binary-sync/' >setup binary syncing</a>.")
         
         self.dialog.add_checkbox(
             text="Sync Setup Dependencies",
@@ -56,6 +80,114 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
             callback = self.store_local_settings
         )
         self.dialog.add_info("Note that you have to accept a Windows Control Popup for UE Prerequisites")  
+
+        self.dialog.add_checkbox(
+            text="Always run Setup Dependencies",
+            var="force_setup",
+            default=force_setup,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_info("GitDependencies, the prerequisites and the engine registration are skipped<br>when nothing changed since their last run. Enable this to run them on every sync.")  
+
+        self.dialog.add_checkbox(
+            text="Incremental Sync",
+            var="incremental_sync",
+            default=incremental_sync,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_info("Only extract files that changed since the last sync and delete files that are<br>no longer part of the binaries")  
+
+        self.dialog.add_text("Extraction Threads",width = 100).add_dropdown(
+            default=extraction_workers,
+            values=["Auto", "1", "2", "4", "8", "16"],
+            var="extraction_workers",
+            callback = self.store_local_settings
+        )
+        self.dialog.add_info("Number of files that are extracted in parallel. Auto picks a value based on<br>the CPU cores of this machine")  
+
+        self.dialog.add_checkbox(
+            text="Verify Checksums",
+            var="verify_checksums",
+            default=verify_checksums,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_info("When the binaries are up to date, missing or modified files are repaired.<br>Compares checksums instead of file size and date, which takes longer.")  
+
+        self.dialog.add_text("Extraction Profile",width = 100).add_dropdown(
+            default=extraction_profile,
+            values=profile_names,
+            var="extraction_profile",
+            callback = self.store_local_settings
+        )
+        self.dialog.add_info("Only extracts the files that the profile includes, e.g. no debug symbols.<br>Skipped files of a module can be extracted later with \"Pull skipped Files\".")  
+
+        self.dialog.add_checkbox(
+            text="Extract while Editor is running",
+            var="staged_sync",
+            default=staged_sync,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_info("Prepares the new binaries in a staging folder while Unreal is open and<br>switches to them in seconds once you close the editor")  
+
+        self.dialog.add_checkbox(
+            text="Prefetch Binaries on Checkout",
+            var="prefetch",
+            default=prefetch,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_checkbox(
+            text="Extract prefetched Binaries",
+            var="prefetch_extract",
+            default=prefetch_extract,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_info("Copies the binaries of a checked out commit to the cache in the background.<br>Optionally also extracts them into the staging folder. Applied on the next sync.")  
+
+        self.dialog.add_checkbox(
+            text="Cache ZIP Files locally",
+            var="archive_cache",
+            default=archive_cache,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_text("Cache Location",width = 100).add_input(
+            placeholder="Default cache folder",
+            browse=ap.BrowseType.Folder,
+            var="archive_cache_path",
+            default=archive_cache_path,
+            width = 246,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_text("Cache Size (GB)",width = 100).add_input(
+            placeholder="50",
+            var="archive_cache_size",
+            default=archive_cache_size,
+            width = 246,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_info("Copies the ZIP file to a local folder before extracting it. Use this when the<br>ZIP Location is a network drive. The least recently used files are removed<br>when the cache is full.")  
+
+        self.dialog.add_checkbox(
+            text="Keep extracted Builds locally",
+            var="content_store",
+            default=content_store,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_text("Store Location",width = 100).add_input(
+            placeholder="Folder in the project",
+            browse=ap.BrowseType.Folder,
+            var="content_store_path",
+            default=content_store_path,
+            width = 246,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_text("Store Size (GB)",width = 100).add_input(
+            placeholder="50",
+            var="content_store_size",
+            default=content_store_size,
+            width = 246,
+            callback = self.store_local_settings
+        )
+        self.dialog.add_info("Keeps the files of recent builds and links them into the project when you<br>switch back to one of them. Files that are the same in several builds are<br>stored once. Pick a folder on the same drive as the project.")  
         
         self.dialog.add_text("Launch Project",width = 100).add_dropdown(
             default=launch_project_display_name,
@@ -68,6 +200,9 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
         self.dialog.add_checkbox(text="Debug Mode",var="dry_run",default=dry_run,callback = self.store_local_settings)
         self.dialog.add_info("Runs in dry run mode by only displaying prints instead of executing the real<br>synchronisation")  
 
+        self.dialog.add_checkbox(text="Record Sync Timings",var="record_timings",default=record_timings,callback = self.store_local_settings)
+        self.dialog.add_info("Writes the duration and throughput of every sync step to<br>binary_sync_timings.jsonl in the project folder")  
+
         # Display shared settings only when you are an admin
         if (access_level is not aps.AccessLevel.Member):
             self.dialog.add_empty()
@@ -80,40 +215,19 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
                 callback = self.store_shared_settings
             )
             self.dialog.add_info("Specify a pattern for Git tags that tells Anchorpoint that there is a binary<br>attached to a commit. E.g. use <b>Editor</b> if your tag is named <b>Editor-1</b>.") 
+            self.dialog.add_text("Extraction Profiles",width = 100).add_input(
+                placeholder=DEFAULT_PROFILES,
+                var="extraction_profiles",
+                default=extraction_profiles,
+                width = 344,
+                callback = self.store_shared_settings
+            )
+            self.dialog.add_info("Profiles that users can pick, separated by semicolons. Each profile has a name<br>and glob rules for the files in the archive, rules starting with <b>-</b> exclude files.<br>E.g. <b>Artist: -*.pdb -*/Linux/*; Programmer: *</b>") 
 
 
     def get_dialog(self):
         return self.dialog
     
-    def find_uproject_files(self,project_path):
-    
-        uproject_files = []
-        depth = 3 # only dive in 3 subfolder levels
-        
-        # Get all directories at the specified depth (currently set to depth levels)
-        for root, dirs, files in os.walk(project_path, topdown=True):
-            # Skip Engine and Templates folders
-            if 'Engine' in dirs:
-                dirs.remove('Engine')
-            if 'Templates' in dirs:
-                dirs.remove('Templates')
-                
-            # Only process up to depth levels deep
-            rel_path = os.path.relpath(root, project_path)
-            if rel_path == '.' or rel_path.count(os.sep) <= depth:
-                # Look for .uproject files in current directory
-                for file in files:
-                    if file.endswith('.uproject'):
-                        full_path = os.path.join(root, file)
-                        rel_path = os.path.relpath(full_path, project_path)
-                        uproject_files.append(rel_path)
-            
-            # Stop walking deeper than depth levels
-            if rel_path.count(os.sep) >= depth:
-                dirs.clear()
-        
-        return uproject_files
-
     def store_shared_settings(self,dialog,value):
 
         ctx = ap.get_context()
@@ -121,8 +235,10 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
         workspace_id = ctx.workspace_id
 
         tag_pattern = dialog.get_value("tag_pattern")
+        extraction_profiles = dialog.get_value("extraction_profiles")
         shared_settings = aps.SharedSettings(project_id,workspace_id,"unreal")
         shared_settings.set("_tag_pattern", tag_pattern)
+        shared_settings.set("_extraction_profiles", extraction_profiles)
         shared_settings.store()        
         return
     
@@ -133,15 +249,45 @@ class UnrealProjectSettings(ap.AnchorpointSettings):
 
         source_path = dialog.get_value("binary_source")
         sync_dependencies = dialog.get_value("sync_dependencies")
+        force_setup = dialog.get_value("force_setup")
+        incremental_sync = dialog.get_value("incremental_sync")
+        extraction_workers = dialog.get_value("extraction_workers")
+        verify_checksums = dialog.get_value("verify_checksums")
+        extraction_profile = dialog.get_value("extraction_profile")
+        staged_sync = dialog.get_value("staged_sync")
+        prefetch = dialog.get_value("prefetch")
+        prefetch_extract = dialog.get_value("prefetch_extract")
+        archive_cache = dialog.get_value("archive_cache")
+        archive_cache_path = dialog.get_value("archive_cache_path")
+        archive_cache_size = dialog.get_value("archive_cache_size")
+        content_store = dialog.get_value("content_store")
+        content_store_path = dialog.get_value("content_store_path")
+        content_store_size = dialog.get_value("content_store_size")
         launch_project_display_name = dialog.get_value("launch_project_display_name")  
         dry_run = dialog.get_value("dry_run")  
+        record_timings = dialog.get_value("record_timings")
         
         # Store the settings for next time
         local_settings = aps.Settings()
         local_settings.set(project_path+"_binary_source", source_path)
         local_settings.set(project_path+"_sync_dependencies", sync_dependencies)
+        local_settings.set(project_path+"_force_setup", force_setup)
+        local_settings.set(project_path+"_incremental_sync", incremental_sync)
+        local_settings.set(project_path+"_extraction_workers", extraction_workers)
+        local_settings.set(project_path+"_verify_checksums", verify_checksums)
+        local_settings.set(project_path+"_extraction_profile", extraction_profile)
+        local_settings.set(project_path+"_staged_sync", staged_sync)
+        local_settings.set(project_path+"_prefetch", prefetch)
+        local_settings.set(project_path+"_prefetch_extract", prefetch_extract)
+        local_settings.set(project_path+"_archive_cache", archive_cache)
+        local_settings.set(project_path+"_archive_cache_path", archive_cache_path)
+        local_settings.set(project_path+"_archive_cache_size", archive_cache_size)
+        local_settings.set(project_path+"_content_store", content_store)
+        local_settings.set(project_path+"_content_store_path", content_store_path)
+        local_settings.set(project_path+"_content_store_size", content_store_size)
         local_settings.set(project_path+"_launch_project_display_name", launch_project_display_name)
         local_settings.set(project_path+"_dry_run", dry_run)
+        local_settings.set(project_path+"_record_timings", record_timings)
         local_settings.store()
         return
 
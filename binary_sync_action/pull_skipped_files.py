@@ -0,0 +1,54 @@
+import anchorpoint as ap
+import apsync as aps
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from binary_manifest import read_manifest
+from sync_binaries import AnchorpointHost, read_sync_settings
+from sync_engine import run_pull_processes
+
+# Extracts the files of one module that the extraction profile skipped, e.g. the debug symbols of
+# UnrealEditor-Engine, from the archive of the synced build without syncing again
+
+ctx = ap.get_context()
+ui = ap.UI()
+
+def pull_files(dialog):
+    project_path = ctx.project_path
+    module_pattern = dialog.get_value("module").strip()
+    if not module_pattern:
+        ui.show_error("No module defined", "Enter the name of a module, e.g. UnrealEditor-Engine")
+        return
+    dialog.close()
+
+    local_settings = aps.Settings()
+    shared_settings = aps.SharedSettings(ctx.project_id,ctx.workspace_id,"unreal")
+    binary_source = local_settings.get(project_path+"_binary_source", "")
+    if not binary_source:
+        ui.show_error("No ZIP Location defined", "Please set up a location in the project settings")
+        return
+
+    sync_settings = read_sync_settings(project_path, local_settings, shared_settings)
+    dry_run = local_settings.get(project_path+"_dry_run", False)
+    ctx.run_async(run_pull_processes,AnchorpointHost(),project_path,binary_source,module_pattern,sync_settings,dry_run)
+
+def initialize():
+    manifest = read_manifest(ctx.project_path)
+    if not manifest.get("skipped"):
+        ui.show_info("No skipped files", "The last sync extracted all files of the binaries")
+        return
+
+    dialog = ap.Dialog()
+    dialog.title = "Pull skipped Files"
+    dialog.add_text("Module",width = 100).add_input(
+        placeholder="UnrealEditor-Engine",
+        var="module",
+        width = 246
+    )
+    dialog.add_info(f"The extraction profile {manifest['profile']['name']} skipped {len(manifest['skipped'])} files. Globs like<br><b>UnrealEditor-Anim*</b> pull the files of several modules.")
+    dialog.add_button("Pull Files", callback = pull_files)
+    dialog.show()
+
+if __name__ == "__main__":
+    initialize()
@@ -0,0 +1,57 @@
+import glob
+import hashlib
+import os
+import time
+
+from local_storage import get_data_dir, get_path_key, read_json, write_json
+
+# Remembers what the setup steps ran against, so that GitDependencies, the prerequisites and the engine
+# registration can be skipped when nothing changed since their last successful run.
+HASH_BUFFER_SIZE = 4 * 1024 * 1024
+
+def get_state_path(project_path):
+    return os.path.join(get_data_dir("setup"), f"{get_path_key(project_path)}.json")
+
+def hash_file(file_path):
+    file_hash = hashlib.sha1()
+    try:
+        with open(file_path, 'rb') as file:
+            while True:
+                data = file.read(HASH_BUFFER_SIZE)
+                if not data:
+                    break
+                file_hash.update(data)
+    except OSError:
+        return None
+    return file_hash.hexdigest()
+
+def get_tool_fingerprint(tool_path, arguments=()):
+    # Executables are compared by size and mtime, they only change with a new binary sync
+    try:
+        tool_stat = os.stat(tool_path)
+    except OSError:
+        return None
+    return {"tool": [tool_stat.st_size, tool_stat.st_mtime_ns], "arguments": list(arguments)}
+
+def get_dependencies_fingerprint(project_path, git_dependencies_path, arguments):
+    # The dependency manifests are hashed, a checkout rewrites them with a new mtime even if they didn't change.
+    # .uedependencies is written by GitDependencies and lists the files it downloaded.
+    fingerprint = get_tool_fingerprint(git_dependencies_path, arguments)
+    if fingerprint is None:
+        return None
+    manifest_paths = sorted(glob.glob(os.path.join(project_path, "Engine", "Build", "*.gitdeps.xml")))
+    manifest_paths.append(os.path.join(project_path, ".uedependencies"))
+    fingerprint["manifests"] = {os.path.relpath(manifest_path, project_path).replace("\\", "/"): hash_file(manifest_path) for manifest_path in manifest_paths}
+    return fingerprint
+
+def is_step_current(project_path, step, fingerprint):
+    if fingerprint is None:
+        return False
+    state = read_json(get_state_path(project_path), {})
+    return state.get(step, {}).get("fingerprint") == fingerprint
+
+def record_step(project_path, step, fingerprint):
+    state_path = get_state_path(project_path)
+    state = read_json(state_path, {})
+    state[step] = {"fingerprint": fingerprint, "completed": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    write_json(state_path, state)
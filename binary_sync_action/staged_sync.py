@@ -0,0 +1,135 @@
+import os
+import shutil
+
+from local_storage import read_json, write_json
+from archive_backends import open_archive
+
+# New binaries are extracted into a staging folder inside the project, so that they are on the same drive
+# and can be moved into place with renames. The project stays usable until the swap, and a crash before
+# the swap leaves the old build untouched.
+STAGING_DIR_NAME = ".binary_sync_staging"
+
+def get_staging_path(project_path):
+    return os.path.join(project_path, STAGING_DIR_NAME)
+
+def exclude_staging_from_git(project_path):
+    # Keep the staging folder out of the changed files list
+    exclude_from_git(project_path, STAGING_DIR_NAME)
+
+def exclude_from_git(project_path, name, is_dir=True):
+    exclude_path = os.path.join(project_path, ".git", "info", "exclude")
+    if not os.path.isdir(os.path.dirname(exclude_path)):
+        return
+    pattern = f"/{name}/" if is_dir else f"/{name}"
+    if os.path.exists(exclude_path):
+        with open(exclude_path, 'r') as file:
+            if pattern in file.read().splitlines():
+                return
+    with open(exclude_path, 'a') as file:
+        file.write(f"\n{pattern}\n")
+
+def read_staged_plan(project_path):
+    return read_json(os.path.join(get_staging_path(project_path), "plan.json"))
+
+def get_ready_plan(project_path, source_name, base_source):
+    # Returns the staged plan if it was completely extracted for source_name on top of the current build
+    plan = read_staged_plan(project_path)
+    if plan and plan.get("complete") and plan["source"] == source_name and plan["base"] == base_source:
+        return plan
+    return None
+
+def clear_staging(project_path):
+    staging_path = get_staging_path(project_path)
+    if os.path.exists(staging_path):
+        shutil.rmtree(staging_path, ignore_errors=True)
+
+def stage_files(zip_file_path, project_path, base_source, changed_infos, removed_files, extraction_workers, is_canceled, report_progress):
+    # Extracts the changed entries into the staging folder. Returns False if canceled, the partial staging is
+    # discarded on the next run.
+    source_name = os.path.basename(zip_file_path)
+    if get_ready_plan(project_path, source_name, base_source):
+        return True
+
+    clear_staging(project_path)
+    staging_path = get_staging_path(project_path)
+    os.makedirs(staging_path, exist_ok=True)
+    exclude_staging_from_git(project_path)
+
+    plan = {
+        "source": source_name,
+        "base": base_source,
+        "files": [file_info.filename for file_info in changed_infos if not file_info.is_dir()],
+        "directories": [file_info.filename for file_info in changed_infos if file_info.is_dir()],
+        "removed": removed_files,
+        "complete": False
+    }
+    write_json(os.path.join(staging_path, "plan.json"), plan)
+
+    if not open_archive(zip_file_path).extract(changed_infos, os.path.join(staging_path, "files"), extraction_workers, is_canceled, report_progress):
+        return False
+
+    plan["complete"] = True
+    write_json(os.path.join(staging_path, "plan.json"), plan)
+    return True
+
+def swap_staged_files(project_path, plan):
+    # Moves the staged files into the project. Replaced and removed files are moved to a backup folder first,
+    # and a journal makes sure that an interrupted swap can be rolled back to the old build.
+    staging_path = get_staging_path(project_path)
+    staged_root = os.path.join(staging_path, "files")
+    backup_root = os.path.join(staging_path, "backup")
+    journal_path = os.path.join(staging_path, "swap.json")
+    write_json(journal_path, {"state": "swapping"})
+
+    try:
+        for directory in plan["directories"]:
+            os.makedirs(os.path.join(project_path, directory), exist_ok=True)
+
+        for file_name in plan["removed"] + plan["files"]:
+            target_path = os.path.join(project_path, file_name)
+            if os.path.isfile(target_path):
+                backup_path = os.path.join(backup_root, file_name)
+                os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+                os.replace(target_path, backup_path)
+
+        for file_name in plan["files"]:
+            target_path = os.path.join(project_path, file_name)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            os.replace(os.path.join(staged_root, file_name), target_path)
+    except Exception:
+        rollback_swap(project_path, plan)
+        raise
+
+    write_json(journal_path, {"state": "done"})
+    clear_staging(project_path)
+
+def rollback_swap(project_path, plan):
+    # Put the old build back: new files are moved back to staging and the backups are restored
+    staging_path = get_staging_path(project_path)
+    staged_root = os.path.join(staging_path, "files")
+    backup_root = os.path.join(staging_path, "backup")
+
+    for file_name in plan["files"]:
+        staged_path = os.path.join(staged_root, file_name)
+        target_path = os.path.join(project_path, file_name)
+        if not os.path.exists(staged_path) and os.path.isfile(target_path):
+            os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+            os.replace(target_path, staged_path)
+
+    for file_name in plan["removed"] + plan["files"]:
+        backup_path = os.path.join(backup_root, file_name)
+        if os.path.isfile(backup_path):
+            os.replace(backup_path, os.path.join(project_path, file_name))
+
+    write_json(os.path.join(staging_path, "swap.json"), {"state": "rolled_back"})
+
+def recover_interrupted_swap(project_path):
+    # A swap that was interrupted by a crash is rolled back, so the project is on the old build again.
+    # Returns True if something had to be recovered.
+    staging_path = get_staging_path(project_path)
+    journal = read_json(os.path.join(staging_path, "swap.json"))
+    plan = read_staged_plan(project_path)
+    if not journal or journal.get("state") != "swapping" or not plan:
+        return False
+    rollback_swap(project_path, plan)
+    return True
@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import signal
+import sys
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sync_state import is_up_to_date
+from extraction_profiles import parse_profile
+
+# Runs the binary sync without Anchorpoint, e.g. from build scripts or a launcher:
+#   python sync_cli.py <project path> --source //server/binaries --tag-pattern Editor
+# The sync itself is only imported when there is something to do, so that a sync without changes returns
+# right away. With --daemon, requests are read from stdin and the indexes of the binary source and the
+# tags stay in memory between them.
+
+class HeadlessProgress:
+    def __init__(self, host, title, text, infinite):
+        self.host = host
+        self.title = title
+        self.text = text
+        self.value = None if infinite else 0.0
+
+    @property
+    def canceled(self):
+        return self.host.canceled
+
+    def set_cancelable(self, cancelable):
+        pass
+
+    def set_text(self, text):
+        if text != self.text:
+            self.text = text
+            self.host.report_progress(self)
+
+    def report_progress(self, value):
+        self.value = value
+        self.host.report_progress(self)
+
+    def finish(self):
+        pass
+
+class HeadlessHost:
+    # Passes the progress and the messages of the sync as events to a callback
+    def __init__(self, on_event):
+        self.on_event = on_event
+        self.canceled = False
+        self.messages = []
+
+    def create_progress(self, title, text="", infinite=False):
+        progress = HeadlessProgress(self, title, text, infinite)
+        self.report_progress(progress)
+        return progress
+
+    def report_progress(self, progress):
+        self.on_event({"event": "progress", "title": progress.title, "text": progress.text, "progress": progress.value})
+
+    def show_message(self, kind, title, description):
+        message = {"event": kind, "title": title, "description": description}
+        self.messages.append(message)
+        self.on_event(message)
+
+    def show_info(self, title, description=""):
+        self.show_message("info", title, description)
+
+    def show_success(self, title, description=""):
+        self.show_message("success", title, description)
+
+    def show_error(self, title, description=""):
+        self.show_message("error", title, description)
+
+    def get_status(self):
+        if any(message["event"] == "error" for message in self.messages):
+            return "error"
+        return "canceled" if self.canceled else "ok"
+
+def print_event(event):
+    if event["event"] == "progress":
+        percent = f" ({event['progress'] * 100:.0f}%)" if event["progress"] is not None else ""
+        print(f"{event['title']}: {event['text']}{percent}", file=sys.stderr)
+    else:
+        text = f"{event['title']}: {event['description']}" if event["description"] else event["title"]
+        print(text, file=sys.stderr if event["event"] == "error" else sys.stdout)
+
+def get_json_writer(output):
+    # The prints of the sync are redirected to stderr while the events are written, so the writer keeps the stream
+    def write_event(event):
+        output.write(json.dumps(event) + "\n")
+        output.flush()
+    return write_event
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Syncs the Editor and Game binaries of the current commit into an Unreal project.")
+    parser.add_argument("project", nargs="?", default=".", help="Project folder, the current folder by default")
+    parser.add_argument("--source", default="", help="Folder or http(s) URL with the archives, by default the ZIP Location last used in Anchorpoint")
+    parser.add_argument("--tag-pattern", default="", help="Pattern of the git tags of builds, by default the one last used in Anchorpoint")
+    parser.add_argument("--setup", action="store_true", help="Run the setup dependencies")
+    parser.add_argument("--force-setup", action="store_true", help="Run the setup dependencies even if nothing changed since their last run")
+    parser.add_argument("--launch", default="", help="uproject file to launch after the sync")
+    parser.add_argument("--full", action="store_true", help="Extract every file instead of only the changed ones")
+    parser.add_argument("--workers", type=int, default=0, help="Number of files that are extracted in parallel, 0 picks a value based on the CPU cores")
+    parser.add_argument("--verify-checksums", action="store_true", help="Compare checksums instead of file size and date to find modified files")
+    parser.add_argument("--staged", action="store_true", help="Extract into a staging folder while the editor is running")
+    parser.add_argument("--cache", nargs="?", const="", default=None, metavar="PATH", help="Copy the archive to a local cache folder before extracting it")
+    parser.add_argument("--cache-size", type=float, default=50, metavar="GB", help="Size of the local cache")
+    parser.add_argument("--store", nargs="?", const="", default=None, metavar="PATH", help="Keep the files of synced builds in a local content store")
+    parser.add_argument("--store-size", type=float, default=50, metavar="GB", help="Size of the content store")
+    parser.add_argument("--profile", default=None, metavar="RULES", help="Extraction profile as '<name>: <rules>', e.g. 'Artist: -*.pdb', by default the one selected in Anchorpoint. An empty value extracts all files")
+    parser.add_argument("--pull", default="", metavar="MODULE", help="Only extract the files of a module that the extraction profile skipped, e.g. UnrealEditor-Engine")
+    parser.add_argument("--record-timings", action="store_true", help="Append the timings of the sync steps to binary_sync_timings.jsonl")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what the sync would do")
+    parser.add_argument("--json", action="store_true", help="Print the progress and messages as JSON lines")
+    parser.add_argument("--daemon", action="store_true", help="Read one JSON request per line from stdin and keep the indexes in memory between them")
+    return parser
+
+def get_sync_settings(arguments, profile):
+    return {
+        "incremental": not arguments.full,
+        "extraction_workers": arguments.workers,
+        "verify_checksums": arguments.verify_checksums,
+        "staged_sync": arguments.staged,
+        "prefetch": False,
+        "prefetch_extract": False,
+        "archive_cache": arguments.cache is not None,
+        "archive_cache_path": arguments.cache or "",
+        "archive_cache_size": int(arguments.cache_size * 1024**3),
+        "content_store": arguments.store is not None,
+        "content_store_path": arguments.store or "",
+        "content_store_size": int(arguments.store_size * 1024**3),
+        "record_timings": arguments.record_timings,
+        "force_setup": arguments.force_setup,
+        "extraction_profile": profile
+    }
+
+def run_sync(arguments, host):
+    project_path = os.path.abspath(arguments.project)
+    source_path = arguments.source
+    tag_pattern = arguments.tag_pattern
+
+    profile = parse_profile(arguments.profile) if arguments.profile else None
+
+    # Anchorpoint stores the settings of the last sync for the prefetch, which also runs outside of it
+    if not source_path or not tag_pattern or arguments.profile is None:
+        from local_storage import read_json
+        from prefetch import get_config_path
+        config = read_json(get_config_path(project_path), {})
+        source_path = source_path or config.get("binary_source", "")
+        tag_pattern = tag_pattern or config.get("tag_pattern", "")
+        if arguments.profile is None:
+            profile = config.get("extraction_profile")
+    if not source_path:
+        host.show_error("No ZIP Location defined", "Pass the folder with the archives with --source")
+        return
+
+    if arguments.pull:
+        import sync_engine
+        sync_engine.run_pull_processes(host, project_path, source_path, arguments.pull, get_sync_settings(arguments, profile), arguments.dry_run)
+        return
+    if not tag_pattern:
+        host.show_error("No tag has been set", "Pass the pattern of the build tags with --tag-pattern")
+        return
+
+    # Nothing changed since the last sync and the files are intact, so there is no need to load the sync
+    if not (arguments.setup or arguments.launch or arguments.full or arguments.verify_checksums or arguments.dry_run):
+        commit_id = is_up_to_date(project_path, source_path, tag_pattern, arguments.workers, profile)
+        if commit_id:
+            host.show_info("Binaries up to date", f"Editor Binaries are already at {commit_id}")
+            return
+
+    import sync_engine
+    sync_engine.run_sync_processes(host, project_path, arguments.setup, source_path, arguments.launch, tag_pattern, get_sync_settings(arguments, profile), arguments.dry_run)
+
+def run_daemon(parser):
+    # Every request is a JSON object with the options of the command line, e.g.
+    # {"project": "D:/Project", "source": "//server/binaries", "tag_pattern": "Editor"}
+    # The progress and messages are written as JSON lines, followed by {"event": "result", "status": ...}
+    import sync_engine
+    sync_engine.keep_indexes()
+    default_options = vars(parser.parse_args([]))
+    write_event = get_json_writer(sys.stdout)
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        host = HeadlessHost(write_event)
+        try:
+            request = json.loads(line)
+            unknown_options = set(request) - set(default_options)
+            if unknown_options:
+                raise ValueError(f"Unknown options: {', '.join(sorted(unknown_options))}")
+            arguments = argparse.Namespace(**{**default_options, **request})
+        except (ValueError, TypeError) as e:
+            host.show_error("Invalid request", str(e))
+            write_event({"event": "result", "status": host.get_status()})
+            continue
+
+        # stdout carries the events, so the prints of the sync go to stderr
+        with redirect_stdout(sys.stderr):
+            try:
+                run_sync(arguments, host)
+            except Exception as e:
+                host.show_error("Sync failed", str(e))
+        write_event({"event": "result", "status": host.get_status()})
+
+def main():
+    parser = create_parser()
+    arguments = parser.parse_args()
+    if arguments.daemon:
+        run_daemon(parser)
+        return 0
+
+    host = HeadlessHost(get_json_writer(sys.stdout) if arguments.json else print_event)
+
+    # The first Ctrl+C cancels the sync like the cancel button in Anchorpoint, a second one stops right away
+    def on_interrupt(signum, frame):
+        if host.canceled:
+            raise KeyboardInterrupt
+        host.canceled = True
+    signal.signal(signal.SIGINT, on_interrupt)
+
+    if arguments.json:
+        with redirect_stdout(sys.stderr):
+            run_sync(arguments, host)
+    else:
+        run_sync(arguments, host)
+    return 0 if host.get_status() == "ok" else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
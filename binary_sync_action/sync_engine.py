@@ -0,0 +1,970 @@
+import os
+import re
+import sys
+import subprocess
+import time
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.dirname(__file__))
+from archive_backends import open_archive, get_archive_parts
+from archive_cache import ArchiveCache
+from local_storage import get_data_dir
+from git_tags import TagIndex, get_head_commit, get_git_dirs, get_refs_fingerprint
+from binary_catalogue import BinaryCatalogue
+from binary_manifest import MANIFEST_NAME, read_manifest, write_manifest, write_delta_manifest, update_manifest, add_pulled_files, stat_files, verify_files, get_sync_plan
+from extraction_profiles import split_entries, is_included, find_module_files
+from staged_sync import get_ready_plan, stage_files, swap_staged_files, recover_interrupted_swap, clear_staging, exclude_from_git
+from prefetch import install_prefetch_hooks, lock_project_for_sync, release_lock
+from sync_trace import SyncTrace, NullTrace
+import unreal_process
+from process_runner import run_process
+from sync_progress import SyncProgress
+from delta_sync import find_delta_chain, get_reachable_commits, get_delta_plan
+from content_store import STORE_DIR_NAME, ContentStore
+from http_source import is_http_source, HttpCatalogue, Download, get_download_dir, get_download_path, prune_downloads, cancel_downloads
+from sync_state import record_sync
+from sync_pipeline import SyncPipeline
+from setup_state import get_dependencies_fingerprint, get_tool_fingerprint, is_step_current, record_step
+
+# Set for every sync by run_sync_processes. The host shows the progress and messages, e.g. in Anchorpoint or
+# on the command line.
+host = None
+dry_run = False
+trace = NullTrace()
+# Steps of the running sync, see sync_pipeline.py
+pipeline = None
+# Catalogues and tag indexes by source and project, only kept between syncs by a long running process
+catalogues = None
+tag_indexes = None
+
+DEPENDENCIES_TRANSFERRED = re.compile(r"([\d.]+)/([\d.]+) MiB")
+
+# Run with --force parameter to avoid prompts
+GIT_DEPENDENCIES_ARGUMENTS = [
+    "--force",
+    "--exclude=osx64", "--exclude=osx32", "--exclude=TVOS", "--exclude=Mac", 
+    "--exclude=mac-arm64", "--exclude=WinRT", "--exclude=Linux", "--exclude=Linux32", 
+    "--exclude=Linux64", "--exclude=Unix", "--exclude=OpenVR", "--exclude=GoogleOboe", 
+    "--exclude=GooglePlay", "--exclude=GoogleGameSDK", "--exclude=Documentation", 
+    "--exclude=Samples", "--exclude=Templates", "--exclude=Android", "--exclude=HTML5", 
+    "--exclude=IOS", "--exclude=GoogleVR", "--exclude=GoogleTest", "--exclude=LeapMotion",
+    "--exclude=Dingo", "--exclude=Switch"
+]
+
+def create_progress(title, text="", infinite=False):
+    # Every progress of a sync can cancel all of its steps
+    progress = host.create_progress(title, text, infinite=infinite)
+    return pipeline.wrap(progress) if pipeline else progress
+
+def show_canceled(title, description=""):
+    # Steps that stopped because another step failed leave it to that step to report why
+    if pipeline and pipeline.stopped and not pipeline.is_canceled():
+        return
+    host.show_info(title, description)
+
+def delete_synced_files(file_paths, project_path):
+    for file_path in file_paths:
+        full_path = os.path.join(project_path, file_path)
+        if os.path.isfile(full_path):
+            os.remove(full_path)
+
+def verify_and_repair(zip_file_path, project_path, manifest, progress, extraction_workers, verify_checksums):
+    # Check the files of the last sync against the manifest and re-extract only the ones that don't match
+    progress.set_text("Verifying binaries...")
+    with trace.phase("verify") as phase:
+        broken_files = verify_files(project_path, manifest, extraction_workers, verify_checksums)
+        phase["files"] = len(manifest["files"])
+    if not broken_files:
+        host.show_info("Binaries up to date", "Editor Binaries are already at the latest state")
+        progress.finish()
+        return True
+
+    print(f"Repairing {len(broken_files)} files that are missing or modified:")
+    for file_name in broken_files:
+        print(f"  {file_name}")
+
+    # Builds that were synced with delta archives can only be repaired when the full archive exists
+    if not os.path.exists(zip_file_path):
+        host.show_error("Cannot repair binaries", f"{len(broken_files)} files are missing or modified and there is no full archive to restore them from")
+        progress.finish()
+        return False
+
+    progress.finish()
+    repair_progress = create_progress("Repairing Binaries", f"Extracting {len(broken_files)} files...", infinite=False)
+    repair_progress.set_cancelable(True)
+
+    archive = open_archive(zip_file_path)
+    archive_entries = {file_info.filename: file_info for file_info in archive.entries()}
+    broken_infos = [archive_entries[file_name] for file_name in broken_files if file_name in archive_entries]
+
+    with trace.phase("repair") as phase:
+        phase["files"] = len(broken_infos)
+        phase["bytes"] = sum(file_info.file_size for file_info in broken_infos)
+        completed = archive.extract(
+            broken_infos,
+            project_path,
+            extraction_workers,
+            lambda: repair_progress.canceled,
+            SyncProgress(repair_progress, "Repairing files", phase["bytes"]).report_progress
+        )
+    if not completed:
+        show_canceled("Process cancelled")
+        repair_progress.finish()
+        return False
+
+    update_manifest(project_path, manifest, stat_files(project_path, [file_info.filename for file_info in broken_infos], extraction_workers))
+    host.show_info("Binaries repaired", f"Repaired {len(broken_infos)} files that were missing or modified")
+    repair_progress.finish()
+    return True
+
+def write_zip_manifest(zip_file_path, project_path, extraction_workers, file_infos=None, commit_id=None, profile=None, skipped_files=()):
+    # Record size, mtime and CRC32 of every file, so that the next sync can detect changed and broken files
+    if file_infos is None:
+        file_infos, skipped_files = split_entries(open_archive(zip_file_path).entries(), profile)
+    archive_files = [file_info.filename for file_info in file_infos if not file_info.is_dir()]
+    write_manifest(project_path, os.path.basename(zip_file_path), file_infos, stat_files(project_path, archive_files, extraction_workers), commit_id, profile, skipped_files)
+
+def apply_delta_chain(delta_paths, zip_file_path, project_path, manifest, progress, extraction_workers, commit_id, profile=None):
+    # Apply the delta archives on top of the build of the manifest. Every file is only extracted from the
+    # last delta that contains it.
+    progress.finish()
+    delta_progress = create_progress("Extracting Binaries", f"Reading {len(delta_paths)} delta archives...", infinite=False)
+    delta_progress.set_cancelable(True)
+
+    with trace.phase("read_archive") as phase:
+        extraction, file_infos, deleted_files = get_delta_plan(delta_paths)
+        phase["files"] = len(file_infos)
+        file_infos, skipped_files = split_entries(file_infos, profile)
+        if skipped_files:
+            extraction = [(archive, [file_info for file_info in archive_infos if file_info.is_dir() or is_included(file_info.filename, profile)]) for archive, archive_infos in extraction]
+
+    with trace.phase("delete") as phase:
+        phase["files"] = len(deleted_files)
+        delete_synced_files(deleted_files, project_path)
+
+    with trace.phase("extract") as phase:
+        phase["files"] = sum(1 for file_info in file_infos if not file_info.is_dir())
+        phase["bytes"] = sum(file_info.file_size for file_info in file_infos)
+        byte_progress = SyncProgress(delta_progress, "Extracting files", phase["bytes"])
+        extracted_bytes = 0
+        for archive, archive_infos in extraction:
+            archive_bytes = sum(file_info.file_size for file_info in archive_infos)
+            completed = archive.extract(
+                archive_infos,
+                project_path,
+                extraction_workers,
+                lambda: delta_progress.canceled,
+                lambda value: byte_progress.report_progress((extracted_bytes + value * archive_bytes) / phase["bytes"] if phase["bytes"] else 1.0)
+            )
+            if not completed:
+                show_canceled("Process cancelled")
+                delta_progress.finish()
+                return False
+            extracted_bytes += archive_bytes
+
+    delta_progress.set_text("Writing manifest...")
+    with trace.phase("write_manifest") as phase:
+        extracted_files = [file_info.filename for file_info in file_infos if not file_info.is_dir()]
+        phase["files"] = len(extracted_files)
+        write_delta_manifest(project_path, manifest, os.path.basename(zip_file_path), commit_id, file_infos, deleted_files, stat_files(project_path, extracted_files, extraction_workers), profile, skipped_files)
+
+    print(f"Applied {len(delta_paths)} delta archives, extracted {len(extracted_files)} files, deleted {len(deleted_files)} files")
+    delta_progress.finish()
+    return True
+
+def stage_binaries(zip_file_path, project_path, extraction_workers, incremental=True, profile=None):
+    # Extract the new binaries next to the current ones while the editor may still be running
+    if dry_run:
+        print(f"Would extract changed files from {zip_file_path} into the staging folder")
+        return True
+
+    recover_interrupted_swap(project_path)
+    manifest = read_manifest(project_path)
+    if manifest["source"] == os.path.basename(zip_file_path):
+        return True
+
+    staging_progress = create_progress("Staging Binaries", "Comparing files with previous sync...", infinite=False)
+    staging_progress.set_cancelable(True)
+
+    with trace.phase("compare") as phase:
+        file_infos, _ = split_entries(open_archive(zip_file_path).entries(), profile)
+        changed_infos, removed_files = get_sync_plan(file_infos, manifest, project_path, incremental, extraction_workers)
+        phase["files"] = len(file_infos)
+
+    staging_progress.set_text("Extracting files into the staging folder...")
+    with trace.phase("stage") as phase:
+        phase["files"] = len(changed_infos)
+        phase["bytes"] = sum(file_info.file_size for file_info in changed_infos)
+        completed = stage_files(
+            zip_file_path,
+            project_path,
+            manifest["source"],
+            changed_infos,
+            removed_files,
+            extraction_workers,
+            lambda: staging_progress.canceled,
+            SyncProgress(staging_progress, "Extracting files into the staging folder", phase["bytes"]).report_progress
+        )
+    staging_progress.finish()
+
+    if not completed:
+        show_canceled("Process cancelled")
+    return completed
+
+def wait_for_unreal_to_close(project_path):
+    if not is_unreal_running(project_path):
+        return True
+
+    wait_progress = create_progress("Binaries ready", "Close Unreal Engine to switch to the new binaries", infinite=True)
+    wait_progress.set_cancelable(True)
+    with trace.phase("wait_for_editor"), pipeline.idle() if pipeline else nullcontext():
+        while is_unreal_running(project_path):
+            if wait_progress.canceled:
+                show_canceled("Process cancelled", "The staged binaries are kept and used on the next sync")
+                wait_progress.finish()
+                return False
+            time.sleep(1)
+    wait_progress.finish()
+    return True
+
+def unzip_and_manage_files(zip_file_path, project_path, progress, incremental=True, extraction_workers=0, verify_checksums=False, commit_id=None, delta_paths=None, content_store=None, profile=None):
+    if dry_run:
+        print(f"Would extract from: {', '.join(delta_paths) if delta_paths else zip_file_path}")
+        print(f"To project path: {project_path}")
+        print("Would perform the following steps:")
+        if delta_paths:
+            print("1. Delete the files that the delta archives remove")
+            print("2. Extract the added and changed files from the delta archives")
+        elif incremental:
+            print("1. Compare the zip with the files from the previous sync and delete files that are no longer part of it")
+            print("2. Extract only new and changed files from zip")
+        else:
+            print("1. Delete existing files from previous sync")
+            print("2. Extract all files from zip")
+        if profile:
+            print(f"Only files that the extraction profile {profile['name']} includes are extracted")
+        print(f"3. Create/update {MANIFEST_NAME}")
+        return True
+
+    # Roll back a swap of staged binaries that was interrupted, so that the manifest matches the files again
+    if recover_interrupted_swap(project_path):
+        print("Rolled back an interrupted swap of staged binaries")
+
+    # Check if we're already at the latest state, files that went missing or were modified are repaired.
+    # After a change of the extraction profile the files are compared with the archive again.
+    manifest = read_manifest(project_path)
+    current_zip = os.path.basename(zip_file_path)
+    same_profile = manifest.get("profile") == profile
+    if same_profile and (manifest["source"] == current_zip or (commit_id and manifest.get("commit") == commit_id)):
+        clear_staging(project_path)
+        return verify_and_repair(zip_file_path, project_path, manifest, progress, extraction_workers, verify_checksums)
+
+    # Binaries that were already extracted into the staging folder only have to be moved into place
+    staged_plan = get_ready_plan(project_path, current_zip, manifest["source"])
+    if staged_plan:
+        progress.finish()
+        swap_progress = create_progress("Switching Binaries", f"Moving {len(staged_plan['files'])} staged files into place...", infinite=True)
+        with trace.phase("swap") as phase:
+            phase["files"] = len(staged_plan["files"]) + len(staged_plan["removed"])
+            swap_staged_files(project_path, staged_plan)
+        with trace.phase("write_manifest"):
+            write_zip_manifest(zip_file_path, project_path, extraction_workers, None, commit_id, profile)
+        print(f"Moved {len(staged_plan['files'])} staged files into place, deleted {len(staged_plan['removed'])} files")
+        swap_progress.finish()
+        return True
+
+    # Only the files that changed between the builds are read from delta archives. Files that a new extraction
+    # profile includes are only in the full archive, so it is used when it exists.
+    if delta_paths and (same_profile or not os.path.exists(zip_file_path)):
+        return apply_delta_chain(delta_paths, zip_file_path, project_path, manifest, progress, extraction_workers, commit_id, profile)
+
+    # Create a new progress object for extraction
+    progress.finish()
+    extraction_progress = create_progress("Extracting Binaries", "Preparing to extract files...", infinite=False)
+    extraction_progress.set_cancelable(True)
+    
+    # Read the list of files in the archive, the central directory for zips
+    archive = open_archive(zip_file_path)
+    with trace.phase("read_archive") as phase:
+        file_infos, skipped_files = split_entries(archive.entries(), profile)
+        phase["files"] = len(file_infos)
+
+    # Either only touch files that changed since the previous sync, or delete everything and extract all files
+    extraction_progress.set_text("Comparing files with previous sync...")
+    with trace.phase("compare") as phase:
+        changed_infos, removed_files = get_sync_plan(file_infos, manifest, project_path, incremental, extraction_workers)
+        phase["files"] = len(manifest["files"])
+
+    with trace.phase("delete") as phase:
+        phase["files"] = len(removed_files)
+        phase["bytes"] = sum(manifest["files"][file_name].get("size") or 0 for file_name in removed_files)
+        delete_synced_files(removed_files, project_path)
+
+    # Files of builds that were synced before are linked from the content store instead of extracted
+    linked_infos = []
+    if content_store:
+        extraction_progress.set_text("Linking files from the content store...")
+        with trace.phase("link") as phase:
+            linked_infos, changed_infos = content_store.checkout(current_zip, changed_infos, project_path)
+            phase["files"] = len(linked_infos)
+            phase["bytes"] = sum(file_info.file_size for file_info in linked_infos)
+
+    # Extract the files on multiple workers, overwriting existing ones
+    extraction_progress.set_text("Extracting files...")
+    with trace.phase("extract") as phase:
+        phase["files"] = sum(1 for file_info in changed_infos if not file_info.is_dir())
+        phase["bytes"] = sum(file_info.file_size for file_info in changed_infos)
+        completed = archive.extract(
+            changed_infos,
+            project_path,
+            extraction_workers,
+            lambda: extraction_progress.canceled,
+            SyncProgress(extraction_progress, "Extracting files", phase["bytes"]).report_progress
+        )
+
+    # Stop process if cancel was hit by user
+    if not completed:
+        show_canceled("Process cancelled")
+        extraction_progress.finish()
+        return False
+
+    extracted_files = sum(1 for file_info in changed_infos if not file_info.is_dir())
+    print(f"Extracted {extracted_files} files, {f'linked {len(linked_infos)} files, ' if content_store else ''}{f'skipped {len(skipped_files)} files, ' if profile else ''}deleted {len(removed_files)} files")
+
+    # Store the files of this build, before the manifest takes the stats of the files that were replaced by links
+    if content_store:
+        extraction_progress.set_text("Updating the content store...")
+        with trace.phase("store") as phase:
+            phase["files"] = len(file_infos)
+            content_store.add_build(current_zip, file_infos, project_path, extraction_workers)
+    
+    extraction_progress.set_text("Writing manifest...")
+    with trace.phase("write_manifest") as phase:
+        phase["files"] = len(file_infos)
+        write_zip_manifest(zip_file_path, project_path, extraction_workers, file_infos, commit_id, profile, skipped_files)
+    
+    extraction_progress.finish()
+    return True  # Indicate success
+
+def run_setup(project_path, progress, force=False):
+
+    # Finish the incoming progress object
+    progress.finish()    
+    
+    try:
+        # Create a single progress object for all steps
+        progress = create_progress("Setting up Project", "Checking dependencies...", infinite=True)
+        progress.set_cancelable(True)
+
+        # Step 1: Run GitDependencies.exe
+        git_dependencies_path = os.path.join(project_path, "Engine", "Binaries", "DotNET", "GitDependencies", "win-x64", "GitDependencies.exe")
+        if not os.path.exists(git_dependencies_path):
+            host.show_error("Setup Error", "GitDependencies.exe not found. This is required for setting up the project.")
+            progress.finish()
+            return False
+
+        # Prepare startupinfo to hide the window
+        startupinfo = None
+        if os.name == 'nt':
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        
+        # GitDependencies prints lines like "Updating dependencies: 3% (3476/90939), 12.3/4056.7 MiB | 15.23 MiB/s"
+        dependencies_progress = SyncProgress(progress, "Updating dependencies")
+        def report_dependencies_progress(percent, output_line):
+            if "Updating dependencies:" in output_line:
+                transferred = DEPENDENCIES_TRANSFERRED.search(output_line)
+                if transferred:
+                    dependencies_progress.report_progress(percent, float(transferred.group(1)) * 1024**2, float(transferred.group(2)) * 1024**2)
+                else:
+                    dependencies_progress.report_progress(percent)
+
+        # Skip GitDependencies when the dependency manifests, the tool and its arguments are the same as on the last successful run
+        dependencies_fingerprint = get_dependencies_fingerprint(project_path, git_dependencies_path, GIT_DEPENDENCIES_ARGUMENTS)
+        if not force and is_step_current(project_path, "dependencies", dependencies_fingerprint):
+            print("Dependencies did not change since the last run, skipping GitDependencies")
+        else:
+            # Output is read on threads, so a full pipe never blocks the process
+            return_code, output = run_process(
+                [git_dependencies_path] + GIT_DEPENDENCIES_ARGUMENTS,
+                project_path,
+                lambda: progress.canceled,
+                report_dependencies_progress,
+                startupinfo=startupinfo
+            )
+
+            if return_code is None:
+                show_canceled("Setup cancelled by user")
+                progress.finish()
+                return False
+            
+            # Get final return code
+            if return_code != 0:
+                print("\n".join(output))
+                host.show_error("GitDependencies Error", "Failed to sync dependencies")
+                progress.finish()
+                return False
+
+            # GitDependencies updates .uedependencies, so the fingerprint is taken again
+            record_step(project_path, "dependencies", get_dependencies_fingerprint(project_path, git_dependencies_path, GIT_DEPENDENCIES_ARGUMENTS))
+        
+        # Step 2: Setup git hooks
+        git_hooks_path = os.path.join(project_path, ".git", "hooks")
+        if os.path.exists(git_hooks_path):
+            progress.set_text("Registering git hooks...")
+            
+            # Create post-checkout hook
+            with open(os.path.join(git_hooks_path, "post-checkout"), 'w') as f:
+                f.write("#!/bin/sh\n")
+                f.write("Engine/Binaries/DotNET/GitDependencies/win-x64/GitDependencies.exe\n")
+            
+            # Create post-merge hook
+            with open(os.path.join(git_hooks_path, "post-merge"), 'w') as f:
+                f.write("#!/bin/sh\n")
+                f.write("Engine/Binaries/DotNET/GitDependencies/win-x64/GitDependencies.exe\n")
+            
+            print("Git hooks registered successfully")
+            
+        # Check for cancellation
+        if progress.canceled:
+            show_canceled("Setup cancelled by user")
+            progress.finish()
+            return False
+            
+        # Step 3: Install prerequisites
+        prereq_path = os.path.join(project_path, "Engine", "Extras", "Redist", "en-us", "UEPrereqSetup_x64.exe")
+        prereq_fingerprint = get_tool_fingerprint(prereq_path)
+        if os.path.exists(prereq_path) and not force and is_step_current(project_path, "prerequisites", prereq_fingerprint):
+            print("Prerequisites were already installed, skipping UEPrereqSetup")
+        elif os.path.exists(prereq_path):
+            progress.set_text("Installing prerequisites. Make sure to accept the UAC prompt...")
+            
+            # Prepare special startupinfo to suppress UAC dialog as much as possible
+            uac_startupinfo = None
+            if os.name == 'nt':
+                uac_startupinfo = subprocess.STARTUPINFO()
+                uac_startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+                # Use SW_HIDE to hide the window
+                uac_startupinfo.wShowWindow = 0  # SW_HIDE
+            
+            # Run the prerequisites installer with maximum silent flags
+            try:
+                # Try to run with administrator privileges without showing UAC prompt
+                return_code, output = run_process(
+                    [prereq_path, "/quiet", "/norestart", "/SILENT", "/SUPPRESSMSGBOXES"],
+                    project_path,
+                    lambda: progress.canceled,
+                    startupinfo=uac_startupinfo
+                )
+                
+                if return_code is None:
+                    show_canceled("Setup cancelled by user")
+                    progress.finish()
+                    return False
+                
+                # 3010 means success, but a restart is required
+                if return_code in (0, 3010):
+                    record_step(project_path, "prerequisites", prereq_fingerprint)
+                print("Prerequisites installed successfully")
+            
+            except Exception as e:
+                print(f"Warning: Prerequisites installation encountered an issue: {str(e)}")
+                print("Continuing with next steps...")
+                # Continue anyway as this may not be critical
+            
+        # Check for cancellation
+        if progress.canceled:
+            show_canceled("Setup cancelled by user")
+            progress.finish()
+            return False
+            
+        progress.set_text("Setup completed successfully")
+        progress.finish()
+        return True
+        
+    except Exception as e:
+        host.show_error("Setup Error", str(e))
+        return False
+
+def register_engine(project_path, force=False):
+    try:
+        progress = create_progress("Registering Engine", "Registering engine installation...", infinite=True)
+        progress.set_cancelable(True)
+
+        # The version selector is part of the editor binaries, so this runs once they are extracted
+        version_selector_path = os.path.join(project_path, "Engine", "Binaries", "Win64", "UnrealVersionSelector-Win64-Shipping.exe")
+        registration_fingerprint = get_tool_fingerprint(version_selector_path)
+        if os.path.exists(version_selector_path) and not force and is_step_current(project_path, "registration", registration_fingerprint):
+            print("Engine installation is already registered")
+        elif os.path.exists(version_selector_path):
+            # Prepare startupinfo to hide the window
+            startupinfo = None
+            if os.name == 'nt':
+                startupinfo = subprocess.STARTUPINFO()
+                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+            # Register the engine
+            return_code, output = run_process(
+                [version_selector_path, "/register", "/unattended"],
+                project_path,
+                lambda: progress.canceled,
+                startupinfo=startupinfo
+            )
+            
+            if return_code is None:
+                show_canceled("Setup cancelled by user")
+                progress.finish()
+                return False
+            
+            if return_code == 0:
+                record_step(project_path, "registration", registration_fingerprint)
+            print("Engine registered successfully")
+
+        progress.finish()
+        return True
+
+    except Exception as e:
+        host.show_error("Setup Error", str(e))
+        return False
+
+def is_unreal_running(project_path):
+    if dry_run:
+        print(f"Would check if Unreal Editor is running in: {project_path}")
+        return False
+
+    # Looks for editor processes started from this project and, on Windows, for binaries that are in use
+    return unreal_process.is_unreal_running(project_path)
+
+def keep_indexes():
+    global catalogues, tag_indexes
+    catalogues = {}
+    tag_indexes = {}
+
+def open_catalogue(source_path):
+    # A catalogue that is kept in memory only has to stat the folders of the source again
+    catalogue = catalogues.get(source_path) if catalogues is not None else None
+    if catalogue is None:
+        catalogue = HttpCatalogue(source_path) if is_http_source(source_path) else BinaryCatalogue(source_path)
+        if catalogues is not None:
+            catalogues[source_path] = catalogue
+    return catalogue.refresh()
+
+def open_tag_index(project_path, tag_pattern):
+    # A tag index that is kept in memory is used as long as no tag was created, moved or deleted
+    tag_index = tag_indexes.get((project_path, tag_pattern)) if tag_indexes is not None else None
+    if tag_index is not None and tag_index.fingerprint == get_refs_fingerprint(get_git_dirs(project_path)[1]):
+        tag_index.was_cached = True
+        tag_index.used_git = False
+        return tag_index
+    tag_index = TagIndex(project_path, tag_pattern)
+    if tag_indexes is not None:
+        tag_indexes[(project_path, tag_pattern)] = tag_index
+    return tag_index
+
+def get_matching_commit_id(project_path, tag_pattern, catalogue, base_commit=None, tag_index=None):
+    try:
+        # Get current commit ID
+        current_commit = get_head_commit(project_path)
+
+        if dry_run:
+            print(f"Current commit: {current_commit}")
+            print(f"Searching for tag pattern: '{tag_pattern}'")
+
+        # Read the tags matching the pattern, either from the local index or from git if the refs changed
+        if tag_index is None:
+            tag_index = open_tag_index(project_path, tag_pattern)
+
+        if dry_run:
+            print(f"{'Loaded' if tag_index.was_cached else 'Built'} tag index with {len(tag_index.tags)} tagged commits")
+
+        # Find the nearest ancestor of the current commit that carries a matching tag and has an archive.
+        # Fall back to the nearest tagged commit, so that a missing archive is reported for the right tag.
+        # Commits without a full archive count when they can be reached with delta archives from the synced build
+        available_commits = catalogue.commit_ids() | get_reachable_commits(catalogue.deltas, base_commit)
+        commit_id, matching_tag = tag_index.find_tagged_ancestor(current_commit, available_commits)
+        if commit_id is None:
+            commit_id, matching_tag = tag_index.find_tagged_ancestor(current_commit)
+        elif dry_run:
+            nearest_commit_id, nearest_tag = tag_index.find_tagged_ancestor(current_commit)
+            if nearest_commit_id != commit_id:
+                print(f"No archive found for the newer tag {nearest_tag}, using {matching_tag} instead")
+
+        if dry_run:
+            print("Resolved tags with git" if tag_index.used_git else "Resolved tags from the .git folder without running git")
+
+    except (subprocess.CalledProcessError, OSError) as e:
+        host.show_error("Git Error", f"Failed to retrieve commit information: {str(e)}")
+        return None, None
+
+    if commit_id:
+        if dry_run:
+            print(f"Found matching tag {matching_tag} on commit {commit_id}")
+        return commit_id, matching_tag
+
+    # If no matching tag was found
+    if dry_run:
+        print("\nNo matching binaries found in the history of the current commit")
+    host.show_error("No compatible tag found", f"No tag found for commits with tag pattern '{tag_pattern}'")
+    return None, None
+
+def open_content_store(project_path, sync_settings):
+    # By default the store is inside the project, so that its files are on the same drive and can be linked
+    store_path = sync_settings["content_store_path"]
+    if not store_path:
+        store_path = os.path.join(project_path, STORE_DIR_NAME)
+        exclude_from_git(project_path, STORE_DIR_NAME)
+    return ContentStore(store_path, sync_settings["content_store_size"])
+
+def download_archives(zip_file_path, delta_paths, sync_settings, progress, eager):
+    # Archives on a web server are downloaded next to the cached archives. The full archive is extracted while
+    # it downloads, completely when eager and otherwise only the parts that the sync reads. Delta archives are
+    # small and downloaded completely first. Returns the local paths, or None if the download was canceled.
+    download_dir = get_download_dir(sync_settings["archive_cache_path"])
+    if delta_paths:
+        local_paths = []
+        for delta_path in delta_paths:
+            download = Download(delta_path, get_download_path(download_dir, delta_path)).start()
+            progress.finish()
+            download_progress = create_progress("Downloading Binaries", f"Downloading {os.path.basename(download.local_path)}...", infinite=False)
+            download_progress.set_cancelable(True)
+            with trace.phase("download") as phase:
+                phase["bytes"] = download.size
+                completed = download.wait(lambda: download_progress.canceled, SyncProgress(download_progress, "Downloading", download.size).report_progress)
+            download_progress.finish()
+            if not completed:
+                show_canceled("Process cancelled")
+                return None
+            local_paths.append(download.local_path)
+        prune_downloads(download_dir, sync_settings["archive_cache_size"], local_paths)
+        return zip_file_path, local_paths
+
+    # The extraction reads the archive while it downloads and must not wait for parts after a cancel
+    download = Download(zip_file_path, get_download_path(download_dir, zip_file_path), eager, is_canceled=lambda: progress.canceled).start()
+    prune_downloads(download_dir, sync_settings["archive_cache_size"], [download.local_path])
+    return download.local_path, None
+
+def cache_archive(zip_file_path, archive_cache_path, archive_cache_size, progress):
+    # Returns the path of the local copy of the archive, or None if the copy was canceled
+    progress.finish()
+    cache_progress = create_progress("Caching Binaries", f"Copying {os.path.basename(zip_file_path)} to the local cache...", infinite=False)
+    cache_progress.set_cancelable(True)
+
+    archive_cache = ArchiveCache(archive_cache_path or get_data_dir("archives"), archive_cache_size)
+    with trace.phase("cache_archive") as phase:
+        phase["files"] = 1
+        phase["bytes"] = sum(os.path.getsize(part_path) for part_path in get_archive_parts(zip_file_path))
+        local_zip_file_path = archive_cache.get_archive(zip_file_path, lambda: cache_progress.canceled, SyncProgress(cache_progress, "Copying to the local cache", phase["bytes"]).report_progress)
+    cache_progress.finish()
+
+    if local_zip_file_path is None:
+        show_canceled("Process cancelled")
+    return local_zip_file_path
+
+def launch_editor(project_path,launch_project_path):
+    if not os.path.isabs(launch_project_path):
+        # Append the relative path to the project_path to get the absolute path
+        launch_project_path = os.path.join(project_path, launch_project_path)
+
+    if dry_run:
+        print(f"Launch project path {launch_project_path}")
+    
+    if os.path.exists(launch_project_path):
+        try:
+            # Use shell=False with a list argument
+            subprocess.Popen([launch_project_path], shell=True)
+            host.show_success("Binaries synced", f"Launching project {os.path.basename(launch_project_path)}")
+        except Exception as e:
+            host.show_info("Binaries synced", f"Failed to launch project: {str(e)}")
+    
+def pull_skipped_files(project_path, source_path, module_pattern, sync_settings):
+    # Extracts the files of a module that the extraction profile skipped, e.g. its debug symbols, from the archive
+    # of the build that is synced
+    manifest = read_manifest(project_path)
+    file_names = find_module_files(manifest.get("skipped", []), module_pattern)
+    if not file_names:
+        host.show_info("Nothing to pull", f"The extraction profile did not skip any files of '{module_pattern}'")
+        return False
+
+    try:
+        catalogue = open_catalogue(source_path)
+    except OSError as e:
+        host.show_error("ZIP Location not accessible", str(e))
+        return False
+    zip_file_path = catalogue.find(manifest["commit"]) if manifest.get("commit") else None
+    if zip_file_path is None:
+        host.show_error("No compatible Zip file", "The full archive of the synced build is not in the ZIP Location")
+        return False
+
+    if dry_run:
+        print(f"Would extract {len(file_names)} files of {module_pattern} from {zip_file_path}:")
+        for file_name in file_names:
+            print(f"  {file_name}")
+        return True
+
+    progress = create_progress("Pulling Files", f"Extracting {len(file_names)} files of {module_pattern}...", infinite=False)
+    progress.set_cancelable(True)
+    try:
+        # Only the parts of the archive with these files are downloaded from a web server
+        if is_http_source(source_path):
+            zip_file_path, _ = download_archives(zip_file_path, None, sync_settings, progress, False)
+        archive = open_archive(zip_file_path)
+        pulled_files = set(file_names)
+        file_infos = [file_info for file_info in archive.entries() if file_info.filename in pulled_files]
+        completed = archive.extract(
+            file_infos,
+            project_path,
+            sync_settings["extraction_workers"],
+            lambda: progress.canceled,
+            SyncProgress(progress, "Extracting files", sum(file_info.file_size for file_info in file_infos)).report_progress
+        )
+    except Exception as e:
+        host.show_error("Extraction failed", str(e))
+        progress.finish()
+        return False
+
+    if not completed:
+        show_canceled("Process cancelled")
+        progress.finish()
+        return False
+
+    add_pulled_files(project_path, manifest, file_infos, stat_files(project_path, [file_info.filename for file_info in file_infos], sync_settings["extraction_workers"]))
+    host.show_success("Files pulled", f"Extracted {len(file_infos)} files of {module_pattern}")
+    progress.finish()
+    return True
+
+def run_pull_processes(sync_host,project_path,source_path,module_pattern,sync_settings,debug=False):
+    global host, dry_run
+
+    host = sync_host
+    dry_run = debug
+    try:
+        return pull_skipped_files(project_path, source_path, module_pattern, sync_settings)
+    finally:
+        cancel_downloads()
+
+def run_sync_processes(sync_host,project_path,sync_dependencies,source_path,launch_project_path,tag_pattern,sync_settings,debug=False):
+    global host, dry_run, trace, pipeline
+
+    host = sync_host
+    dry_run = debug
+    # Timings are only recorded when enabled, otherwise every phase is a no-op
+    trace = SyncTrace(completed=False) if sync_settings["record_timings"] or dry_run else NullTrace()
+    try:
+        run_sync_steps(project_path,sync_dependencies,source_path,launch_project_path,tag_pattern,sync_settings)
+    finally:
+        cancel_downloads()
+        if trace.enabled:
+            if dry_run:
+                print(trace.summary())
+            else:
+                try:
+                    trace.write(project_path)
+                except OSError as e:
+                    print(f"Could not write sync timings: {str(e)}")
+        trace = NullTrace()
+        pipeline = None
+
+def run_sync_steps(project_path,sync_dependencies,source_path,launch_project_path,tag_pattern,sync_settings):
+    global pipeline
+
+    # Start the progress, it shows the steps that are running and cancels all of them
+    pipeline = SyncPipeline(host.create_progress("Syncing Editor","Initializing...", infinite=True))
+    pipeline.progress.set_cancelable(True)
+    progress = pipeline.shared_progress
+
+    # Delta archives are applied on top of the build that was synced last
+    base_commit = read_manifest(project_path).get("commit") if sync_settings["incremental"] else None
+
+    catalogue = None
+    tag_index = None
+    matching_commit_id = None
+    matching_tag = None
+    zip_file_path = None
+    delta_paths = None
+    archive_exists = False
+    sync_lock = None
+
+    def check_editor():
+        # A staged sync prepares the binaries while the editor is still open
+        with trace.phase("check_editor"):
+            editor_running = not sync_settings["staged_sync"] and is_unreal_running(project_path)
+        if editor_running:
+            host.show_info("Unreal Editor is running", "Please close Unreal Engine before proceeding with the binary sync.")
+            return False
+
+    def list_source():
+        nonlocal catalogue
+        # Index the archives in the binary source, only folders that changed since the last sync are listed
+        try:
+            with trace.phase("catalogue") as phase:
+                catalogue = open_catalogue(source_path)
+                phase["files"] = len(catalogue.archives)
+        except OSError as e:
+            host.show_error("ZIP Location not accessible", str(e))
+            return False
+
+        if dry_run:
+            print(f"Found {len(catalogue.archives)} archives in {source_path} ({catalogue.scanned_folders} folders listed)")
+
+    def read_tags():
+        nonlocal tag_index
+        try:
+            with trace.phase("read_tags"):
+                tag_index = open_tag_index(project_path, tag_pattern)
+        except (subprocess.CalledProcessError, OSError) as e:
+            host.show_error("Git Error", f"Failed to retrieve commit information: {str(e)}")
+            return False
+
+    def resolve_tag():
+        nonlocal matching_commit_id, matching_tag, zip_file_path, delta_paths, archive_exists
+        with trace.phase("resolve_tag"):
+            matching_commit_id, matching_tag = get_matching_commit_id(project_path, tag_pattern, catalogue, base_commit, tag_index)
+        if matching_commit_id is None:
+            return False
+        trace.set_info(tag=matching_tag, commit=matching_commit_id)
+
+        # Found a matching tag, check for zip file. The shortest chain of delta archives is used when there is one.
+        zip_file_path = catalogue.find(matching_commit_id) or os.path.join(source_path, f"{matching_commit_id}.zip")
+        delta_chain = find_delta_chain(catalogue.deltas, base_commit, matching_commit_id)
+        delta_paths = [catalogue.find_delta(commit_id, parent_id) for parent_id, commit_id in delta_chain] if delta_chain else None
+        # Archives on a web server are only known from the listing
+        archive_exists = os.path.exists(zip_file_path) or (is_http_source(source_path) and catalogue.find(matching_commit_id) is not None)
+
+        if not (delta_paths or archive_exists or (base_commit and base_commit == matching_commit_id)):
+            if dry_run:
+                print(f"Zip file not found: {zip_file_path}")
+            else:
+                host.show_error("No compatible Zip file", f"No binaries found for tag '{matching_tag}'")
+            return False
+
+        source_paths = delta_paths or [zip_file_path]
+        trace.set_info(
+            archive=", ".join(os.path.basename(source_path) for source_path in source_paths),
+            archive_size=sum(os.path.getsize(part_path) for source_path in source_paths if os.path.exists(source_path) for part_path in get_archive_parts(source_path)),
+            incremental=sync_settings["incremental"]
+        )
+        if dry_run:
+            if delta_paths:
+                print(f"Found {len(delta_paths)} delta archives from the synced build: {', '.join(delta_paths)}")
+            print(f"Found matching zip file: {zip_file_path}")
+            print("\nWould perform the following actions:")
+            print(f"1. {'Run setup script' if sync_dependencies else 'Skip setup script'}")
+            print(f"2. Extract binaries from {matching_tag}")
+            if launch_project_path:
+                print(f"3. Launch project: {launch_project_path}")
+            return False
+
+    def fetch_archives():
+        nonlocal zip_file_path, delta_paths, sync_lock
+        # A prefetch from the git hooks may be copying or staging the same archive
+        sync_lock = lock_project_for_sync(project_path, lambda: progress.canceled, lambda: progress.set_text("Waiting for the prefetch to finish..."))
+        if sync_lock is None:
+            show_canceled("Process cancelled")
+            return False
+
+        # Start downloading from a web server, the extraction reads the parts that have arrived
+        if is_http_source(source_path) and (delta_paths or archive_exists):
+            try:
+                # Only a sync that extracts every file needs the whole archive
+                eager = not sync_settings["incremental"] or not read_manifest(project_path)["files"]
+                downloaded = download_archives(zip_file_path, delta_paths, sync_settings, progress, eager)
+            except OSError as e:
+                host.show_error("Download failed", str(e))
+                return False
+            if downloaded is None:
+                return False
+            zip_file_path, delta_paths = downloaded
+
+        # Copy the archive to the local cache, so that the extraction does not read from the network
+        elif sync_settings["archive_cache"] and (delta_paths or os.path.exists(zip_file_path)):
+            try:
+                if delta_paths:
+                    delta_paths = [cache_archive(delta_path, sync_settings["archive_cache_path"], sync_settings["archive_cache_size"], progress) for delta_path in delta_paths]
+                else:
+                    zip_file_path = cache_archive(zip_file_path, sync_settings["archive_cache_path"], sync_settings["archive_cache_size"], progress)
+            except Exception as e:
+                host.show_error("Caching failed", str(e))
+                return False
+            if zip_file_path is None or (delta_paths and None in delta_paths):
+                return False
+
+    def stage():
+        # Extract into the staging folder and wait until the editor is closed before touching the project.
+        # Delta archives are small, so they are applied directly once the editor is closed.
+        if not delta_paths:
+            try:
+                if not stage_binaries(zip_file_path, project_path, sync_settings["extraction_workers"], sync_settings["incremental"], sync_settings["extraction_profile"]):
+                    return False
+            except Exception as e:
+                host.show_error("Extraction failed", str(e))
+                return False
+        if not wait_for_unreal_to_close(project_path):
+            return False
+
+    def setup():
+        with trace.phase("setup"):
+            setup_completed = run_setup(project_path, progress, sync_settings["force_setup"])
+        if not setup_completed:
+            return False
+
+    def register():
+        with trace.phase("register_engine"):
+            if not register_engine(project_path, sync_settings["force_setup"]):
+                return False
+
+    def register_prefetch():
+        # The setup rewrites the git hooks, so register the prefetch again
+        install_prefetch_hooks(project_path)
+
+    def extract():
+        try:
+            content_store = open_content_store(project_path, sync_settings) if sync_settings["content_store"] else None
+            if not unzip_and_manage_files(zip_file_path, project_path, progress, sync_settings["incremental"], sync_settings["extraction_workers"], sync_settings["verify_checksums"], matching_commit_id, delta_paths, content_store, sync_settings["extraction_profile"]):
+                return False  # If extraction was canceled or failed
+        except Exception as e:
+            host.show_error("Extraction failed", str(e))
+            return False
+
+    def finish():
+        trace.set_info(completed=True)
+
+        # Lets the next sync return right away if neither the commit, the tags nor the source changed
+        try:
+            record_sync(project_path, source_path, tag_pattern, catalogue, matching_commit_id)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Could not record the sync state: {str(e)}")
+
+        # Launch the selected uproject file if one was selected
+        if launch_project_path:
+            launch_editor(project_path,launch_project_path)
+        else:
+            host.show_success("Binaries synced", f"Files extracted from {matching_tag}")
+
+    # The binary source is listed while the tags are read from git. GitDependencies and the prerequisites
+    # touch different files than the archive, so they run while the archive is copied and extracted. Only the
+    # staging folder has to wait for the editor to close before the setup can run. The version selector that
+    # registers the engine comes with the archive, so it only runs once the extraction is done.
+    pipeline.add("check_editor", check_editor, text="Checking for Unreal Editor")
+    pipeline.add("catalogue", list_source, text="Listing binaries")
+    pipeline.add("read_tags", read_tags, text="Reading tags")
+    pipeline.add("resolve_tag", resolve_tag, ("catalogue", "read_tags"), "Finding binaries")
+    pipeline.add("fetch", fetch_archives, ("check_editor", "resolve_tag"), "Fetching binaries")
+    if sync_settings["staged_sync"]:
+        pipeline.add("stage", stage, ("fetch",), "Staging binaries")
+    if sync_dependencies:
+        pipeline.add("setup", setup, ("check_editor", "resolve_tag", "stage"), "Setting up project")
+    if sync_settings["prefetch"]:
+        pipeline.add("prefetch_hooks", register_prefetch, ("setup",), "Registering git hooks")
+    pipeline.add("extract", extract, ("fetch", "stage"), "Extracting binaries")
+    if sync_dependencies:
+        pipeline.add("register_engine", register, ("extract", "setup"), "Registering engine")
+    pipeline.add("finish", finish, ("extract", "setup", "register_engine", "prefetch_hooks"), "Finishing")
+
+    try:
+        pipeline.run()
+    finally:
+        trace.set_info(overlap_saved=round(pipeline.saved_seconds, 3))
+        if sync_lock:
+            release_lock(sync_lock)
+    if pipeline.saved_seconds >= 0.1:
+        print(f"Running independent steps in parallel saved {pipeline.saved_seconds:.1f}s")
@@ -0,0 +1,135 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+
+# Runs the steps of a sync as soon as the steps they depend on are done, so that steps which don't depend on
+# each other overlap, e.g. GitDependencies with the copy of the archive to the local cache and the extraction.
+# A step returns False to stop the sync: no other step starts, and the steps that are running see their
+# progress as canceled, so that e.g. the extraction does not finish after the setup failed.
+
+class PipelineProgress:
+    # Progress as seen by a step. Canceling any progress of the sync or a failed step cancels all of them.
+    # The progress of the whole sync is shared by the steps and only finished by the pipeline.
+    def __init__(self, pipeline, progress, shared=False):
+        self.pipeline = pipeline
+        self.progress = progress
+        self.shared = shared
+
+    @property
+    def canceled(self):
+        if self.progress.canceled:
+            self.pipeline.canceled = True
+        return self.pipeline.is_canceled() or self.pipeline.stopped
+
+    def set_cancelable(self, cancelable):
+        self.progress.set_cancelable(cancelable)
+
+    def set_text(self, text):
+        self.progress.set_text(text)
+
+    def report_progress(self, value):
+        self.progress.report_progress(value)
+
+    def finish(self):
+        if not self.shared:
+            self.progress.finish()
+
+class SyncPipeline:
+    def __init__(self, progress):
+        self.progress = progress
+        self.shared_progress = PipelineProgress(self, progress, shared=True)
+        self.steps = {}
+        self.finished = set()
+        self.durations = {}
+        self.busy_intervals = []
+        self.step_state = threading.local()
+        self.stopped = False
+        self.canceled = False
+        self.saved_seconds = 0.0
+
+    def add(self, name, function, depends=(), text=""):
+        # Dependencies on steps that were not added count as done, so optional steps can simply be left out
+        self.steps[name] = (function, depends, text or name)
+
+    def wrap(self, progress):
+        return PipelineProgress(self, progress)
+
+    def is_canceled(self):
+        if self.progress.canceled:
+            self.canceled = True
+        return self.canceled
+
+    def is_ready(self, name):
+        return all(dependency in self.finished or dependency not in self.steps for dependency in self.steps[name][1])
+
+    def run_step(self, name, function):
+        started = time.perf_counter()
+        self.step_state.busy_since = started
+        try:
+            return function()
+        finally:
+            ended = time.perf_counter()
+            self.busy_intervals.append((self.step_state.busy_since, ended))
+            self.step_state.busy_since = None
+            self.durations[name] = ended - started
+
+    @contextmanager
+    def idle(self):
+        # Time that a step waits for the user, e.g. to close the editor, is not counted as overlapping work
+        busy_since = getattr(self.step_state, "busy_since", None)
+        if busy_since is not None:
+            self.busy_intervals.append((busy_since, time.perf_counter()))
+        try:
+            yield
+        finally:
+            if busy_since is not None:
+                self.step_state.busy_since = time.perf_counter()
+
+    def get_overlap_seconds(self):
+        # Time that the busy steps would have taken one after the other, minus the time any of them was busy
+        covered_seconds = 0.0
+        covered_start = covered_end = None
+        for start, end in sorted(self.busy_intervals):
+            if covered_end is None or start > covered_end:
+                if covered_end is not None:
+                    covered_seconds += covered_end - covered_start
+                covered_start, covered_end = start, end
+            else:
+                covered_end = max(covered_end, end)
+        if covered_end is not None:
+            covered_seconds += covered_end - covered_start
+        return max(0.0, sum(end - start for start, end in self.busy_intervals) - covered_seconds)
+
+    def run(self):
+        # Returns True if every step completed. An exception of a step is raised once the other running steps are done.
+        pending = list(self.steps)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=max(1, len(self.steps))) as executor:
+            while True:
+                if not self.stopped and not self.is_canceled():
+                    for name in [name for name in pending if self.is_ready(name)]:
+                        pending.remove(name)
+                        running[executor.submit(self.run_step, name, self.steps[name][0])] = name
+                if not running:
+                    break
+                self.progress.set_text(", ".join(self.steps[name][2] for name in running.values()) + "...")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        if future.result() is False:
+                            self.stopped = True
+                        else:
+                            self.finished.add(name)
+                    except Exception as e:
+                        self.stopped = True
+                        error = error or e
+
+        self.saved_seconds = self.get_overlap_seconds()
+        self.progress.finish()
+        if error:
+            raise error
+        return not pending and not self.stopped and not self.canceled
@@ -0,0 +1,52 @@
+import time
+
+# Every update is a call into Anchorpoint, so progress and text are sent at most this often
+UPDATE_INTERVAL = 0.25
+
+def format_size(size):
+    if size >= 1024**3:
+        return f"{size / 1024**3:.1f} GB"
+    return f"{size / 1024**2:.0f} MB"
+
+def format_duration(seconds):
+    if seconds >= 3600:
+        return f"{int(seconds // 3600)}h {int(seconds % 3600 // 60)}m"
+    if seconds >= 60:
+        return f"{int(seconds // 60)}m {int(seconds % 60)}s"
+    return f"{int(seconds)}s"
+
+class SyncProgress:
+    # Wraps an ap.Progress. Callers report the byte weighted fraction as often as they like, it is passed on
+    # at a fixed rate together with a text that shows the transferred bytes, the throughput and the ETA.
+    def __init__(self, progress, text, total_bytes=0, interval=UPDATE_INTERVAL):
+        self.progress = progress
+        self.text = text
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_update = 0
+
+    def report_progress(self, fraction, done_bytes=None, total_bytes=None):
+        if total_bytes:
+            self.total_bytes = total_bytes
+        now = time.monotonic()
+        if fraction < 1.0 and now - self.last_update < self.interval:
+            return
+        self.last_update = now
+        fraction = min(max(fraction, 0.0), 1.0)
+        self.progress.report_progress(fraction)
+        self.progress.set_text(self.get_text(fraction, done_bytes, now - self.started))
+
+    def get_text(self, fraction, done_bytes, elapsed):
+        details = []
+        if self.total_bytes:
+            if done_bytes is None:
+                done_bytes = fraction * self.total_bytes
+            details.append(f"{format_size(done_bytes)} of {format_size(self.total_bytes)}")
+            if elapsed >= 1 and done_bytes:
+                details.append(f"{done_bytes / elapsed / 1024**2:.1f} MB/s")
+        if 0 < fraction < 1 and elapsed >= 1:
+            details.append(f"{format_duration(elapsed * (1 - fraction) / fraction)} left")
+        if not details:
+            return f"{self.text}..."
+        return f"{self.text}: {', '.join(details)}"
@@ -0,0 +1,55 @@
+import os
+import subprocess
+
+from local_storage import get_data_dir, get_path_key, read_json, write_json
+from git_tags import get_git_dirs, get_refs_fingerprint, get_head_commit
+from binary_manifest import read_manifest, verify_files
+
+# The inputs of the last sync that completed: HEAD, the tag refs and the mtimes of the folders in the binary
+# source. When none of them changed and the files on disk still match the manifest, the same build would be
+# synced again, so a sync can stop before it lists the source, resolves tags or opens an archive.
+# Only standard library and small modules are imported here, the command line checks this before it loads the sync.
+
+def get_state_path(project_path):
+    return os.path.join(get_data_dir("sync_state"), f"{get_path_key(project_path)}.json")
+
+def get_folder_mtimes(source_path, folders):
+    # Adding or removing an archive changes the mtime of its folder
+    mtimes = {}
+    for relative_folder in folders:
+        folder_path = os.path.join(source_path, *relative_folder.split("/")) if relative_folder else source_path
+        mtimes[relative_folder] = os.stat(folder_path).st_mtime_ns
+    return mtimes
+
+def record_sync(project_path, source_path, tag_pattern, catalogue, commit_id):
+    _, common_dir = get_git_dirs(project_path)
+    write_json(get_state_path(project_path), {
+        "head": get_head_commit(project_path),
+        "refs": get_refs_fingerprint(common_dir),
+        "source_path": source_path,
+        "tag_pattern": tag_pattern,
+        # A web server has no folder mtimes, its listing has to be requested on every sync
+        "folders": {relative_folder: folder["mtime"] for relative_folder, folder in catalogue.folders.items()} if os.path.isdir(source_path) else None,
+        "commit": commit_id
+    })
+
+def is_up_to_date(project_path, source_path, tag_pattern, workers=0, profile=None):
+    # Returns the commit of the synced build if a sync would not change anything, otherwise None
+    state = read_json(get_state_path(project_path))
+    if not state or state.get("folders") is None or state["source_path"] != source_path or state["tag_pattern"] != tag_pattern:
+        return None
+    try:
+        _, common_dir = get_git_dirs(project_path)
+        if get_head_commit(project_path) != state["head"] or get_refs_fingerprint(common_dir) != state["refs"]:
+            return None
+        if get_folder_mtimes(source_path, state["folders"]) != state["folders"]:
+            return None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    manifest = read_manifest(project_path)
+    if manifest.get("commit") != state["commit"] or manifest.get("profile") != profile or not manifest["files"]:
+        return None
+    if verify_files(project_path, manifest, workers):
+        return None
+    return state["commit"]
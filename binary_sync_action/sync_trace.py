@@ -0,0 +1,90 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from staged_sync import exclude_from_git
+
+# Records wall time, files and bytes of each phase of a sync. Every sync appends one JSON line to
+# binary_sync_timings.jsonl next to the manifest.
+TRACE_NAME = "binary_sync_timings.jsonl"
+MAX_TRACE_RECORDS = 100
+
+class SyncTrace:
+    enabled = True
+
+    def __init__(self, **info):
+        self.info = info
+        self.phases = []
+        self.started = time.time()
+        self.started_counter = time.perf_counter()
+
+    def set_info(self, **info):
+        self.info.update(info)
+
+    @contextmanager
+    def phase(self, name):
+        # The yielded record can be filled with "files" and "bytes" while the phase runs
+        record = {"name": name, "files": 0, "bytes": 0}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 4)
+            record["mb_per_s"] = round(record["bytes"] / 1024**2 / record["seconds"], 2) if record["bytes"] and record["seconds"] else None
+            self.phases.append(record)
+
+    def to_record(self):
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "seconds": round(time.perf_counter() - self.started_counter, 4),
+            **self.info,
+            "phases": self.phases
+        }
+
+    def write(self, project_path):
+        # Append the record and keep only the latest syncs
+        trace_path = os.path.join(project_path, TRACE_NAME)
+        lines = []
+        if os.path.exists(trace_path):
+            with open(trace_path, 'r') as file:
+                lines = file.readlines()[-(MAX_TRACE_RECORDS - 1):]
+        lines.append(json.dumps(self.to_record()) + "\n")
+        with open(trace_path, 'w') as file:
+            file.writelines(lines)
+        # Keep the timings out of the changed files list
+        exclude_from_git(project_path, TRACE_NAME, is_dir=False)
+
+    def summary(self):
+        record = self.to_record()
+        saved = f", {record['overlap_saved']:.2f}s saved by overlapping steps" if record.get("overlap_saved") else ""
+        lines = [f"\nSync timings ({record['seconds']:.2f}s total{saved}):"]
+        for phase in self.phases:
+            line = f"  {phase['name']:<24}{phase['seconds']:>9.3f}s"
+            if phase["files"]:
+                line += f"{phase['files']:>9} files"
+            if phase["bytes"]:
+                line += f"{phase['bytes'] / 1024**2:>10.1f} MB"
+            if phase["mb_per_s"]:
+                line += f"{phase['mb_per_s']:>10.1f} MB/s"
+            lines.append(line)
+        return "\n".join(lines)
+
+class NullTrace:
+    # Used when timings are disabled, phases only cost a method call
+    enabled = False
+
+    class NullPhase:
+        def __enter__(self):
+            return {"files": 0, "bytes": 0}
+
+        def __exit__(self, *args):
+            return False
+
+    null_phase = NullPhase()
+
+    def set_info(self, **info):
+        pass
+
+    def phase(self, name):
+        return self.null_phase
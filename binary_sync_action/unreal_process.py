@@ -0,0 +1,86 @@
+import os
+import time
+import psutil
+
+from uproject_discovery import find_uproject_files
+
+# Processes that keep the engine or project binaries loaded. Game editor targets like "MyGameEditor" are
+# matched by the "editor" suffix, their path decides whether they belong to the project.
+EDITOR_PROCESS_NAMES = {"unrealeditor", "unrealeditor-cmd", "ue4editor", "ue4editor-cmd", "shadercompileworker"}
+CACHE_TTL = 2.0
+
+cached_results = {}
+
+def get_process_name(name):
+    name = name.lower()
+    return name[:-4] if name.endswith(".exe") else name
+
+def is_candidate_name(name):
+    name = get_process_name(name)
+    return name in EDITOR_PROCESS_NAMES or name.endswith("editor") or name.endswith("editor-cmd")
+
+def is_in_project(file_path, project_path):
+    file_path = os.path.normcase(os.path.abspath(file_path))
+    project_path = os.path.normcase(os.path.abspath(project_path))
+    return file_path.startswith(project_path + os.sep)
+
+def find_editor_processes(project_path):
+    # Only fetches the name of every process, the exe path is only resolved for the few candidates
+    processes = []
+    for process in psutil.process_iter(['name']):
+        try:
+            name = process.info['name']
+            if not name or not is_candidate_name(name):
+                continue
+            exe_path = process.exe()
+            if exe_path and is_in_project(exe_path, project_path):
+                processes.append((process.pid, name, exe_path))
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            pass
+    return processes
+
+def get_probe_files(project_path):
+    # The engine executables and the editor modules of the game projects, these are loaded while an editor runs
+    binaries_folders = [os.path.join(project_path, "Engine", "Binaries", "Win64")]
+    for uproject_file in find_uproject_files(project_path):
+        binaries_folders.append(os.path.join(project_path, os.path.dirname(uproject_file), "Binaries", "Win64"))
+
+    probe_files = []
+    for binaries_folder in binaries_folders:
+        try:
+            with os.scandir(binaries_folder) as entries:
+                for entry in entries:
+                    name = entry.name.lower()
+                    if (name.endswith(".exe") and is_candidate_name(name)) or (name.startswith("unrealeditor-") and name.endswith(".dll")):
+                        probe_files.append(entry.path)
+        except OSError:
+            pass
+    return probe_files
+
+def is_file_locked(file_path):
+    # Windows does not allow to open an executable or DLL for writing while a process has it loaded
+    if not os.access(file_path, os.W_OK):
+        return False
+    try:
+        with open(file_path, 'r+b'):
+            return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+
+def are_binaries_locked(project_path):
+    if os.name != 'nt':
+        return False
+    return any(is_file_locked(file_path) for file_path in get_probe_files(project_path))
+
+def is_unreal_running(project_path, max_age=CACHE_TTL):
+    # Results are reused for max_age seconds, so repeated checks during a sync don't scan the processes again
+    cache_key = os.path.normcase(os.path.abspath(project_path))
+    cached_result = cached_results.get(cache_key)
+    if cached_result and time.monotonic() - cached_result[0] < max_age:
+        return cached_result[1]
+
+    running = are_binaries_locked(project_path) or bool(find_editor_processes(project_path))
+    cached_results[cache_key] = (time.monotonic(), running)
+    return running
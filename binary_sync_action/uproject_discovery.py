@@ -0,0 +1,58 @@
+import os
+
+from local_storage import get_data_dir, get_path_key, read_json, write_json
+
+# Folders that never contain a .uproject file but can hold hundreds of thousands of files
+SKIPPED_FOLDERS = {"engine", "templates", "content", "intermediate", "saved", "plugins", "binaries", "deriveddatacache"}
+
+def is_skipped_folder(folder_name):
+    return folder_name.startswith(".") or folder_name.lower() in SKIPPED_FOLDERS
+
+def scan_folder(folder_path):
+    folder = {"uprojects": [], "subfolders": []}
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not is_skipped_folder(entry.name):
+                    folder["subfolders"].append(entry.name)
+            elif entry.name.endswith(".uproject"):
+                folder["uprojects"].append(entry.name)
+    folder["uprojects"].sort()
+    folder["subfolders"].sort()
+    return folder
+
+def find_uproject_files(project_path, max_depth=3):
+    # Returns the .uproject files relative to the project path. The scanned folders are stored locally with
+    # their mtime, so a repeated search only stats the folders and lists the ones that changed.
+    cache_path = os.path.join(get_data_dir("uprojects"), f"{get_path_key(project_path)}.json")
+    cache = read_json(cache_path, {})
+    cached_folders = cache.get("folders", {}) if cache.get("max_depth") == max_depth else {}
+
+    folders = {}
+    uproject_files = []
+    refresh_folder(project_path, "", 0, max_depth, cached_folders, folders, uproject_files)
+
+    if folders != cached_folders:
+        write_json(cache_path, {"project_path": project_path, "max_depth": max_depth, "folders": folders})
+    return uproject_files
+
+def refresh_folder(project_path, relative_folder, depth, max_depth, cached_folders, folders, uproject_files):
+    folder_path = os.path.join(project_path, *relative_folder.split("/")) if relative_folder else project_path
+    try:
+        mtime = os.stat(folder_path).st_mtime_ns
+        cached_folder = cached_folders.get(relative_folder)
+        if cached_folder and cached_folder["mtime"] == mtime:
+            folder = cached_folder
+        else:
+            folder = {"mtime": mtime, **scan_folder(folder_path)}
+    except OSError:
+        return
+    folders[relative_folder] = folder
+
+    for uproject in folder["uprojects"]:
+        uproject_files.append(os.path.join(*relative_folder.split("/"), uproject) if relative_folder else uproject)
+
+    # Same reach as the previous os.walk: files are found up to max_depth + 1 folder levels below the project
+    if depth <= max_depth:
+        for subfolder in folder["subfolders"]:
+            refresh_folder(project_path, f"{relative_folder}/{subfolder}" if relative_folder else subfolder, depth + 1, max_depth, cached_folders, folders, uproject_files)
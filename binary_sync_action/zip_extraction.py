@@ -0,0 +1,110 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+# Size of the chunks that are streamed from the zip into the target files
+BUFFER_SIZE = 4 * 1024 * 1024
+
+def get_worker_count(extraction_workers):
+    # 0 means that the worker count is picked based on the available cores
+    if extraction_workers and extraction_workers > 0:
+        return extraction_workers
+    return min(16, os.cpu_count() or 1)
+
+def get_target_path(target_path, filename):
+    # Same sanitizing as ZipFile.extract, so that entries can never be written outside of the target path
+    arcname = filename.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    invalid_path_parts = ('', os.path.curdir, os.path.pardir)
+    arcname = os.path.sep.join(part for part in arcname.split(os.path.sep) if part not in invalid_path_parts)
+    return os.path.join(target_path, arcname)
+
+def open_target(full_path):
+    # Files can be hard links into the content store, those are replaced instead of overwritten in place
+    try:
+        if os.stat(full_path).st_nlink > 1:
+            os.remove(full_path)
+    except FileNotFoundError:
+        pass
+    return open(full_path, 'wb')
+
+def create_directories(file_infos, target_path):
+    # Create every directory once up front, so that the workers only have to write files
+    directories = set()
+    for file_info in file_infos:
+        full_path = get_target_path(target_path, file_info.filename)
+        directories.add(full_path if file_info.is_dir() else os.path.dirname(full_path))
+    for directory in sorted(directories):
+        os.makedirs(directory, exist_ok=True)
+
+def extract_files(open_reader, file_infos, target_path, extraction_workers, is_canceled, report_progress):
+    # Extracts the given entries on a pool of workers. Every worker gets its own archive handle from
+    # open_reader and streams the entries in large chunks. Progress is reported weighted by the uncompressed size.
+    # Returns False if the extraction was canceled.
+    create_directories(file_infos, target_path)
+
+    # Start with the largest files, so that a big PDB does not end up as the last job of a single worker
+    pending = sorted((file_info for file_info in file_infos if not file_info.is_dir()), key=lambda info: info.file_size, reverse=True)
+    total_files = len(pending)
+    if total_files == 0:
+        return True
+    total_bytes = sum(file_info.file_size for file_info in pending)
+
+    lock = threading.Lock()
+    stop = threading.Event()
+    state = {"next": 0, "done": 0}
+
+    def next_file_info():
+        with lock:
+            if state["next"] >= total_files:
+                return None
+            file_info = pending[state["next"]]
+            state["next"] += 1
+            return file_info
+
+    def worker(worker_index):
+        with open_reader() as reader:
+            while not stop.is_set():
+                file_info = next_file_info()
+                if file_info is None:
+                    return
+                full_path = get_target_path(target_path, file_info.filename)
+                with reader.open(file_info.filename) as source, open_target(full_path) as target:
+                    while not stop.is_set():
+                        chunk = source.read(BUFFER_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        # Only this worker writes its counter, so no lock is needed per chunk
+                        written_bytes[worker_index] += len(chunk)
+                with lock:
+                    state["done"] += 1
+
+    def get_done_fraction():
+        if total_bytes == 0:
+            return state["done"] / total_files
+        return sum(written_bytes) / total_bytes
+
+    worker_count = min(get_worker_count(extraction_workers), total_files)
+    written_bytes = [0] * worker_count
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        futures = [executor.submit(worker, worker_index) for worker_index in range(worker_count)]
+        try:
+            # Report progress and check for cancellation from the calling thread
+            while not all(future.done() for future in futures):
+                if is_canceled() or any(future.done() and future.exception() for future in futures):
+                    stop.set()
+                    break
+                report_progress(get_done_fraction())
+                wait(futures, timeout=0.1, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                future.result()
+        finally:
+            stop.set()
+
+    if state["done"] < total_files:
+        return False
+    report_progress(1.0)
+    return True
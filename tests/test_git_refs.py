@@ -0,0 +1,208 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "binary_sync_action"))
+import git_refs
+from git_tags import TagIndex, get_git_dirs, get_head_commit
+
+# Builds throwaway repositories with git and compares what git_refs reads from the .git folder with the
+# output of git rev-parse, for-each-ref and rev-list.
+
+TAG_PATTERN = "Editor"
+
+def git(repository_path, *arguments, commit_time=None):
+    environment = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": "Test",
+        "GIT_AUTHOR_EMAIL": "test@example.com",
+        "GIT_COMMITTER_NAME": "Test",
+        "GIT_COMMITTER_EMAIL": "test@example.com",
+        "GIT_CONFIG_NOSYSTEM": "1",
+        "GIT_CONFIG_GLOBAL": os.devnull,
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": "advice.nestedTag",
+        "GIT_CONFIG_VALUE_0": "false"
+    }
+    if commit_time is not None:
+        # Distinct commit times keep the newest first order of rev-list unambiguous
+        environment["GIT_AUTHOR_DATE"] = environment["GIT_COMMITTER_DATE"] = f"{1700000000 + commit_time} +0000"
+    return subprocess.check_output(["git", *arguments], cwd=repository_path, env=environment, text=True).strip()
+
+def read_tags_from_git(repository_path, tag_pattern):
+    # Older versions of git peel tags of tags only once in for-each-ref, so rev-parse peels them to the commit
+    tags = {}
+    for tag_name in git(repository_path, "for-each-ref", "--format=%(refname:strip=2)", "refs/tags").splitlines():
+        if tag_pattern in tag_name:
+            tags.setdefault(git(repository_path, "rev-parse", f"refs/tags/{tag_name}^{{commit}}"), []).append(tag_name)
+    return tags
+
+def find_tagged_ancestor_with_git(repository_path, head_commit, tagged_commits):
+    for commit_id in git(repository_path, "rev-list", head_commit).splitlines():
+        if commit_id in tagged_commits:
+            return commit_id
+    return None
+
+class GitRefsTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        # The tag index is stored in the local data folder
+        environment = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(self.temp_dir, "cache"), "LOCALAPPDATA": os.path.join(self.temp_dir, "cache")})
+        environment.start()
+        self.addCleanup(environment.stop)
+
+        self.repository_path = os.path.join(self.temp_dir, "repository")
+        os.makedirs(self.repository_path)
+        self.commit_count = 0
+        git(self.repository_path, "init", "-q", "-b", "main")
+        self.create_history()
+
+    def commit(self, repository_path=None):
+        repository_path = repository_path or self.repository_path
+        self.commit_count += 1
+        # A file per commit, so that branches merge without conflicts
+        file_name = f"file{self.commit_count}.txt"
+        with open(os.path.join(repository_path, file_name), 'w') as file:
+            file.write(f"{self.commit_count}\n")
+        git(repository_path, "add", file_name)
+        git(repository_path, "commit", "-q", "-m", f"Commit {self.commit_count}", commit_time=self.commit_count)
+        return git(repository_path, "rev-parse", "HEAD")
+
+    def create_history(self):
+        # main: 1 - 2 (lightweight tag) - 3 (annotated) - merge of a feature branch - 6 (tag of a tag) - 7 - 8
+        self.commit()
+        self.commit()
+        git(self.repository_path, "tag", "Editor-2")
+        self.commit()
+        git(self.repository_path, "tag", "-a", "-m", "Build 3", "Editor-3")
+        git(self.repository_path, "checkout", "-q", "-b", "feature")
+        self.commit()
+        git(self.repository_path, "tag", "-a", "-m", "Build 4", "builds/Editor-4")
+        git(self.repository_path, "checkout", "-q", "main")
+        self.commit()
+        git(self.repository_path, "merge", "-q", "--no-ff", "-m", "Merge feature", "feature", commit_time=self.commit_count)
+        self.commit()
+        git(self.repository_path, "tag", "-a", "-m", "Build 6", "Game-6")
+        git(self.repository_path, "tag", "-a", "-m", "Nested", "Editor-6-nested", "Game-6")
+        self.commit()
+        git(self.repository_path, "tag", "Other-7")
+        self.commit()
+
+    def assert_matches_git(self, repository_path):
+        git_dir, common_dir = get_git_dirs(repository_path)
+        self.assertEqual(git_refs.read_head(git_dir, common_dir), git(repository_path, "rev-parse", "HEAD"))
+        self.assertEqual(get_head_commit(repository_path), git(repository_path, "rev-parse", "HEAD"))
+
+        object_reader = git_refs.ObjectReader(common_dir)
+        try:
+            for tag_pattern in (TAG_PATTERN, "Game", "Other", "Missing"):
+                self.assertEqual(git_refs.read_matching_tags(common_dir, tag_pattern, object_reader), read_tags_from_git(repository_path, tag_pattern))
+
+            tagged_commits = read_tags_from_git(repository_path, TAG_PATTERN)
+            for head_commit in git(repository_path, "rev-list", "--all").splitlines():
+                self.assertEqual(
+                    git_refs.find_tagged_ancestor(object_reader, head_commit, tagged_commits),
+                    find_tagged_ancestor_with_git(repository_path, head_commit, tagged_commits),
+                    head_commit
+                )
+        finally:
+            object_reader.close()
+
+    def test_loose_refs(self):
+        self.assertFalse(os.path.exists(os.path.join(self.repository_path, ".git", "packed-refs")))
+        self.assert_matches_git(self.repository_path)
+
+    def test_packed_refs(self):
+        git(self.repository_path, "pack-refs", "--all")
+        self.assertFalse(os.listdir(os.path.join(self.repository_path, ".git", "refs", "tags")))
+        self.assert_matches_git(self.repository_path)
+
+    def test_gc(self):
+        # Packs the objects as well as the refs, similar commits are stored as deltas
+        git(self.repository_path, "gc", "-q")
+        self.assertTrue(os.listdir(os.path.join(self.repository_path, ".git", "objects", "pack")))
+        self.assert_matches_git(self.repository_path)
+
+    def test_packed_and_loose_refs(self):
+        # A loose ref overrides the packed one with the same name
+        git(self.repository_path, "gc", "-q")
+        git(self.repository_path, "tag", "-f", "Editor-2", "HEAD~1")
+        git(self.repository_path, "tag", "-a", "-m", "Build 8", "Editor-8")
+        self.assert_matches_git(self.repository_path)
+
+    def test_detached_head(self):
+        git(self.repository_path, "checkout", "-q", "--detach", "Editor-3")
+        self.assert_matches_git(self.repository_path)
+
+    def test_worktree(self):
+        worktree_path = os.path.join(self.temp_dir, "worktree")
+        git(self.repository_path, "worktree", "add", "-q", "-b", "work", worktree_path, "Editor-3")
+        self.commit(worktree_path)
+        git(worktree_path, "tag", "Editor-worktree")
+
+        git_dir, common_dir = get_git_dirs(worktree_path)
+        self.assertTrue(os.path.isfile(os.path.join(worktree_path, ".git")))
+        self.assertTrue(os.path.samefile(common_dir, os.path.join(self.repository_path, ".git")))
+        self.assertTrue(os.path.samefile(git_dir, git(worktree_path, "rev-parse", "--absolute-git-dir")))
+        self.assertNotEqual(git_refs.read_head(git_dir, common_dir), git(self.repository_path, "rev-parse", "HEAD"))
+        self.assert_matches_git(worktree_path)
+
+        git(self.repository_path, "gc", "-q")
+        self.assert_matches_git(worktree_path)
+
+    def test_tag_index(self):
+        git(self.repository_path, "gc", "-q")
+        head_commit = git(self.repository_path, "rev-parse", "HEAD")
+        tag_index = TagIndex(self.repository_path, TAG_PATTERN)
+        self.assertFalse(tag_index.used_git)
+        self.assertEqual(tag_index.tags, read_tags_from_git(self.repository_path, TAG_PATTERN))
+
+        commit_id, tag_name = tag_index.find_tagged_ancestor(head_commit)
+        self.assertEqual(commit_id, find_tagged_ancestor_with_git(self.repository_path, head_commit, tag_index.tags))
+        self.assertEqual(tag_name, "Editor-6-nested")
+        self.assertFalse(tag_index.used_git)
+
+        # Only tagged commits that have an archive qualify
+        available_commits = {git(self.repository_path, "rev-parse", "Editor-2")}
+        self.assertEqual(tag_index.find_tagged_ancestor(head_commit, available_commits), (git(self.repository_path, "rev-parse", "Editor-2"), "Editor-2"))
+
+        # Unchanged refs are read from the stored index
+        self.assertTrue(TagIndex(self.repository_path, TAG_PATTERN).was_cached)
+        git(self.repository_path, "tag", "Editor-8")
+        self.assertFalse(TagIndex(self.repository_path, TAG_PATTERN).was_cached)
+
+    def test_git_fallback(self):
+        # Objects that git_refs can't read are left to the git command line
+        head_commit = git(self.repository_path, "rev-parse", "HEAD")
+        with mock.patch.object(git_refs.ObjectReader, "read_object", side_effect=git_refs.PackWalkRequired):
+            tag_index = TagIndex(self.repository_path, TAG_PATTERN)
+            self.assertTrue(tag_index.used_git)
+            self.assertEqual(tag_index.tags, read_tags_from_git(self.repository_path, TAG_PATTERN))
+
+            tag_index = TagIndex(self.repository_path, "Game")
+            tag_index.used_git = False
+            commit_id, tag_name = tag_index.find_tagged_ancestor(head_commit)
+            self.assertTrue(tag_index.used_git)
+            self.assertEqual(commit_id, find_tagged_ancestor_with_git(self.repository_path, head_commit, tag_index.tags))
+            self.assertEqual(tag_name, "Game-6")
+
+    def test_unsupported_repository(self):
+        # Reftable repositories are left to git
+        os.makedirs(os.path.join(self.repository_path, ".git", "reftable"))
+        git_dir, common_dir = get_git_dirs(self.repository_path)
+        self.assertIsNone(git_refs.read_head(git_dir, common_dir))
+        self.assertEqual(get_head_commit(self.repository_path), git(self.repository_path, "rev-parse", "HEAD"))
+        with self.assertRaises(git_refs.PackWalkRequired):
+            git_refs.read_matching_tags(common_dir, TAG_PATTERN, git_refs.ObjectReader(common_dir))
+
+        tag_index = TagIndex(self.repository_path, TAG_PATTERN)
+        self.assertTrue(tag_index.used_git)
+        self.assertEqual(tag_index.tags, read_tags_from_git(self.repository_path, TAG_PATTERN))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,251 @@
+import functools
+import http.server
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "binary_sync_action"))
+import prefetch
+from http_source import HttpCatalogue, Download, DownloadReader, get_download_dir, get_download_path
+
+# Runs the web server source against a local stand-in for nginx or Apache: python's http.server with
+# directory listings, range requests, optional delays for single ranges and responses that are cut off.
+
+CHUNK_SIZE = 64 * 1024
+COMMIT_ID = "0123456789abcdef0123456789abcdef01234567"
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        range_header = self.headers.get("Range")
+        if os.path.isdir(path) or not range_header or not self.server.supports_ranges:
+            if os.path.isdir(path) or self.command != "GET" or self.server.cut_off_after is None:
+                return super().send_head()
+            # Announce the whole file, send the start of it and drop the connection
+            with open(path, 'rb') as file:
+                data = file.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.close_connection = True
+            return io.BytesIO(data[:self.server.cut_off_after])
+
+        with open(path, 'rb') as file:
+            data = file.read()
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", range_header)
+        start, end = int(match[1]), min(int(match[2]), len(data) - 1)
+        self.server.ranges.append(start)
+        time.sleep(self.server.delays.get(start, 0))
+        self.send_response(206)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        return io.BytesIO(data[start:end + 1])
+
+    def end_headers(self):
+        if self.server.supports_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def log_message(self, format, *arguments):
+        pass
+
+def start_server(directory):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(RangeRequestHandler, directory=directory))
+    server.daemon_threads = True
+    # Canceled downloads reset their connections
+    server.handle_error = lambda request, client_address: None
+    server.supports_ranges = True
+    server.delays = {}
+    server.ranges = []
+    server.cut_off_after = None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class HttpSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        # Catalogues, tag indexes and downloads are stored in the local data folder
+        environment = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(self.temp_dir, "cache"), "LOCALAPPDATA": os.path.join(self.temp_dir, "cache")})
+        environment.start()
+        self.addCleanup(environment.stop)
+
+        self.source_path = os.path.join(self.temp_dir, "source")
+        os.makedirs(os.path.join(self.source_path, "Editor"))
+        self.data = os.urandom(5 * CHUNK_SIZE + 1000)
+        self.archive_path = os.path.join(self.source_path, "Editor", f"{COMMIT_ID}.zip")
+        with open(self.archive_path, 'wb') as file:
+            file.write(self.data)
+
+        self.server = start_server(self.source_path)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.source_url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.archive_url = f"{self.source_url}Editor/{COMMIT_ID}.zip"
+        self.local_path = os.path.join(self.temp_dir, "downloads", f"{COMMIT_ID}.zip")
+
+    def read_local_file(self):
+        with open(self.local_path, 'rb') as file:
+            return file.read()
+
+    def test_catalogue(self):
+        catalogue = HttpCatalogue(self.source_url).refresh()
+        self.assertEqual(set(catalogue.commit_ids()), {COMMIT_ID})
+        self.assertEqual(catalogue.find(COMMIT_ID), self.archive_url)
+
+    def test_download(self):
+        download = Download(self.archive_url, self.local_path, workers=3, chunk_size=CHUNK_SIZE).start()
+        self.assertTrue(download.wait())
+        self.assertEqual(self.read_local_file(), self.data)
+        self.assertEqual(sorted(self.server.ranges), [chunk * CHUNK_SIZE for chunk in range(6)])
+
+    def test_end_of_archive_first(self):
+        # That is where a zip lists its files
+        Download(self.archive_url, self.local_path, workers=1, chunk_size=CHUNK_SIZE).start().wait()
+        self.assertEqual(self.server.ranges, [5 * CHUNK_SIZE] + [chunk * CHUNK_SIZE for chunk in range(5)])
+
+    def test_resume(self):
+        Download(self.archive_url, self.local_path, chunk_size=CHUNK_SIZE).start().wait()
+        # An interrupted download, chunks 1 and 3 are missing
+        with open(self.local_path + ".download.json", 'r') as file:
+            state = json.load(file)
+        state["chunks"] = [0, 2, 4, 5]
+        with open(self.local_path + ".download.json", 'w') as file:
+            json.dump(state, file)
+        with open(self.local_path, 'r+b') as file:
+            for chunk in (1, 3):
+                file.seek(chunk * CHUNK_SIZE)
+                file.write(bytes(CHUNK_SIZE))
+
+        self.server.ranges.clear()
+        self.assertTrue(Download(self.archive_url, self.local_path, chunk_size=CHUNK_SIZE).start().wait())
+        self.assertEqual(sorted(self.server.ranges), [CHUNK_SIZE, 3 * CHUNK_SIZE])
+        self.assertEqual(self.read_local_file(), self.data)
+
+        # A complete download is reused
+        self.server.ranges.clear()
+        self.assertTrue(Download(self.archive_url, self.local_path, chunk_size=CHUNK_SIZE).start().wait())
+        self.assertEqual(self.server.ranges, [])
+
+    def test_read_while_downloading(self):
+        # A download that is not eager only fetches what the reader asks for
+        download = Download(self.archive_url, self.local_path, eager=False, chunk_size=CHUNK_SIZE).start()
+        try:
+            with DownloadReader(download) as reader:
+                reader.seek(2 * CHUNK_SIZE + 100)
+                self.assertEqual(reader.read(CHUNK_SIZE), self.data[2 * CHUNK_SIZE + 100:3 * CHUNK_SIZE + 100])
+            self.assertEqual(sorted(self.server.ranges), [2 * CHUNK_SIZE, 3 * CHUNK_SIZE])
+        finally:
+            download.cancel()
+
+    def test_without_ranges(self):
+        self.server.supports_ranges = False
+        download = Download(self.archive_url, self.local_path, chunk_size=CHUNK_SIZE).start()
+        self.assertTrue(download.wait())
+        self.assertEqual(self.read_local_file(), self.data)
+
+    def test_cut_off(self):
+        # A server without range support that closes the connection in the middle of the file
+        self.server.supports_ranges = False
+        self.server.cut_off_after = 2 * CHUNK_SIZE + 100
+        download = Download(self.archive_url, self.local_path, chunk_size=CHUNK_SIZE).start()
+        with self.assertRaises(IOError):
+            download.wait()
+
+        # The next download starts over instead of reusing the incomplete file
+        self.server.cut_off_after = None
+        self.assertTrue(Download(self.archive_url, self.local_path, chunk_size=CHUNK_SIZE).start().wait())
+        self.assertEqual(self.read_local_file(), self.data)
+
+    def test_read_cut_off(self):
+        # A reader that waits for bytes after the cut raises instead of waiting forever
+        self.server.supports_ranges = False
+        self.server.cut_off_after = CHUNK_SIZE + 100
+        download = Download(self.archive_url, self.local_path, chunk_size=CHUNK_SIZE).start()
+        try:
+            with DownloadReader(download) as reader:
+                reader.seek(3 * CHUNK_SIZE)
+                with self.assertRaises(IOError):
+                    reader.read(100)
+                reader.seek(0)
+                self.assertEqual(reader.read(100), self.data[:100])
+        finally:
+            download.cancel()
+
+    def test_read_canceled(self):
+        # Readers stop waiting for a slow part once the sync is canceled
+        canceled = threading.Event()
+        self.server.delays[2 * CHUNK_SIZE] = 1.0
+        download = Download(self.archive_url, self.local_path, eager=False, chunk_size=CHUNK_SIZE, is_canceled=canceled.is_set).start()
+        threading.Timer(0.2, canceled.set).start()
+        started = time.perf_counter()
+        try:
+            with DownloadReader(download) as reader:
+                reader.seek(2 * CHUNK_SIZE)
+                with self.assertRaises(IOError):
+                    reader.read(100)
+            self.assertLess(time.perf_counter() - started, 0.9)
+        finally:
+            download.cancel()
+
+    def test_cancel(self):
+        self.server.delays[0] = 0.5
+        download = Download(self.archive_url, self.local_path, workers=2, chunk_size=CHUNK_SIZE).start()
+        self.assertFalse(download.wait(lambda: True))
+        self.assertTrue(Download(self.archive_url, self.local_path, chunk_size=CHUNK_SIZE).start().wait())
+        self.assertEqual(self.read_local_file(), self.data)
+
+    def test_wait_while_one_chunk_is_slow(self):
+        # The other worker is done long before the slow chunk arrives, waiting for it must not keep a core busy
+        self.server.delays[0] = 0.6
+        download = Download(self.archive_url, self.local_path, workers=2, chunk_size=CHUNK_SIZE).start()
+        started = time.process_time()
+        self.assertTrue(download.wait())
+        self.assertLess(time.process_time() - started, 0.3)
+        self.assertEqual(self.read_local_file(), self.data)
+
+    def test_prefetch(self):
+        project_path = os.path.join(self.temp_dir, "project")
+        os.makedirs(project_path)
+        environment = {**os.environ, "GIT_CONFIG_NOSYSTEM": "1", "GIT_CONFIG_GLOBAL": os.devnull, "GIT_AUTHOR_NAME": "Test", "GIT_AUTHOR_EMAIL": "test@example.com", "GIT_COMMITTER_NAME": "Test", "GIT_COMMITTER_EMAIL": "test@example.com"}
+        for arguments in (["init", "-q"], ["commit", "-q", "--allow-empty", "-m", "Build"], ["tag", "Editor-1"]):
+            subprocess.check_call(["git", *arguments], cwd=project_path, env=environment)
+        commit_id = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=project_path, text=True).strip()
+
+        with zipfile.ZipFile(os.path.join(self.source_path, "Editor", f"{commit_id}.zip"), 'w') as archive:
+            archive.writestr("Engine/Binaries/Win64/UnrealEditor.dll", self.data)
+        cache_path = os.path.join(self.temp_dir, "archives")
+        prefetch.write_prefetch_config(project_path, {
+            "prefetch": True,
+            "pre_extract": False,
+            "binary_source": self.source_url,
+            "tag_pattern": "Editor",
+            "archive_cache_path": cache_path,
+            "archive_cache_size": 1024**3
+        })
+
+        # The archive is downloaded to where the sync looks for it
+        with mock.patch.object(prefetch, "lower_priority"):
+            self.assertTrue(prefetch.prefetch(project_path, log=lambda text: None))
+        archive_url = f"{self.source_url}Editor/{commit_id}.zip"
+        with open(get_download_path(get_download_dir(cache_path), archive_url), 'rb') as file:
+            with zipfile.ZipFile(file) as archive:
+                self.assertEqual(archive.read("Engine/Binaries/Win64/UnrealEditor.dll"), self.data)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "binary_sync_action"))
+import prefetch
+from archive_cache import ArchiveCache
+from local_storage import get_data_dir, get_path_key
+
+# The prefetch from the git hooks and a sync that the user starts can run at the same time on the same project.
+
+class PrefetchAndSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        environment = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(self.temp_dir, "cache"), "LOCALAPPDATA": os.path.join(self.temp_dir, "cache")})
+        environment.start()
+        self.addCleanup(environment.stop)
+        self.project_path = os.path.join(self.temp_dir, "project")
+        os.makedirs(self.project_path)
+
+    def test_concurrent_cache_copies(self):
+        source_file = os.path.join(self.temp_dir, "source", "0123.zip")
+        os.makedirs(os.path.dirname(source_file))
+        data = os.urandom(24 * 1024 * 1024)
+        with open(source_file, 'wb') as file:
+            file.write(data)
+
+        results = []
+        errors = []
+        def copy():
+            try:
+                results.append(ArchiveCache(os.path.join(self.temp_dir, "archives"), 1024**3).get(source_file))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=copy) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(results)), 1)
+        with open(results[0], 'rb') as file:
+            self.assertEqual(file.read(), data)
+        self.assertEqual([file_name for file_name in os.listdir(os.path.dirname(results[0])) if file_name.endswith(".partial")], [])
+
+    def test_sync_waits_for_prefetch(self):
+        lock_dir = get_data_dir("prefetch", "locks")
+        prefetch_lock = prefetch.acquire_lock(lock_dir, f"{get_path_key(self.project_path)}-0123.lock", 2)
+        threading.Timer(0.3, prefetch.release_lock, (prefetch_lock,)).start()
+
+        waited = []
+        started = time.perf_counter()
+        sync_lock = prefetch.lock_project_for_sync(self.project_path, on_wait=lambda: waited.append(True))
+        self.assertIsNotNone(sync_lock)
+        self.assertGreaterEqual(time.perf_counter() - started, 0.3)
+        self.assertEqual(waited, [True])
+
+        # No prefetch starts while the sync holds the lock
+        self.assertTrue(prefetch.is_lock_active(prefetch.get_sync_lock_path(self.project_path)))
+        prefetch.release_lock(sync_lock)
+        self.assertFalse(prefetch.is_lock_active(prefetch.get_sync_lock_path(self.project_path)))
+
+    def test_canceled_wait(self):
+        lock_dir = get_data_dir("prefetch", "locks")
+        prefetch_lock = prefetch.acquire_lock(lock_dir, f"{get_path_key(self.project_path)}-0123.lock", 2)
+        self.addCleanup(prefetch.release_lock, prefetch_lock)
+        self.assertIsNone(prefetch.lock_project_for_sync(self.project_path, lambda: True))
+        self.assertFalse(os.path.exists(prefetch.get_sync_lock_path(self.project_path)))
+
+    def test_prefetches_of_other_projects(self):
+        lock_dir = get_data_dir("prefetch", "locks")
+        other_lock = prefetch.acquire_lock(lock_dir, f"{get_path_key(os.path.join(self.temp_dir, 'other'))}-0123.lock", 2)
+        self.addCleanup(prefetch.release_lock, other_lock)
+        sync_lock = prefetch.lock_project_for_sync(self.project_path, lambda: True)
+        self.assertIsNotNone(sync_lock)
+        prefetch.release_lock(sync_lock)
+
+if __name__ == "__main__":
+    unittest.main()